@@ -0,0 +1,130 @@
+"""
+Agent step execution: through CrewAI, or as direct completions.
+
+Every agentic route builds Task objects and used to run them with
+Crew(...).kickoff(). The crew wraps each task in CrewAI's agent loop —
+a ReAct-style prompt with tool and format instructions, output parsing,
+and a retry turn whenever the model's answer does not parse — so one
+step can cost several hidden completions. None of our agents use tools;
+each step needs exactly one answer.
+
+In "direct" mode a task is sent as a single chat completion: the agent's
+role, goal and backstory as the system message (the same persona CrewAI
+uses) and the task description, expected output and the outputs of its
+context tasks as the user message. "crew" mode keeps the CrewAI path.
+
+The mode is picked per endpoint (AGENT_MODE, e.g. "crew,query=direct")
+and can be overridden per request; it is held in a contextvar so the
+task helpers do not need it threaded through:
+
+    with agent_runner.using('direct'):
+        outputs = agent_runner.run_tasks([interpret_task, sql_task], llm)
+"""
+
+import threading
+import contextvars
+from contextlib import contextmanager
+
+import tracing
+from crewai import Crew
+from langchain_core.messages import SystemMessage, HumanMessage
+
+MODES = ('crew', 'direct')
+
+_mode = contextvars.ContextVar('agent_mode', default='crew')
+_stats_lock = threading.Lock()
+_stats = {mode: {'runs': 0, 'steps': 0} for mode in MODES}
+
+
+def parse_modes(spec: str) -> dict:
+    """'crew,query=direct' → {'*': 'crew', 'query': 'direct'}; a bare mode sets the default."""
+    modes = {'*': 'crew'}
+    for part in (spec or '').split(','):
+        part = part.strip().lower()
+        if not part:
+            continue
+        kind, _, mode = part.rpartition('=')
+        if mode not in MODES:
+            raise ValueError(f"Unknown agent mode '{mode}' (expected one of {', '.join(MODES)})")
+        modes[kind.strip() or '*'] = mode
+    return modes
+
+
+def mode_for(kind: str, modes: dict, requested=None) -> str:
+    """The mode for an endpoint: the request's own choice, else its configured mode, else the default."""
+    if requested:
+        requested = str(requested).lower()
+        if requested not in MODES:
+            raise ValueError(f"Unknown agent mode '{requested}' (expected one of {', '.join(MODES)})")
+        return requested
+    return modes.get(kind, modes.get('*', 'crew'))
+
+
+@contextmanager
+def using(mode: str = None):
+    """Runs agent steps in this block in `mode`; None keeps the current mode."""
+    token = _mode.set(mode or _mode.get())
+    try:
+        yield
+    finally:
+        _mode.reset(token)
+
+
+def current_mode() -> str:
+    return _mode.get()
+
+
+def persona_messages(agent, prompt: str) -> list:
+    return [
+        SystemMessage(content=f"You are {agent.role}. {agent.backstory}\nYour personal goal is: {agent.goal}"),
+        HumanMessage(content=prompt),
+    ]
+
+
+def task_prompt(task, context_outputs=()) -> str:
+    prompt = (
+        f"Current Task: {task.description}\n\n"
+        f"This is the expected criteria for your final answer: {task.expected_output}\n"
+        "You MUST return the actual complete content as the final answer, not a summary."
+    )
+    if context_outputs:
+        context = '\n\n----------\n\n'.join(context_outputs)
+        prompt += f"\n\nThis is the context you're working with:\n{context}"
+    return prompt
+
+
+def _context_tasks(task) -> list:
+    context = getattr(task, 'context', None)
+    return context if isinstance(context, list) else []
+
+
+def run_tasks(tasks: list, llm) -> list:
+    """
+    Runs `tasks` in order in the current mode and returns each task's raw
+    text output. In direct mode a task sees the outputs of its context
+    tasks, which must come earlier in `tasks`.
+    """
+    mode = _mode.get()
+    if mode == 'crew':
+        agents = list(dict.fromkeys(task.agent for task in tasks))
+        with tracing.span('agent.crew', agent=', '.join(agent.role for agent in agents), mode=mode):
+            result = Crew(agents=agents, tasks=tasks, verbose=False).kickoff()
+        outputs = [output.raw for output in result.tasks_output]
+    else:
+        outputs = []
+        done = {}
+        for task in tasks:
+            context_outputs = [done[id(t)] for t in _context_tasks(task) if id(t) in done]
+            with tracing.span('agent.step', agent=task.agent.role, mode=mode):
+                reply = llm.invoke(persona_messages(task.agent, task_prompt(task, context_outputs)))
+            done[id(task)] = reply.content
+            outputs.append(reply.content)
+    with _stats_lock:
+        _stats[mode]['runs'] += 1
+        _stats[mode]['steps'] += len(tasks)
+    return outputs
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return {mode: dict(counts) for mode, counts in _stats.items()}
@@ -4,15 +4,17 @@ import matplotlib.pyplot as plt
 import sqlite3
 from dotenv import load_dotenv
 from crewai import Agent, Task, Crew
-import litellm
+from llm_gateway import LLMGateway
+from llm_cache import ResponseCache
 import uuid
 import io
 import os
-import time
 
-# Custom LLM class for litellm integration with CrewAI
+# Custom LLM class for CrewAI, backed by an LLMGateway. Pass `gateway` to share
+# an existing one (its connection pool, cache and stats); otherwise this builds
+# its own, whose calls are not counted by any other gateway's /metrics.
 class LitellmLLM:
-    def __init__(self, models, api_key, temperature=0.3, max_retries=3, timeout=60):
+    def __init__(self, models, api_key, temperature=0.3, max_retries=3, timeout=60, cache_path=None, gateway=None):
         self.models = models if isinstance(models, list) else [models]
         self.api_key = api_key
         self.temperature = temperature
@@ -22,30 +24,43 @@ class LitellmLLM:
             "HTTP-Referer": openrouter_site_url,
             "X-Title": openrouter_app_name,
         }
+        self.gateway = gateway or LLMGateway(
+            api_key=api_key,
+            headers=self.extra_headers,
+            max_retries=max_retries - 1,
+            timeout=timeout,
+            cache=ResponseCache(cache_path) if cache_path else None,
+        )
 
     def call(self, prompt, **kwargs):
-        last_error = None
-
-        for model_name in self.models:
-            for attempt in range(1, self.max_retries + 1):
-                try:
-                    response = litellm.completion(
-                        model=model_name,
-                        messages=[{"role": "user", "content": prompt}],
-                        api_key=self.api_key,
-                        api_base="https://openrouter.ai/api/v1",
-                        extra_headers=self.extra_headers,
-                        temperature=self.temperature,
-                        timeout=self.timeout,
-                        **kwargs
-                    )
-                    return response.choices[0].message.content
-                except Exception as e:
-                    last_error = e
-                    if attempt < self.max_retries:
-                        time.sleep(min(2 ** (attempt - 1), 6))
-
-        return f"Error in LLM call after retries and model fallback: {str(last_error)}"
+        try:
+            response = self.gateway.complete(
+                [{"role": "user", "content": prompt}],
+                model=self.models[0],
+                fallbacks=self.models[1:],
+                temperature=self.temperature,
+                **kwargs
+            )
+            return response['content']
+        except Exception as e:
+            return f"Error in LLM call after retries and model fallback: {str(e)}"
+
+    def batch(self, prompts, **kwargs):
+        """Runs several prompts concurrently over the shared connection pool."""
+        results = self.gateway.batch([
+            {
+                "messages": [{"role": "user", "content": prompt}],
+                "model": self.models[0],
+                "fallbacks": self.models[1:],
+                "temperature": self.temperature,
+                **kwargs
+            }
+            for prompt in prompts
+        ])
+        return [
+            f"Error in LLM call after retries and model fallback: {str(r)}" if isinstance(r, Exception) else r['content']
+            for r in results
+        ]
 
 # Load environment variables
 load_dotenv()
@@ -68,7 +83,12 @@ openrouter_site_url = os.getenv("OPENROUTER_SITE_URL", "http://localhost:5000")
 openrouter_app_name = os.getenv("OPENROUTER_APP_NAME", "NLPtoSQL Detective")
 
 # Initialize LLM
-llm = LitellmLLM(models=openrouter_models, api_key=api_key, temperature=0.3)
+llm = LitellmLLM(
+    models=openrouter_models,
+    api_key=api_key,
+    temperature=0.3,
+    cache_path=os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'llm_cache.sqlite')),
+)
 
 # Define CrewAI Agents
 data_analyst = Agent(
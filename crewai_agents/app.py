@@ -11,9 +11,19 @@ LLM Routing:
   Fallback : openai/gpt-4o-mini  (auto-swap if primary fails)
 """
 
+if __name__ == '__main__':
+    # `python app.py` serves through serve.py, so multiprocessing children
+    # (chart workers) re-import that empty entry module instead of this one.
+    import os
+    import runpy
+
+    runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve.py'), run_name='__main__')
+    raise SystemExit
+
 from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import pandas as pd
+from pandas.tseries.api import guess_datetime_format
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
@@ -22,29 +32,95 @@ import plotly.io as pio
 import os
 import sqlite3
 from dotenv import load_dotenv
-from crewai import Agent, Task, Crew
-from langchain_community.chat_models import ChatLiteLLM
-import litellm
+load_dotenv()  # before any config below reads the environment
+from crewai import Agent, Task
 import uuid
 import io
 import base64
 from werkzeug.utils import secure_filename
 import tempfile
+import shutil
 import json
 import re
 import time
 from scipy import stats
+import dataset_store
+import query_engine
+import query_cache
+import fast_path
+import prompt_budget
+import llm_cache
+import agent_runner
+import tracing
+import chart_codec
+import chart_reduce
+import chart_cache
+import chart_pool
+import upload_stream
+import jobs
+from pipeline import Pipeline
+from llm_gateway import LLMGateway, GatewayChatModel
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from contextlib import nullcontext
+from profiling import build_rich_profile, StreamingProfiler
+from charts import fig_to_json, plan_charts, build_figure, render_chart
 import warnings
 warnings.filterwarnings('ignore')
 
 app = Flask(__name__)
+app.json = chart_codec.OrjsonProvider(app)
 CORS(app)
 
 ALLOWED_EXTENSIONS = {'csv', 'tsv', 'xlsx', 'sql'}
 DATASET_DIR = os.path.join(os.path.dirname(__file__), 'uploads')
 os.makedirs(DATASET_DIR, exist_ok=True)
+DATAFRAME_CACHE_MAX_BYTES = int(os.getenv("DATAFRAME_CACHE_MAX_BYTES", str(1024 ** 3)))
+# CSV/TSV uploads above this size are ingested and profiled in chunks
+STREAMING_PROFILE_THRESHOLD_BYTES = int(os.getenv("STREAMING_PROFILE_THRESHOLD_BYTES", str(256 * 1024 ** 2)))
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "100000"))
+QUERY_POOL_SIZE = int(os.getenv("QUERY_POOL_SIZE", "4"))
+# SQL execution backend for /query: 'sqlite' (row store) or 'duckdb' (vectorised columnar)
+QUERY_BACKEND = os.getenv("QUERY_BACKEND", "sqlite").lower()
+# Executed-SQL references before the index advisor adds an index on a column
+INDEX_ADVISOR_THRESHOLD = int(os.getenv("INDEX_ADVISOR_THRESHOLD", "3"))
+# Background jobs for {"async": true} requests to the agent endpoints
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "64"))
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+# Threads for pipeline steps that overlap chart building with LLM calls
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "8"))
+# NL→SQL answer cache; QUERY_CACHE_SIMILARITY=0 disables reworded-question matching
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "512"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+QUERY_CACHE_SIMILARITY = float(os.getenv("QUERY_CACHE_SIMILARITY", "0.92"))
+# Shared OpenRouter connection pool and per-model in-flight request limit
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_MODEL_CONCURRENCY = int(os.getenv("LLM_MODEL_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+# Rule-based NL→SQL planner for simple questions; plans below this confidence go to the crew
+FAST_PATH_MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.8"))
+# Persistent exact-prompt LLM response cache; set LLM_CACHE_PATH= (empty) to disable
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(__file__), 'llm_cache.sqlite'))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 ** 2)))
+# Token budget for the dataset profile in each agent's prompt, e.g. "sql_craftsman=600,detective_agent=3000"
+PROFILE_TOKEN_BUDGETS = prompt_budget.parse_budgets(os.getenv("PROFILE_TOKEN_BUDGETS", ""))
+# How agent steps run: "crew" (CrewAI agent loop) or "direct" (one completion per step),
+# globally or per endpoint, e.g. "crew,query=direct,detective=direct"
+AGENT_MODES = agent_runner.parse_modes(os.getenv("AGENT_MODE", "crew"))
+# Most markers any one chart ships (scatter matrix rows, outlier-map points, box outliers per column)
+CHART_POINT_BUDGET = int(os.getenv("CHART_POINT_BUDGET", "5000"))
+# Histogram bins (integer columns with a smaller range get one bin per value)
+CHART_HISTOGRAM_BINS = int(os.getenv("CHART_HISTOGRAM_BINS", "40"))
+# Persistent cache of rendered chart payloads per dataset version; set CHART_CACHE_PATH= (empty) to disable
+CHART_CACHE_PATH = os.getenv("CHART_CACHE_PATH", os.path.join(os.path.dirname(__file__), 'chart_cache.sqlite'))
+CHART_CACHE_MAX_BYTES = int(os.getenv("CHART_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+# Worker processes rendering /visualize charts (0 = render on pipeline threads);
+# datasets below CHART_POOL_MIN_ROWS always render in-process
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", str(min(4, os.cpu_count() or 1))))
+CHART_POOL_MIN_ROWS = int(os.getenv("CHART_POOL_MIN_ROWS", "50000"))
 
-load_dotenv()
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 if not OPENROUTER_API_KEY:
     raise ValueError("Missing OPENROUTER_API_KEY in environment variables")
@@ -56,40 +132,44 @@ if not OPENROUTER_API_KEY:
 # Fallback : GPT-4o-mini  — reliable safety net if primary quota exhausted
 # OpenRouter normalises all models to the OpenAI messages format.
 
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 PRIMARY_MODEL       = "openrouter/deepseek/deepseek-chat-v3-0324"   # best for agentic tasks 2026
 FALLBACK_MODEL      = "openrouter/openai/gpt-4o-mini"                # safety net
 
-# CrewAI/LangChain may pass params that OpenRouter rejects on some LiteLLM versions.
-litellm.drop_params = True
-
 # Optional: identify your app in OpenRouter dashboard headers
 OPENROUTER_HEADERS = {
     "HTTP-Referer": "https://datadetective.app",
     "X-Title": "DataDetective",
 }
 
+# One pooled, keep-alive HTTP client for every agent and request thread.
+llm_gateway = LLMGateway(
+    api_key=OPENROUTER_API_KEY,
+    base_url=OPENROUTER_BASE_URL,
+    headers=OPENROUTER_HEADERS,
+    max_connections=LLM_MAX_CONNECTIONS,
+    default_concurrency=LLM_MODEL_CONCURRENCY,
+    max_retries=LLM_MAX_RETRIES,
+    timeout=LLM_TIMEOUT_SECONDS,
+    cache=llm_cache.ResponseCache(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES) if LLM_CACHE_PATH else None,
+)
 
-primary_llm = ChatLiteLLM(
+# The gateway moves to FALLBACK_MODEL once PRIMARY_MODEL has exhausted its retries
+llm = GatewayChatModel(
+    gateway=llm_gateway,
     model=PRIMARY_MODEL,
-    openrouter_api_key=OPENROUTER_API_KEY,
-    api_base=OPENROUTER_BASE_URL,
-    streaming=False,
+    fallbacks=(FALLBACK_MODEL,),
     temperature=0.3,
     max_tokens=4096,
 )
 
-fallback_llm = ChatLiteLLM(
-    model=FALLBACK_MODEL,
-    openrouter_api_key=OPENROUTER_API_KEY,
-    api_base=OPENROUTER_BASE_URL,
-    streaming=False,
-    temperature=0.3,
-    max_tokens=4096,
+# Created before the agents: the SQL agent's goal names the backend's dialect,
+# and an unknown QUERY_BACKEND fails here with the list of valid backends.
+sql_engine = query_engine.create_engine(
+    QUERY_BACKEND,
+    **({'pool_size': QUERY_POOL_SIZE, 'index_threshold': INDEX_ADVISOR_THRESHOLD} if QUERY_BACKEND == 'sqlite' else {})
 )
 
-llm = primary_llm.with_fallbacks([fallback_llm])
-
 
 # ─────────────────────────────────────────────
 # AGENTS — Each has a sharp, focused role
@@ -121,7 +201,7 @@ query_interpreter = Agent(
 
 sql_craftsman = Agent(
     role="SQL Craftsman",
-    goal="Write optimal, safe, read-only SQLite queries",
+    goal=f"Write optimal, safe, read-only {sql_engine.dialect} queries",
     backstory=(
         "You are a database architect with 15 years of SQL expertise. "
         "You write clean, efficient queries and never mutate data. "
@@ -207,14 +287,86 @@ def is_safe_query(sql):
 
 def resolve_dataset(dataset_id):
     safe_name = secure_filename(os.path.basename(dataset_id or ''))
-    if not safe_name.startswith('temp_dataset_') or not safe_name.endswith('.csv'):
+    if not safe_name.startswith(dataset_store.DATASET_PREFIX):
         raise ValueError('Invalid dataset identifier')
     path = os.path.join(DATASET_DIR, safe_name)
-    if not os.path.exists(path):
+    if not dataset_store.dataset_exists(path):
         raise FileNotFoundError('Dataset not found. Please re-upload.')
     return path
 
 
+dataframe_cache = dataset_store.DataFrameCache(DATAFRAME_CACHE_MAX_BYTES)
+nl_query_cache = query_cache.QueryCache(
+    max_entries=QUERY_CACHE_MAX_ENTRIES,
+    ttl_seconds=QUERY_CACHE_TTL_SECONDS,
+    similarity_threshold=QUERY_CACHE_SIMILARITY
+)
+fast_planner = fast_path.FastPathPlanner(min_confidence=FAST_PATH_MIN_CONFIDENCE)
+job_manager = jobs.JobManager(
+    max_workers=JOB_WORKERS,
+    max_pending=JOB_MAX_PENDING,
+    ttl_seconds=JOB_RESULT_TTL_SECONDS
+)
+pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix='pipeline')
+chart_store = chart_cache.ChartCache(CHART_CACHE_PATH, CHART_CACHE_MAX_BYTES) if CHART_CACHE_PATH else None
+# Settings that change rendered charts; part of every chart cache key
+CHART_PARAMS = {'point_budget': CHART_POINT_BUDGET, 'histogram_bins': CHART_HISTOGRAM_BINS}
+
+
+@tracing.traced('dataset.load')
+def load_dataset(dataset_path):
+    """
+    Opens a stored dataset, served from the process-wide LRU cache when the
+    same dataset version was already loaded. Treat the result as read-only.
+    """
+    mtime_ns = os.stat(dataset_store.data_path(dataset_path)).st_mtime_ns
+    return dataframe_cache.get_or_load(
+        os.path.basename(dataset_path),
+        mtime_ns,
+        lambda: dataset_store.read_dataset(dataset_path)
+    )
+
+
+# Large datasets render their overview charts in worker processes; small ones on the calling thread.
+chart_renderer = chart_pool.ChartPool(CHART_WORKERS, CHART_POOL_MIN_ROWS, local_frame=load_dataset)
+
+
+def get_profile(dataset_path, df=None):
+    """
+    Serves the profile persisted at upload. It is only rebuilt (and stored
+    again) when missing or stale for the current data version.
+    """
+    profile = dataset_store.read_profile(dataset_path)
+    if profile is None:
+        if df is None:
+            df = load_dataset(dataset_path)
+        with tracing.span('profile.build'):
+            profile = build_rich_profile(df)
+        profile = dataset_store.write_profile(dataset_path, profile)
+    return profile
+
+
+def profile_context(agent_key, profile, query=None, focus_columns=None):
+    """
+    Profile JSON for one agent's prompt, compacted to that agent's token
+    budget and biased towards the columns the question (or interpretation)
+    names. The token counts are added to the request's prompt report.
+    """
+    columns = profile.get('columns', [])
+    focus = prompt_budget.query_columns(query, columns) if query else {}
+    for col in focus_columns or []:
+        if col in columns:
+            focus[col] = 3
+    compact, budget_stats = prompt_budget.compact_profile(
+        profile,
+        PROFILE_TOKEN_BUDGETS.get(agent_key, prompt_budget.DEFAULT_BUDGETS[agent_key]),
+        focus,
+        prompt_budget.AGENT_DETAILS[agent_key]
+    )
+    prompt_budget.record(agent_key, budget_stats)
+    return json.dumps(compact, default=str)
+
+
 def safe_unlink(path, retries=5, delay=0.1):
     """Best-effort delete with small retries for Windows file locks."""
     if not path:
@@ -230,16 +382,18 @@ def safe_unlink(path, retries=5, delay=0.1):
             time.sleep(delay)
 
 
-def load_raw_dataset(file_path, ext):
+@tracing.traced('upload.parse')
+def load_raw_dataset(source, ext):
+    """Parses an upload; csv/tsv accept a path or binary stream, xlsx/sql need a path."""
     if ext == 'csv':
-        return pd.read_csv(file_path)
+        return pd.read_csv(source)
     elif ext == 'tsv':
-        return pd.read_csv(file_path, sep='\t')
+        return pd.read_csv(source, sep='\t')
     elif ext == 'xlsx':
-        return pd.read_excel(file_path)
+        return pd.read_excel(source)
     elif ext == 'sql':
         conn = sqlite3.connect(':memory:')
-        with open(file_path, 'r') as f:
+        with open(source, 'r') as f:
             conn.cursor().executescript(f.read())
         conn.commit()
         tables = conn.cursor().execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
@@ -251,307 +405,131 @@ def load_raw_dataset(file_path, ext):
     raise ValueError(f"Unsupported format: {ext}")
 
 
-def build_rich_profile(df: pd.DataFrame) -> dict:
+def coerce_datetime_columns(df, formats=None):
     """
-    Builds a comprehensive statistical profile used by all agents.
-    This is the shared memory/context that powers all agentic tasks.
+    Converts date/time-named columns to datetimes. Returns the frame and
+    {column: format} for the converted columns — the format pandas inferred
+    from the column's first value, or None when there is none to name.
+
+    Later chunks of a streamed upload pass those formats back and are parsed
+    with them. A column holding values that do not parse that way (dates
+    written differently further down the file) is left as text from that
+    chunk on; the dataset writer then stores the whole column as text, as a
+    non-streamed upload would, instead of turning those values into NaT.
     """
-    numeric_cols = df.select_dtypes(include='number').columns.tolist()
-    categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
-    datetime_cols = df.select_dtypes(include='datetime').columns.tolist()
+    if formats is not None:
+        formats = dict(formats)
+        for col, fmt in list(formats.items()):
+            parsed = pd.to_datetime(df[col], format=fmt, errors='coerce')
+            if (parsed.isna() & df[col].notna()).any():
+                del formats[col]
+            else:
+                df[col] = parsed
+        return df, formats
+
+    converted = {}
+    for col in df.columns:
+        if 'date' in col.lower() or 'time' in col.lower():
+            try:
+                parsed = pd.to_datetime(df[col], infer_datetime_format=True)
+            except Exception:
+                continue
+            values = df[col].dropna()
+            converted[col] = guess_datetime_format(str(values.iloc[0])) \
+                if df[col].dtype == object and len(values) else None
+            df[col] = parsed
+    return df, converted
 
-    missing = df.isnull().sum()
-    total_rows = max(len(df), 1)
 
-    # Outlier detection using IQR
-    outlier_flags = {}
-    for col in numeric_cols:
-        q1, q3 = df[col].quantile(0.25), df[col].quantile(0.75)
-        iqr = q3 - q1
-        outlier_count = int(((df[col] < q1 - 1.5 * iqr) | (df[col] > q3 + 1.5 * iqr)).sum())
-        outlier_flags[col] = {'count': outlier_count, 'percent': round(outlier_count / total_rows * 100, 2)}
+@tracing.traced('upload.ingest_chunked')
+def ingest_chunked(source, ext, dataset_path):
+    """
+    Streams a delimited file (path or binary stream) into the dataset store chunk by chunk while a
+    StreamingProfiler builds the profile from the same chunks, so memory
+    stays bounded regardless of file size. Returns the profile.
+    """
+    sep = '\t' if ext == 'tsv' else ','
+    writer = dataset_store.ChunkedDatasetWriter(dataset_path, ext)
+    profiler = StreamingProfiler()
+    datetime_formats = None
+    try:
+        for chunk in pd.read_csv(source, sep=sep, chunksize=INGEST_CHUNK_ROWS):
+            chunk, datetime_formats = coerce_datetime_columns(chunk, datetime_formats)
+            profiler.update(chunk)
+            writer.write(chunk)
+        writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    return profiler.result()
 
-    # Skewness and kurtosis
-    distribution_stats = {}
-    for col in numeric_cols:
-        clean = df[col].dropna()
-        if len(clean) > 3:
-            distribution_stats[col] = {
-                'skewness': round(float(stats.skew(clean)), 4),
-                'kurtosis': round(float(stats.kurtosis(clean)), 4)
-            }
 
-    # Top correlations
-    top_correlations = []
-    if len(numeric_cols) > 1:
-        corr_matrix = df[numeric_cols].corr()
-        for i in range(len(numeric_cols)):
-            for j in range(i + 1, len(numeric_cols)):
-                val = corr_matrix.iloc[i, j]
-                if abs(val) > 0.5:
-                    top_correlations.append({
-                        'col1': numeric_cols[i],
-                        'col2': numeric_cols[j],
-                        'correlation': round(float(val), 4)
-                    })
-        top_correlations.sort(key=lambda x: abs(x['correlation']), reverse=True)
-
-    # Categorical value distributions
-    cat_summaries = {}
-    for col in categorical_cols[:5]:  # limit for token budget
-        vc = df[col].value_counts()
-        cat_summaries[col] = {
-            'unique_count': int(df[col].nunique()),
-            'top_5': vc.head(5).to_dict()
-        }
-
-    # Duplicate detection
-    dup_count = int(df.duplicated().sum())
-
-    return {
-        'shape': {'rows': int(df.shape[0]), 'columns': int(df.shape[1])},
-        'columns': df.columns.tolist(),
-        'dtypes': {k: str(v) for k, v in df.dtypes.items()},
-        'numeric_columns': numeric_cols,
-        'categorical_columns': categorical_cols,
-        'datetime_columns': datetime_cols,
-        'missing': {
-            col: {'count': int(missing[col]), 'percent': round(float(missing[col] / total_rows * 100), 2)}
-            for col in df.columns
-        },
-        'numeric_summary': (
-            df[numeric_cols].describe().round(4).to_dict() if numeric_cols else {}
-        ),
-        'outlier_analysis': outlier_flags,
-        'distribution_stats': distribution_stats,
-        'top_correlations': top_correlations[:10],
-        'categorical_summaries': cat_summaries,
-        'duplicate_rows': {'count': dup_count, 'percent': round(dup_count / total_rows * 100, 2)},
-        'sample_rows': df.head(5).replace({pd.NA: None}).where(pd.notnull(df.head(5)), None).to_dict('records'),
-    }
+def ingest_upload(source, ext, staging, streaming):
+    """
+    Parses an upload into the staging directory and profiles it, exactly or
+    (when `streaming`) with sketches updated chunk by chunk as the bytes
+    arrive. Returns the stored profile.
+    """
+    if streaming:
+        profile = ingest_chunked(source, ext, staging)
+    else:
+        df, _ = coerce_datetime_columns(load_raw_dataset(source, ext))
+        with tracing.span('dataset.write'):
+            dataset_store.write_dataset(staging, df, ext)
+        with tracing.span('profile.build'):
+            profile = build_rich_profile(df)
+    return dataset_store.write_profile(staging, profile)
+
+
+def register_upload(staging, dataset_path):
+    """
+    Moves a staged upload into place as `dataset_path` with one reference,
+    or — when identical content is already stored — discards the staging
+    copy and adds a reference to the existing dataset. Returns True for a
+    duplicate.
+    """
+    with dataset_store.dataset_lock(dataset_path):
+        if dataset_store.dataset_exists(dataset_path):
+            dataset_store.remove_dataset(staging)
+            dataset_store.add_reference(dataset_path)
+            return True
+        if not dataset_store.dataset_exists(staging):
+            raise FileNotFoundError('Dataset was removed during upload. Please retry.')
+        dataset_store.add_reference(staging, initial=True)
+        dataset_store.publish_dataset(staging, dataset_path)
+        return False
 
 
 # ─────────────────────────────────────────────
 # PLOTLY VISUALIZATION ENGINE
-# Smart chart selection based on data semantics
+# Smart chart selection based on data semantics (charts.py); rendered in
+# a process pool for large datasets (chart_pool.py)
 # ─────────────────────────────────────────────
 
-PLOTLY_THEME = {
-    "template": "plotly_dark",
-    "paper_bgcolor": "rgba(0,0,0,0)",
-    "plot_bgcolor": "rgba(15,15,25,0.8)",
-    "font_color": "#e2e8f0",
-    "colorscale": "Viridis"
-}
-
-
 def fig_to_base64(fig) -> str:
     img_bytes = pio.to_image(fig, format='png', width=900, height=500, scale=2)
     return base64.b64encode(img_bytes).decode()
 
 
-def fig_to_json(fig) -> dict:
-    """Returns Plotly JSON for interactive frontend rendering."""
-    return json.loads(pio.to_json(fig))
+def cached_charts(dataset_path, kind, spec, build):
+    """
+    build()'s chart payload (a chart plan, a chart, a chart list), served
+    from the chart cache when this dataset version was charted before.
+    """
+    if chart_store is None:
+        return build()
+    return chart_store.get_or_build(
+        os.path.basename(dataset_path), dataset_store.dataset_version(dataset_path), kind, spec, CHART_PARAMS, build
+    )
 
 
 def smart_visualize(df: pd.DataFrame, query: str = None, viz_type: str = None, column: str = None) -> list:
     """
     Smart visualization engine. Returns list of chart objects with:
     - plotly_json: for interactive frontend rendering
-    - image: base64 fallback
     - title, description, chart_type
     """
-    numeric_cols = df.select_dtypes(include='number').columns.tolist()
-    categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
-    charts = []
-
-    template = PLOTLY_THEME["template"]
-
-    # 1. Distribution charts for all numeric columns (top 3)
-    for col in numeric_cols[:3]:
-        fig = go.Figure()
-        fig.add_trace(go.Histogram(
-            x=df[col].dropna(),
-            name=col,
-            marker_color='#6366f1',
-            opacity=0.85,
-            nbinsx=40
-        ))
-        # Add KDE overlay
-        kde_data = df[col].dropna()
-        if len(kde_data) > 5:
-            kde = stats.gaussian_kde(kde_data)
-            x_range = np.linspace(kde_data.min(), kde_data.max(), 200)
-            kde_vals = kde(x_range) * len(kde_data) * (kde_data.max() - kde_data.min()) / 40
-            fig.add_trace(go.Scatter(
-                x=x_range, y=kde_vals,
-                mode='lines',
-                name='Density',
-                line=dict(color='#f43f5e', width=2.5)
-            ))
-
-        fig.update_layout(
-            title=f'Distribution of {col}',
-            template=template,
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(15,15,25,0.8)',
-            font=dict(color='#e2e8f0'),
-            xaxis_title=col,
-            yaxis_title='Frequency',
-            showlegend=True,
-            height=400
-        )
-        charts.append({
-            'chart_type': 'histogram',
-            'title': f'Distribution of {col}',
-            'description': f'Shows value distribution and density curve for {col}',
-            'plotly_json': fig_to_json(fig),
-            'column': col
-        })
-
-    # 2. Box plots for outlier visualization
-    if len(numeric_cols) >= 2:
-        fig = go.Figure()
-        for col in numeric_cols[:6]:
-            fig.add_trace(go.Box(
-                y=df[col].dropna(),
-                name=col,
-                marker_color='#8b5cf6',
-                line_color='#c4b5fd',
-                boxpoints='outliers',
-                jitter=0.3,
-                pointpos=-1.8
-            ))
-        fig.update_layout(
-            title='Outlier Analysis — Box Plots',
-            template=template,
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(15,15,25,0.8)',
-            font=dict(color='#e2e8f0'),
-            height=420
-        )
-        charts.append({
-            'chart_type': 'boxplot',
-            'title': 'Outlier Analysis — Box Plots',
-            'description': 'Reveals outliers and spread across all numeric columns',
-            'plotly_json': fig_to_json(fig)
-        })
-
-    # 3. Correlation heatmap
-    if len(numeric_cols) > 1:
-        corr = df[numeric_cols].corr().round(2)
-        fig = go.Figure(data=go.Heatmap(
-            z=corr.values,
-            x=corr.columns.tolist(),
-            y=corr.index.tolist(),
-            colorscale='RdBu',
-            zmid=0,
-            text=corr.values,
-            texttemplate='%{text}',
-            textfont=dict(size=11),
-            hoverongaps=False
-        ))
-        fig.update_layout(
-            title='Correlation Heatmap',
-            template=template,
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(15,15,25,0.8)',
-            font=dict(color='#e2e8f0'),
-            height=450
-        )
-        charts.append({
-            'chart_type': 'heatmap',
-            'title': 'Correlation Heatmap',
-            'description': 'Shows linear relationships between all numeric variables. Red = negative, Blue = positive correlation.',
-            'plotly_json': fig_to_json(fig)
-        })
-
-    # 4. Categorical bar charts
-    for col in categorical_cols[:2]:
-        vc = df[col].value_counts().head(15)
-        fig = go.Figure(go.Bar(
-            x=vc.values,
-            y=vc.index.tolist(),
-            orientation='h',
-            marker=dict(
-                color=vc.values,
-                colorscale='Plasma',
-                showscale=True
-            )
-        ))
-        fig.update_layout(
-            title=f'Top Categories in {col}',
-            template=template,
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(15,15,25,0.8)',
-            font=dict(color='#e2e8f0'),
-            xaxis_title='Count',
-            yaxis_title=col,
-            height=400
-        )
-        charts.append({
-            'chart_type': 'bar',
-            'title': f'Top Categories in {col}',
-            'description': f'Frequency distribution of categories in {col}',
-            'plotly_json': fig_to_json(fig),
-            'column': col
-        })
-
-    # 5. Scatter matrix for numeric cols (top 4)
-    if len(numeric_cols) >= 3:
-        top_cols = numeric_cols[:4]
-        color_col = categorical_cols[0] if categorical_cols else None
-        fig = px.scatter_matrix(
-            df[top_cols + ([color_col] if color_col else [])].dropna(),
-            dimensions=top_cols,
-            color=color_col,
-            title='Scatter Matrix — Pairwise Relationships',
-            template=template,
-            height=550
-        )
-        fig.update_traces(diagonal_visible=False, showupperhalf=False)
-        fig.update_layout(
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(15,15,25,0.8)',
-            font=dict(color='#e2e8f0')
-        )
-        charts.append({
-            'chart_type': 'scatter_matrix',
-            'title': 'Scatter Matrix — Pairwise Relationships',
-            'description': 'Explores relationships between every pair of numeric columns simultaneously',
-            'plotly_json': fig_to_json(fig)
-        })
-
-    # 6. Missing values bar
-    missing = df.isnull().sum()
-    missing = missing[missing > 0].sort_values(ascending=True)
-    if len(missing) > 0:
-        fig = go.Figure(go.Bar(
-            x=missing.values,
-            y=missing.index.tolist(),
-            orientation='h',
-            marker_color='#f43f5e',
-            text=[f'{v} ({v/len(df)*100:.1f}%)' for v in missing.values],
-            textposition='outside'
-        ))
-        fig.update_layout(
-            title='Missing Values by Column',
-            template=template,
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(15,15,25,0.8)',
-            font=dict(color='#e2e8f0'),
-            xaxis_title='Missing Count',
-            height=350
-        )
-        charts.append({
-            'chart_type': 'missing',
-            'title': 'Missing Values by Column',
-            'description': 'Highlights data completeness issues requiring attention',
-            'plotly_json': fig_to_json(fig)
-        })
-
-    return charts
+    return [render_chart(df, spec, CHART_PARAMS) for spec in plan_charts(df)]
 
 
 # ─────────────────────────────────────────────
@@ -569,63 +547,91 @@ def upload_file():
     Upload endpoint. Stores dataset, returns rich profile immediately.
     Profile is computed server-side — no agent needed here (fast path).
     """
+    with tracing.trace('upload') as request_trace:
+        response = store_upload()
+        status = response[1] if isinstance(response, tuple) else response.status_code
+        if status >= 400:
+            request_trace.status = 'error'
+        return response
+
+
+def store_upload():
     try:
-        if 'file' not in request.files:
+        # The multipart body is decoded as it streams in rather than through
+        # request.files, which would spool the whole upload to disk first.
+        try:
+            upload, source = upload_stream.open_upload(request.stream, request.mimetype_params.get('boundary'))
+        except ValueError:
             return jsonify({'error': 'No file uploaded'}), 400
 
-        file = request.files['file']
-        if not file.filename:
+        if not upload.filename:
             return jsonify({'error': 'Empty filename'}), 400
 
-        filename = secure_filename(file.filename)
+        filename = secure_filename(upload.filename)
         ext = filename.rsplit('.', 1)[-1].lower()
         if ext not in ALLOWED_EXTENSIONS:
             return jsonify({'error': f'Unsupported format: {ext}. Allowed: csv, tsv, xlsx, sql'}), 400
 
-        # On Windows, deleting an open NamedTemporaryFile can raise WinError 32.
-        fd, tmp_path = tempfile.mkstemp(suffix=f'.{ext}')
-        os.close(fd)
+        upload.hasher = dataset_store.content_hasher(ext)
+        # The request body size is a close upper bound on the file size.
+        streaming = ext in ('csv', 'tsv') and (request.content_length or 0) > STREAMING_PROFILE_THRESHOLD_BYTES
+        staging = dataset_store.staging_path(DATASET_DIR)
         try:
-            file.save(tmp_path)
-            df = load_raw_dataset(tmp_path, ext)
-        finally:
-            safe_unlink(tmp_path)
-
-        # Coerce datetime columns
-        for col in df.columns:
-            if 'date' in col.lower() or 'time' in col.lower():
+            if ext in ('csv', 'tsv'):
+                # Parsed straight off the socket; the bytes are hashed on the way through.
+                profile = ingest_upload(source, ext, staging, streaming)
+                upload.drain()
+                dataset_path = os.path.join(DATASET_DIR, dataset_store.content_dataset_id(upload.hasher.hexdigest()))
+            else:
+                # Excel workbooks and SQL dumps need a seekable file, so they are
+                # spooled once; the hash is then known before parsing, so a
+                # duplicate skips the parse entirely.
+                # On Windows, deleting an open NamedTemporaryFile can raise WinError 32.
+                fd, tmp_path = tempfile.mkstemp(suffix=f'.{ext}')
+                os.close(fd)
                 try:
-                    df[col] = pd.to_datetime(df[col], infer_datetime_format=True)
-                except Exception:
-                    pass
-
-        dataset_id = f"temp_dataset_{uuid.uuid4()}.csv"
-        df.to_csv(os.path.join(DATASET_DIR, dataset_id), index=False)
-
-        profile = build_rich_profile(df)
+                    with open(tmp_path, 'wb') as out:
+                        shutil.copyfileobj(source, out)
+                    dataset_path = os.path.join(DATASET_DIR, dataset_store.content_dataset_id(upload.hasher.hexdigest()))
+                    if not dataset_store.dataset_exists(dataset_path):
+                        profile = ingest_upload(tmp_path, ext, staging, False)
+                finally:
+                    safe_unlink(tmp_path)
+
+            deduplicated = register_upload(staging, dataset_path)
+        except Exception:
+            dataset_store.remove_dataset(staging)
+            raise
+
+        dataset_id = os.path.basename(dataset_path)
+        if deduplicated:
+            profile = get_profile(dataset_path)
+        else:
+            # Materialise the per-dataset query database off the request path
+            sql_engine.prepare(dataset_path)
 
         return jsonify({
             'success': True,
             'dataset_id': dataset_id,
-            'profile': profile
+            'profile': profile,
+            'profile_mode': 'streaming' if streaming else 'exact',
+            'deduplicated': deduplicated
         })
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/analyze', methods=['POST'])
-def analyze():
+def run_analyze(data):
     """
     Deep analysis via Data Profiler agent.
     Returns markdown narrative + structured insights.
     """
     try:
-        data = request.json
+        prompt_tokens = prompt_budget.start_report()
         dataset_path = resolve_dataset(data.get('dataset_id'))
-        df = pd.read_csv(dataset_path)
-        profile = build_rich_profile(df)
-        profile_str = json.dumps(profile, default=str)
+        profile = get_profile(dataset_path)
+        profile_str = profile_context('data_profiler', profile)
 
         task = Task(
             description=f"""
@@ -662,222 +668,320 @@ def analyze():
             expected_output="A structured markdown analysis report."
         )
 
-        crew = Crew(agents=[data_profiler], tasks=[task], verbose=False)
-        result = crew.kickoff()
+        jobs.report_progress('analyzing')
+        analysis, = agent_runner.run_tasks([task], llm)
 
-        return jsonify({
+        return {
             'success': True,
-            'analysis': result.tasks_output[0].raw,
-            'profile': profile
-        })
+            'analysis': analysis,
+            'profile': profile,
+            'prompt_tokens': prompt_tokens
+        }, 200
 
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return {'error': str(e)}, 500
+
+
+def interpret_task_for(user_query, profile):
+    """Agent 1: Interpret"""
+    profile_str = profile_context('query_interpreter', profile, query=user_query)
+    return Task(
+        description=f"""
+        User query: "{user_query}"
+        
+        Dataset profile: {profile_str}
+        
+        Return ONLY valid JSON:
+        {{
+            "valid": true/false,
+            "interpreted_intent": "What the user wants to find",
+            "required_columns": ["col1", "col2"],
+            "analysis_type": "aggregation|filter|comparison|ranking|correlation|timeseries",
+            "suggestion": "Improved version of the query if ambiguous",
+            "confidence": 0.0-1.0
+        }}
+        """,
+        agent=query_interpreter,
+        expected_output="JSON with query interpretation"
+    )
+
+
+def sql_task_for(profile, user_query, interpret_task=None, interpretation=None):
+    """
+    Agent 2: SQL. Inside a crew it reads the interpret task as context;
+    run on its own (streaming) it is given the parsed interpretation, whose
+    required columns then get priority in the compacted schema.
+    """
+    required = (interpretation or {}).get('required_columns') or []
+    schema_str = profile_context('sql_craftsman', profile, query=user_query,
+                                 focus_columns=required if isinstance(required, list) else [])
+    interpreted = f"\n        Interpreted query: {json.dumps(interpretation, default=str)}\n" if interpretation is not None else ''
+    context = {'context': [interpret_task]} if interpret_task is not None else {}
+    return Task(
+        description=f"""
+        Based on the interpreted query, write a {sql_engine.dialect} SELECT query.
+        {interpreted}
+        Table: data_table
+        Columns (name → dtype, value range / top values) and sample rows: {schema_str}
+        
+        Rules:
+        - Output ONLY the SQL query, nothing else
+        - Use {sql_engine.dialect} syntax
+        - Read-only (SELECT/WITH only)
+        - Handle NULLs gracefully
+        - If query is invalid, output: INVALID_QUERY
+        - Limit results to 100 rows max
+        """,
+        agent=sql_craftsman,
+        expected_output=f"A valid {sql_engine.dialect} SELECT query",
+        **context
+    )
+
+
+def generate_sql(user_query, profile):
+    """Runs the interpret → SQL steps; returns (interpretation, sanitized SQL)."""
+    interpret_task = interpret_task_for(user_query, profile)
+    sql_task = sql_task_for(profile, user_query, interpret_task=interpret_task)
+    interpret_raw, sql_raw = agent_runner.run_tasks([interpret_task, sql_task], llm)
+
+    interpretation = parse_json_safe(interpret_raw) or {}
+    sql_query = sanitize_sql(sql_raw)
+    return interpretation, sql_query
+
+
+def narrate_prompt(user_query, result_df):
+    """Agent 3: Narrate the results"""
+    return f"""
+        User asked: "{user_query}"
+        
+        Query returned {len(result_df)} rows:
+        {result_df.head(20).to_markdown(index=False) if not result_df.empty else "No results found."}
+        
+        Write a clear, concise narrative (3-5 sentences) explaining:
+        1. What the result shows
+        2. The most important number or finding
+        3. Any surprising or notable pattern
+        4. A brief recommendation or next step
+        
+        Write in plain English, no jargon.
+        """
+
+
+def narrate_result(user_query, result_df):
+    """Runs the insight_narrator over a query result."""
+    narrate_task = Task(
+        description=narrate_prompt(user_query, result_df),
+        agent=insight_narrator,
+        expected_output="A natural language narrative of the query results."
+    )
+    narrative, = agent_runner.run_tasks([narrate_task], llm)
+    return narrative
+
+
+@tracing.traced('chart.result')
+def build_result_chart(user_query, result_df):
+    """Plotly JSON for a query result, or None when no sensible chart applies."""
+    if result_df is None or result_df.empty or len(result_df.columns) < 2:
+        return None
+    try:
+        num_cols = result_df.select_dtypes(include='number').columns.tolist()
+        str_cols = result_df.select_dtypes(include='object').columns.tolist()
+
+        if str_cols and num_cols:
+            fig = px.bar(
+                result_df.head(20),
+                x=str_cols[0],
+                y=num_cols[0],
+                template='plotly_dark',
+                title=f'Result: {user_query[:60]}'
+            )
+        elif len(num_cols) >= 2:
+            fig = px.scatter(
+                result_df.head(100),
+                x=num_cols[0],
+                y=num_cols[1],
+                template='plotly_dark',
+                title=f'Result: {user_query[:60]}'
+            )
+        else:
+            return None
 
+        fig.update_layout(
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(15,15,25,0.8)',
+            font=dict(color='#e2e8f0')
+        )
+        return fig_to_json(fig)
+    except Exception:
+        return None
 
-@app.route('/query', methods=['POST'])
-def query():
+
+def run_fast_path(dataset_path, plan):
+    """
+    Executes a fast-path plan's SQL. The plan passes the same is_safe_query
+    gate as generated SQL before it runs. A plan that fails the gate or does
+    not run (a type the planner guessed wrong, a dialect quirk) is counted
+    and raised, and the caller hands the question to the cache or the crew
+    instead.
+    """
+    try:
+        if not is_safe_query(plan['sql']):
+            raise ValueError('Fast-path plan is not a read-only query')
+        return sql_engine.execute(dataset_path, plan['sql'])
+    except Exception:
+        fast_planner.record_failed()
+        raise
+
+
+def run_query(data):
     """
     Natural language query → SQL → Results → Narrative.
     3-agent pipeline: Interpret → SQL → Narrate
     """
     try:
-        data = request.json
         dataset_path = resolve_dataset(data.get('dataset_id'))
         user_query = (data.get('query') or '').strip()
 
         if not user_query:
-            return jsonify({'error': 'Query is required'}), 400
-
-        df = pd.read_csv(dataset_path)
-        profile = build_rich_profile(df)
-        profile_str = json.dumps(profile, default=str)
-
-        conn = sqlite3.connect(':memory:')
-        df.to_sql('data_table', conn, index=False, if_exists='replace')
-
-        # Agent 1: Interpret
-        interpret_task = Task(
-            description=f"""
-            User query: "{user_query}"
-            
-            Dataset profile: {profile_str}
-            
-            Return ONLY valid JSON:
-            {{
-                "valid": true/false,
-                "interpreted_intent": "What the user wants to find",
-                "required_columns": ["col1", "col2"],
-                "analysis_type": "aggregation|filter|comparison|ranking|correlation|timeseries",
-                "suggestion": "Improved version of the query if ambiguous",
-                "confidence": 0.0-1.0
-            }}
-            """,
-            agent=query_interpreter,
-            expected_output="JSON with query interpretation"
-        )
-
-        # Agent 2: SQL
-        sql_task = Task(
-            description=f"""
-            Based on the interpreted query, write a SQLite SELECT query.
-            
-            Table: data_table
-            Columns: {', '.join(df.columns.tolist())}
-            Sample data: {json.dumps(df.head(3).to_dict('records'), default=str)}
-            
-            Rules:
-            - Output ONLY the SQL query, nothing else
-            - Use SQLite syntax
-            - Read-only (SELECT/WITH only)
-            - Handle NULLs gracefully
-            - If query is invalid, output: INVALID_QUERY
-            - Limit results to 100 rows max
-            """,
-            agent=sql_craftsman,
-            context=[interpret_task],
-            expected_output="A valid SQLite SELECT query"
-        )
-
-        crew = Crew(
-            agents=[query_interpreter, sql_craftsman],
-            tasks=[interpret_task, sql_task],
-            verbose=False
-        )
-        result = crew.kickoff()
-
-        interpretation = parse_json_safe(result.tasks_output[0].raw) or {}
-        sql_query = sanitize_sql(result.tasks_output[1].raw)
+            return {'error': 'Query is required'}, 400
+
+        prompt_tokens = prompt_budget.start_report()
+        profile = get_profile(dataset_path)
+        # Generated SQL depends on the schema and the backend dialect, not on the data
+        fingerprint = f"{sql_engine.dialect}:{query_cache.schema_fingerprint(dataset_store.read_schema(dataset_path))}"
+        data_version = dataset_store.dataset_version(dataset_path)
+
+        # Simple question shapes are planned without any LLM call.
+        plan = fast_planner.plan(user_query, profile) if data.get('fast_path', True) else None
+        plan_df = None
+        if plan:
+            try:
+                plan_df = run_fast_path(dataset_path, plan)
+            except Exception:
+                plan = None
+
+        cached, cache_match = (None, None)
+        if plan is None and data.get('use_cache', True):
+            cached, cache_match = nl_query_cache.lookup(fingerprint, user_query)
+
+        if plan:
+            path = 'fast_path'
+            interpretation, sql_query = plan['interpretation'], plan['sql']
+        elif cached:
+            path = 'cache'
+            interpretation, sql_query = cached['interpretation'], cached['sql']
+        else:
+            path = 'crew'
+            jobs.report_progress('generating_sql')
+            interpretation, sql_query = generate_sql(user_query, profile)
+        fast_planner.record_served(path)
 
         query_result = None
         result_df = None
         narrative = None
+        result_chart = None
 
         if interpretation.get('valid', True) and sql_query != 'INVALID_QUERY' and is_safe_query(sql_query):
             try:
-                result_df = pd.read_sql_query(sql_query, conn)
+                jobs.report_progress('executing_sql')
+                result_df = plan_df if plan else sql_engine.execute(dataset_path, sql_query)
                 query_result = {
                     'data': result_df.to_dict('records'),
                     'columns': result_df.columns.tolist(),
                     'row_count': len(result_df)
                 }
 
-                # Agent 3: Narrate the results
-                narrate_task = Task(
-                    description=f"""
-                    User asked: "{user_query}"
-                    
-                    Query returned {len(result_df)} rows:
-                    {result_df.head(20).to_markdown(index=False) if not result_df.empty else "No results found."}
-                    
-                    Write a clear, concise narrative (3-5 sentences) explaining:
-                    1. What the result shows
-                    2. The most important number or finding
-                    3. Any surprising or notable pattern
-                    4. A brief recommendation or next step
-                    
-                    Write in plain English, no jargon.
-                    """,
-                    agent=insight_narrator,
-                    expected_output="A natural language narrative of the query results."
-                )
-                narrate_crew = Crew(agents=[insight_narrator], tasks=[narrate_task], verbose=False)
-                narrate_result = narrate_crew.kickoff()
-                narrative = narrate_result.tasks_output[0].raw
+                # The result chart only needs the rows, so it renders while the narrator runs.
+                dag = Pipeline(pipeline_executor)
+                dag.add('chart', build_result_chart, user_query, result_df)
+                if plan:
+                    narrative = fast_path.narrate(plan, result_df)
+                elif cached and cached['data_version'] == data_version:
+                    narrative = cached['narrative']
+                else:
+                    jobs.report_progress('narrating')
+                    dag.add('narrative', narrate_result, user_query, result_df)
+                outputs = dag.run()
+                result_chart = outputs['chart']
+                narrative = outputs.get('narrative', narrative)
+
+                if path == 'crew':
+                    nl_query_cache.store(fingerprint, user_query, interpretation, sql_query, narrative, data_version)
 
             except Exception as e:
                 query_result = {'error': f'SQL execution failed: {str(e)}'}
         else:
             query_result = {'error': 'Could not generate a valid query for this request.'}
 
-        conn.close()
-
-        # Generate a result visualization if applicable
-        result_chart = None
-        if result_df is not None and not result_df.empty and len(result_df.columns) >= 2:
-            try:
-                num_cols = result_df.select_dtypes(include='number').columns.tolist()
-                str_cols = result_df.select_dtypes(include='object').columns.tolist()
-
-                if str_cols and num_cols:
-                    fig = px.bar(
-                        result_df.head(20),
-                        x=str_cols[0],
-                        y=num_cols[0],
-                        template='plotly_dark',
-                        title=f'Result: {user_query[:60]}'
-                    )
-                elif len(num_cols) >= 2:
-                    fig = px.scatter(
-                        result_df.head(100),
-                        x=num_cols[0],
-                        y=num_cols[1],
-                        template='plotly_dark',
-                        title=f'Result: {user_query[:60]}'
-                    )
-                else:
-                    fig = None
-
-                if fig:
-                    fig.update_layout(
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        plot_bgcolor='rgba(15,15,25,0.8)',
-                        font=dict(color='#e2e8f0')
-                    )
-                    result_chart = fig_to_json(fig)
-            except Exception:
-                pass
-
-        return jsonify({
+        return {
             'success': True,
+            'path': path,
             'interpretation': interpretation,
             'sql_query': sql_query,
             'result': query_result,
             'narrative': narrative,
-            'result_chart': result_chart
-        })
+            'result_chart': result_chart,
+            'cache': {
+                'hit': cached is not None,
+                'match': cache_match,
+                'similarity': cached['similarity'] if cached else None,
+            },
+            'prompt_tokens': prompt_tokens
+        }, 200
 
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-@app.route('/visualize', methods=['POST'])
-def visualize():
+        return {'error': str(e)}, 500
+
+
+def describe_charts(profile, chart_meta):
+    """Runs the viz_strategist over chart titles/types; returns its parsed JSON."""
+    titles = ' '.join(c['title'] for c in chart_meta)
+    desc_task = Task(
+        description=f"""
+        Dataset profile: {profile_context('viz_strategist', profile, query=titles)}
+        
+        Charts generated: {json.dumps(chart_meta)}
+        
+        Return ONLY a JSON array where each item has:
+        - title: exact chart title (match exactly)
+        - insight: 1-2 sentence business insight from this specific chart (max 40 words)
+        - key_finding: the single most important number or pattern revealed
+        
+        Be specific and reference actual data values.
+        """,
+        agent=viz_strategist,
+        expected_output="JSON array of chart insights"
+    )
+
+    descriptions, = agent_runner.run_tasks([desc_task], llm)
+    return parse_json_safe(descriptions)
+
+
+def run_visualize(data):
     """
     Smart visualization pipeline.
     Returns Plotly JSON for interactive charts + AI descriptions.
     """
     try:
-        data = request.json
+        prompt_tokens = prompt_budget.start_report()
         dataset_path = resolve_dataset(data.get('dataset_id'))
-        df = pd.read_csv(dataset_path)
-
-        charts = smart_visualize(df)
-
-        # Get AI descriptions for all charts
-        profile = build_rich_profile(df)
-        chart_meta = [{'title': c['title'], 'chart_type': c['chart_type']} for c in charts]
-
-        desc_task = Task(
-            description=f"""
-            Dataset profile: {json.dumps(profile, default=str)}
-            
-            Charts generated: {json.dumps(chart_meta)}
-            
-            Return ONLY a JSON array where each item has:
-            - title: exact chart title (match exactly)
-            - insight: 1-2 sentence business insight from this specific chart (max 40 words)
-            - key_finding: the single most important number or pattern revealed
-            
-            Be specific and reference actual data values.
-            """,
-            agent=viz_strategist,
-            expected_output="JSON array of chart insights"
-        )
-
-        crew = Crew(agents=[viz_strategist], tasks=[desc_task], verbose=False)
-        result = crew.kickoff()
-        parsed = parse_json_safe(result.tasks_output[0].raw)
+        profile = get_profile(dataset_path)
+
+        # The agent only needs chart titles and types, so it is briefed from the
+        # plan and runs while the figures render. The DataFrame is only loaded
+        # for plans and charts the chart cache does not hold.
+        plan = cached_charts(dataset_path, 'plan', None, lambda: plan_charts(load_dataset(dataset_path)))
+        chart_meta = [{'title': c['title'], 'chart_type': c['chart_type']} for c in plan]
+
+        jobs.report_progress('building_charts')
+        dag = Pipeline(pipeline_executor)
+        for i, spec in enumerate(plan):
+            dag.add(f'chart_{i}', cached_charts, dataset_path, 'chart', spec,
+                    lambda spec=spec: chart_renderer.render(dataset_path, spec, CHART_PARAMS))
+        dag.add('insights', describe_charts, profile, chart_meta)
+        outputs = dag.run()
+        charts = [outputs[f'chart_{i}'] for i in range(len(plan))]
+        parsed = outputs['insights']
 
         if isinstance(parsed, list):
             insight_map = {item.get('title'): item for item in parsed if isinstance(item, dict)}
@@ -889,14 +993,205 @@ def visualize():
                     chart['insight'] = chart['description']
                     chart['key_finding'] = ''
 
-        return jsonify({'success': True, 'charts': charts})
+        return {'success': True, 'charts': charts, 'prompt_tokens': prompt_tokens}, 200
 
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return {'error': str(e)}, 500
 
 
-@app.route('/detective', methods=['POST'])
-def detective_mode():
+@tracing.traced('forensics.compute')
+def compute_forensics(df):
+    """Forensic statistics the detective agent reasons over."""
+    forensics = {}
+
+    # Z-score analysis for extreme outliers
+    numeric_cols = df.select_dtypes(include='number').columns.tolist()
+    extreme_outliers = {}
+    for col in numeric_cols:
+        clean = df[col].dropna()
+        if len(clean) > 10:
+            z_scores = np.abs(stats.zscore(clean))
+            extreme = (z_scores > 3).sum()
+            if extreme > 0:
+                extreme_outliers[col] = {
+                    'count': int(extreme),
+                    'percent': round(float(extreme / len(clean) * 100), 2),
+                    'max_zscore': round(float(z_scores.max()), 2)
+                }
+    forensics['extreme_outliers_zscore'] = extreme_outliers
+
+    # Near-constant columns (low variance)
+    low_variance = {}
+    for col in numeric_cols:
+        cv = df[col].std() / (df[col].mean() + 1e-9)
+        if abs(cv) < 0.01 and df[col].nunique() > 1:
+            low_variance[col] = round(float(cv), 6)
+    forensics['near_constant_columns'] = low_variance
+
+    # High cardinality categoricals
+    categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
+    high_card = {}
+    for col in categorical_cols:
+        pct = df[col].nunique() / max(len(df), 1)
+        if pct > 0.8:
+            high_card[col] = {'unique': int(df[col].nunique()), 'pct_unique': round(pct * 100, 2)}
+    forensics['high_cardinality_columns'] = high_card
+
+    # Suspicious missing patterns (MNAR detection heuristic)
+    missing_patterns = {}
+    for col in df.columns:
+        miss_count = int(df[col].isnull().sum())
+        if miss_count > 0:
+            # Check if missingness correlates with any numeric column
+            miss_indicator = df[col].isnull().astype(int)
+            correlating_cols = []
+            for num_col in numeric_cols[:10]:
+                if num_col != col:
+                    try:
+                        corr = abs(miss_indicator.corr(df[num_col].fillna(0)))
+                        if corr > 0.3:
+                            correlating_cols.append({'col': num_col, 'corr': round(float(corr), 3)})
+                    except Exception:
+                        pass
+            if correlating_cols:
+                missing_patterns[col] = correlating_cols
+    forensics['structured_missing_patterns'] = missing_patterns
+
+    # Duplicate deep analysis
+    dup_cols = df.duplicated(subset=categorical_cols[:3] if categorical_cols else None, keep=False)
+    forensics['near_duplicates'] = {
+        'count': int(dup_cols.sum()),
+        'columns_checked': categorical_cols[:3]
+    }
+
+    return forensics
+
+
+def detective_prompt(profile, forensics):
+    """Task description for the detective case file."""
+    profile_str = profile_context('detective_agent', profile)
+    forensics_str = json.dumps(forensics, default=str)
+    return f"""
+        You are a Data Detective investigating this dataset. Your job is to uncover hidden issues, 
+        anomalies, and patterns that a non-expert would miss.
+        
+        Dataset Profile:
+        {profile_str}
+        
+        Forensic Statistics:
+        {forensics_str}
+        
+        Produce a DETECTIVE CASE FILE in this exact markdown structure:
+        
+        # 🔍 Detective Case File
+        
+        ## Case Summary
+        2-3 sentences describing the overall "health" of this dataset and whether it can be trusted.
+        
+        ## 🚨 Critical Findings (Severity: HIGH)
+        List findings that require immediate attention. Each finding must have:
+        - **Finding**: [name]
+        - **Evidence**: specific numbers and column names
+        - **Risk**: why this matters
+        - **Recommendation**: what to do
+        
+        ## ⚠️ Suspicious Patterns (Severity: MEDIUM)
+        Interesting anomalies worth investigating. Same format.
+        
+        ## 💡 Hidden Insights (Severity: LOW/OPPORTUNITY)
+        Patterns that are unusual but potentially valuable. Same format.
+        
+        ## 🧬 Data DNA
+        A brief "fingerprint" of this dataset: what type of data this is, 
+        what industry/domain it likely comes from, and what it could be used for.
+        
+        ## Verdict
+        One sentence: is this dataset ready for analysis? What's the #1 thing to fix first?
+        
+        Be specific. Cite exact numbers. Reference actual column names.
+        Write like a forensic expert presenting evidence.
+        """
+
+
+def build_outlier_map(df, col):
+    """Z-score index plot of one column, reduced to CHART_POINT_BUDGET markers."""
+    clean = df[col].dropna()
+    z_scores = np.asarray(stats.zscore(clean), dtype=float)
+    flagged = np.abs(z_scores) > 3
+    # Every flagged row is kept; LTTB picks the rest of the budget so the shape survives
+    points = chart_reduce.downsample_series(z_scores, CHART_POINT_BUDGET, keep=flagged)
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=points,
+        y=z_scores[points],
+        mode='markers',
+        marker=dict(
+            color=np.where(flagged[points], '#f43f5e', '#6366f1'),
+            size=np.where(flagged[points], 8, 4),
+            opacity=0.8
+        ),
+        name='Z-Score'
+    ))
+    fig.add_hline(y=3, line_dash='dash', line_color='#f43f5e', annotation_text='Outlier Threshold (+3σ)')
+    fig.add_hline(y=-3, line_dash='dash', line_color='#f43f5e', annotation_text='Outlier Threshold (-3σ)')
+    fig.update_layout(
+        title=f'Outlier Map — {col} (Z-Score Analysis)',
+        template='plotly_dark',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(15,15,25,0.8)',
+        font=dict(color='#e2e8f0'),
+        xaxis_title='Row Index',
+        yaxis_title='Z-Score',
+        height=400
+    )
+    return fig
+
+
+@tracing.traced('chart.forensics')
+def build_forensic_charts(df, forensics):
+    """Outlier map and missing-data heatmap; needs only the data, not the case file."""
+    extreme_outliers = forensics['extreme_outliers_zscore']
+    forensic_charts = []
+
+    # Z-score distribution for top outlier column
+    if extreme_outliers:
+        worst_col = max(extreme_outliers, key=lambda x: extreme_outliers[x]['count'])
+        forensic_charts.append({
+            'title': f'Outlier Map — {worst_col}',
+            'plotly_json': fig_to_json(build_outlier_map(df, worst_col))
+        })
+
+    # Missing data pattern heatmap
+    if df.isnull().any().any():
+        missing_matrix = df.isnull().astype(int)
+        sample = missing_matrix.head(100)
+        fig = go.Figure(data=go.Heatmap(
+            z=sample.values.T,
+            x=[str(i) for i in sample.index],
+            y=sample.columns.tolist(),
+            colorscale=[[0, '#1e1e2e'], [1, '#f43f5e']],
+            showscale=False,
+            hoverongaps=False
+        ))
+        fig.update_layout(
+            title='Missing Data Pattern (first 100 rows)',
+            template='plotly_dark',
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(15,15,25,0.8)',
+            font=dict(color='#e2e8f0'),
+            xaxis_title='Row Index',
+            yaxis_title='Columns',
+            height=400
+        )
+        forensic_charts.append({
+            'title': 'Missing Data Pattern',
+            'plotly_json': fig_to_json(fig)
+        })
+
+    return forensic_charts
+
+
+def run_detective(data):
     """
     🔍 DETECTIVE MODE — The crown jewel feature.
     
@@ -910,196 +1205,422 @@ def detective_mode():
     Returns a structured "case file" with findings ranked by severity.
     """
     try:
-        data = request.json
+        prompt_tokens = prompt_budget.start_report()
         dataset_path = resolve_dataset(data.get('dataset_id'))
-        df = pd.read_csv(dataset_path)
-        profile = build_rich_profile(df)
+        df = load_dataset(dataset_path)
+        profile = get_profile(dataset_path, df)
 
         # Compute additional forensic statistics
-        forensics = {}
-
-        # Z-score analysis for extreme outliers
-        numeric_cols = df.select_dtypes(include='number').columns.tolist()
-        extreme_outliers = {}
-        for col in numeric_cols:
-            clean = df[col].dropna()
-            if len(clean) > 10:
-                z_scores = np.abs(stats.zscore(clean))
-                extreme = (z_scores > 3).sum()
-                if extreme > 0:
-                    extreme_outliers[col] = {
-                        'count': int(extreme),
-                        'percent': round(float(extreme / len(clean) * 100), 2),
-                        'max_zscore': round(float(z_scores.max()), 2)
-                    }
-        forensics['extreme_outliers_zscore'] = extreme_outliers
-
-        # Near-constant columns (low variance)
-        low_variance = {}
-        for col in numeric_cols:
-            cv = df[col].std() / (df[col].mean() + 1e-9)
-            if abs(cv) < 0.01 and df[col].nunique() > 1:
-                low_variance[col] = round(float(cv), 6)
-        forensics['near_constant_columns'] = low_variance
-
-        # High cardinality categoricals
-        categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
-        high_card = {}
-        for col in categorical_cols:
-            pct = df[col].nunique() / max(len(df), 1)
-            if pct > 0.8:
-                high_card[col] = {'unique': int(df[col].nunique()), 'pct_unique': round(pct * 100, 2)}
-        forensics['high_cardinality_columns'] = high_card
-
-        # Suspicious missing patterns (MNAR detection heuristic)
-        missing_patterns = {}
-        for col in df.columns:
-            miss_count = int(df[col].isnull().sum())
-            if miss_count > 0:
-                # Check if missingness correlates with any numeric column
-                miss_indicator = df[col].isnull().astype(int)
-                correlating_cols = []
-                for num_col in numeric_cols[:10]:
-                    if num_col != col:
-                        try:
-                            corr = abs(miss_indicator.corr(df[num_col].fillna(0)))
-                            if corr > 0.3:
-                                correlating_cols.append({'col': num_col, 'corr': round(float(corr), 3)})
-                        except Exception:
-                            pass
-                if correlating_cols:
-                    missing_patterns[col] = correlating_cols
-        forensics['structured_missing_patterns'] = missing_patterns
-
-        # Duplicate deep analysis
-        dup_cols = df.duplicated(subset=categorical_cols[:3] if categorical_cols else None, keep=False)
-        forensics['near_duplicates'] = {
-            'count': int(dup_cols.sum()),
-            'columns_checked': categorical_cols[:3]
-        }
-
-        profile_str = json.dumps(profile, default=str)
-        forensics_str = json.dumps(forensics, default=str)
+        jobs.report_progress('computing_forensics')
+        forensics = compute_forensics(df)
 
         detective_task = Task(
-            description=f"""
-            You are a Data Detective investigating this dataset. Your job is to uncover hidden issues, 
-            anomalies, and patterns that a non-expert would miss.
-            
-            Dataset Profile:
-            {profile_str}
-            
-            Forensic Statistics:
-            {forensics_str}
-            
-            Produce a DETECTIVE CASE FILE in this exact markdown structure:
-            
-            # 🔍 Detective Case File
-            
-            ## Case Summary
-            2-3 sentences describing the overall "health" of this dataset and whether it can be trusted.
-            
-            ## 🚨 Critical Findings (Severity: HIGH)
-            List findings that require immediate attention. Each finding must have:
-            - **Finding**: [name]
-            - **Evidence**: specific numbers and column names
-            - **Risk**: why this matters
-            - **Recommendation**: what to do
-            
-            ## ⚠️ Suspicious Patterns (Severity: MEDIUM)
-            Interesting anomalies worth investigating. Same format.
-            
-            ## 💡 Hidden Insights (Severity: LOW/OPPORTUNITY)
-            Patterns that are unusual but potentially valuable. Same format.
-            
-            ## 🧬 Data DNA
-            A brief "fingerprint" of this dataset: what type of data this is, 
-            what industry/domain it likely comes from, and what it could be used for.
-            
-            ## Verdict
-            One sentence: is this dataset ready for analysis? What's the #1 thing to fix first?
-            
-            Be specific. Cite exact numbers. Reference actual column names.
-            Write like a forensic expert presenting evidence.
-            """,
+            description=detective_prompt(profile, forensics),
             agent=detective_agent,
             expected_output="A structured detective case file in markdown"
         )
 
-        crew = Crew(agents=[detective_agent], tasks=[detective_task], verbose=False)
-        result = crew.kickoff()
-
-        # Generate forensic visualizations
-        forensic_charts = []
-
-        # Z-score distribution for top outlier column
-        if extreme_outliers:
-            worst_col = max(extreme_outliers, key=lambda x: extreme_outliers[x]['count'])
-            clean = df[worst_col].dropna()
-            z_scores = stats.zscore(clean)
-            fig = go.Figure()
-            fig.add_trace(go.Scatter(
-                x=list(range(len(z_scores))),
-                y=z_scores,
-                mode='markers',
-                marker=dict(
-                    color=['#f43f5e' if abs(z) > 3 else '#6366f1' for z in z_scores],
-                    size=[8 if abs(z) > 3 else 4 for z in z_scores],
-                    opacity=0.8
-                ),
-                name='Z-Score'
-            ))
-            fig.add_hline(y=3, line_dash='dash', line_color='#f43f5e', annotation_text='Outlier Threshold (+3σ)')
-            fig.add_hline(y=-3, line_dash='dash', line_color='#f43f5e', annotation_text='Outlier Threshold (-3σ)')
-            fig.update_layout(
-                title=f'Outlier Map — {worst_col} (Z-Score Analysis)',
-                template='plotly_dark',
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(15,15,25,0.8)',
-                font=dict(color='#e2e8f0'),
-                xaxis_title='Row Index',
-                yaxis_title='Z-Score',
-                height=400
+        # Forensic visualizations need only the data, so they render while the agent investigates.
+        jobs.report_progress('investigating')
+        dag = Pipeline(pipeline_executor)
+        dag.add('case_file', agent_runner.run_tasks, [detective_task], llm)
+        dag.add('charts', cached_charts, dataset_path, 'forensic_charts', None, lambda: build_forensic_charts(df, forensics))
+        outputs = dag.run()
+        case_file, = outputs['case_file']
+        forensic_charts = outputs['charts']
+
+        return {
+            'success': True,
+            'case_file': case_file,
+            'forensics': forensics,
+            'forensic_charts': forensic_charts,
+            'prompt_tokens': prompt_tokens
+        }, 200
+
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+
+# ─────────────────────────────────────────────
+# AGENT ENDPOINTS
+# Each runs inline, or as a background job when the body has "async": true
+# (202 + job id; poll /jobs/<id> or stream /jobs/<id>/events). "mode":
+# "crew" | "direct" overrides the endpoint's AGENT_MODE for one request;
+# "timings": true adds the request's stage and LLM timings to the payload.
+# ─────────────────────────────────────────────
+
+def wants_timings(data):
+    return str(data.get('timings', False)).lower() in ('true', '1')
+
+
+def timings_block(data):
+    """{'timings': <request trace summary>} when the body asks for "timings": true, else {}."""
+    active = tracing.current()
+    return {'timings': active.summary()} if active is not None and wants_timings(data) else {}
+
+
+def request_scoped(kind, runner, mode):
+    """
+    Runs an endpoint inside a request trace and in its agent mode, with the
+    LLM response and chart caches bypassed when the body has "use_cache": false.
+    """
+    def run(data):
+        use_cache = data.get('use_cache', True)
+        with tracing.trace(kind) as request_trace, llm_cache.disabled(not use_cache), \
+                chart_cache.disabled(not use_cache), agent_runner.using(mode):
+            payload, status = runner(data)
+            if status >= 400:
+                request_trace.status = 'error'
+            return {**payload, **timings_block(data)}, status
+    return run
+
+
+def dispatch(kind, runner):
+    data = request.json or {}
+    try:
+        mode = agent_runner.mode_for(kind, AGENT_MODES, data.get('mode'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    runner = request_scoped(kind, runner, mode)
+    if not data.get('async'):
+        payload, status = runner(data)
+        return jsonify(payload), status
+    try:
+        job = job_manager.submit(kind, runner, data)
+    except jobs.QueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify({
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'status_url': f"/jobs/{job['job_id']}",
+        'events_url': f"/jobs/{job['job_id']}/events"
+    }), 202
+
+
+@app.route('/analyze', methods=['POST'])
+def analyze():
+    return dispatch('analyze', run_analyze)
+
+
+@app.route('/query', methods=['POST'])
+def query():
+    return dispatch('query', run_query)
+
+
+@app.route('/visualize', methods=['POST'])
+def visualize():
+    return dispatch('visualize', run_visualize)
+
+
+@app.route('/detective', methods=['POST'])
+def detective_mode():
+    return dispatch('detective', run_detective)
+
+
+def job_view(job):
+    return {k: v for k, v in job.items() if k != 'version'}
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job_view(job))
+
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events: one `status` event per change, ending with the final state."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+
+    def stream(job):
+        while True:
+            yield sse_event('status', job_view(job))
+            if job['status'] in jobs.TERMINAL_STATES:
+                return
+            version = job['version']
+            while True:
+                job = job_manager.wait_for_change(job_id, version)
+                if job is None:
+                    return
+                if job['version'] > version:
+                    break
+                yield ": keep-alive\n\n"
+
+    return sse_response(stream(job))
+
+
+# ─────────────────────────────────────────────
+# STREAMING ENDPOINTS (server-sent events)
+# Each stage is emitted as soon as it is available, and narrative text
+# token by token, so the first useful bytes arrive after the first agent
+# step instead of after the whole pipeline.
+# ─────────────────────────────────────────────
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {chart_codec.dumps_str(data)}\n\n"
+
+
+def stream_agent(agent, prompt):
+    """
+    Streams an agent's answer token by token. Crew.kickoff() only returns
+    whole outputs, so this calls the agents' shared LLM (fallback included)
+    directly with the agent's persona as the system message.
+    """
+    with tracing.span('agent.stream', agent=agent.role):
+        for chunk in llm.stream(agent_runner.persona_messages(agent, prompt)):
+            if chunk.content:
+                yield chunk.content
+
+
+def sse_response(events, use_cache=True, mode=None, endpoint=None):
+    """
+    Wraps an event generator; its agent steps run in `mode`, its LLM calls
+    and charts bypass the response and chart caches unless `use_cache`, and
+    with an `endpoint` the whole stream is one request trace.
+    """
+    def scoped():
+        with llm_cache.disabled(not use_cache), chart_cache.disabled(not use_cache), agent_runner.using(mode), \
+                (tracing.trace(endpoint) if endpoint else nullcontext()):
+            yield from events
+    return Response(stream_with_context(scoped()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def stream_request_data():
+    """Stream routes accept a JSON body (fetch) or query parameters (EventSource)."""
+    return request.get_json(silent=True) or request.args.to_dict()
+
+
+def stream_uses_cache(data):
+    return str(data.get('use_cache', True)).lower() not in ('false', '0')
+
+
+@app.route('/query/stream', methods=['GET', 'POST'])
+def query_stream():
+    """
+    Streaming /query. Events: `interpretation`, `sql`, `result`, then
+    `narrative` (one per text delta) with `chart` sent whenever the result
+    chart finishes rendering, then `done` carrying the same payload /query
+    returns. Failures end the stream with an `error` event.
+    """
+    data = stream_request_data()
+    try:
+        mode = agent_runner.mode_for('query', AGENT_MODES, data.get('mode'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        dataset_path = resolve_dataset(data.get('dataset_id'))
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({'error': str(e)}), 404
+    user_query = (data.get('query') or '').strip()
+    if not user_query:
+        return jsonify({'error': 'Query is required'}), 400
+
+    def events():
+        try:
+            prompt_tokens = prompt_budget.start_report()
+            profile = get_profile(dataset_path)
+            fingerprint = f"{sql_engine.dialect}:{query_cache.schema_fingerprint(dataset_store.read_schema(dataset_path))}"
+            data_version = dataset_store.dataset_version(dataset_path)
+
+            plan = plan_df = None
+            if str(data.get('fast_path', True)).lower() not in ('false', '0'):
+                plan = fast_planner.plan(user_query, profile)
+            if plan:
+                try:
+                    plan_df = run_fast_path(dataset_path, plan)
+                except Exception:
+                    plan = None
+
+            cached, cache_match = (None, None)
+            if plan is None and stream_uses_cache(data):
+                cached, cache_match = nl_query_cache.lookup(fingerprint, user_query)
+            cache_info = {
+                'hit': cached is not None,
+                'match': cache_match,
+                'similarity': cached['similarity'] if cached else None,
+            }
+            path = 'fast_path' if plan else 'cache' if cached else 'crew'
+            fast_planner.record_served(path)
+
+            if plan:
+                interpretation, sql_query = plan['interpretation'], plan['sql']
+                yield sse_event('interpretation', {'interpretation': interpretation, 'cache': cache_info, 'path': path})
+            elif cached:
+                interpretation, sql_query = cached['interpretation'], cached['sql']
+                yield sse_event('interpretation', {'interpretation': interpretation, 'cache': cache_info, 'path': path})
+            else:
+                interpret_raw, = agent_runner.run_tasks([interpret_task_for(user_query, profile)], llm)
+                interpretation = parse_json_safe(interpret_raw) or {}
+                yield sse_event('interpretation', {'interpretation': interpretation, 'cache': cache_info, 'path': path})
+
+                sql_task = sql_task_for(profile, user_query, interpretation=interpretation)
+                sql_raw, = agent_runner.run_tasks([sql_task], llm)
+                sql_query = sanitize_sql(sql_raw)
+            yield sse_event('sql', {'sql_query': sql_query})
+
+            result_df = None
+            narrative = None
+            if interpretation.get('valid', True) and sql_query != 'INVALID_QUERY' and is_safe_query(sql_query):
+                try:
+                    result_df = plan_df if plan else sql_engine.execute(dataset_path, sql_query)
+                    query_result = {
+                        'data': result_df.to_dict('records'),
+                        'columns': result_df.columns.tolist(),
+                        'row_count': len(result_df)
+                    }
+                except Exception as e:
+                    query_result = {'error': f'SQL execution failed: {str(e)}'}
+            else:
+                query_result = {'error': 'Could not generate a valid query for this request.'}
+            yield sse_event('result', query_result)
+
+            # The chart renders while narrative tokens stream; it is sent as soon as it is ready.
+            chart_future = pipeline_executor.submit(
+                contextvars.copy_context().run, build_result_chart, user_query, result_df
             )
-            forensic_charts.append({
-                'title': f'Outlier Map — {worst_col}',
-                'plotly_json': fig_to_json(fig)
+            chart_sent = False
+
+            if result_df is not None:
+                if plan:
+                    narrative = fast_path.narrate(plan, result_df)
+                    yield sse_event('narrative', {'delta': narrative})
+                elif cached and cached['data_version'] == data_version:
+                    narrative = cached['narrative']
+                    yield sse_event('narrative', {'delta': narrative})
+                else:
+                    parts = []
+                    for delta in stream_agent(insight_narrator, narrate_prompt(user_query, result_df)):
+                        if not chart_sent and chart_future.done():
+                            chart_sent = True
+                            yield sse_event('chart', {'result_chart': chart_future.result()})
+                        parts.append(delta)
+                        yield sse_event('narrative', {'delta': delta})
+                    narrative = ''.join(parts)
+                if path == 'crew':
+                    nl_query_cache.store(fingerprint, user_query, interpretation, sql_query, narrative, data_version)
+
+            result_chart = chart_future.result()
+            if not chart_sent:
+                yield sse_event('chart', {'result_chart': result_chart})
+
+            yield sse_event('done', {
+                'success': True,
+                'path': path,
+                'interpretation': interpretation,
+                'sql_query': sql_query,
+                'result': query_result,
+                'narrative': narrative,
+                'result_chart': result_chart,
+                'cache': cache_info,
+                'prompt_tokens': prompt_tokens,
+                **timings_block(data)
             })
+        except Exception as e:
+            tracing.mark_error()
+            yield sse_event('error', {'error': str(e)})
 
-        # Missing data pattern heatmap
-        if df.isnull().any().any():
-            missing_matrix = df.isnull().astype(int)
-            sample = missing_matrix.head(100)
-            fig = go.Figure(data=go.Heatmap(
-                z=sample.values.T,
-                x=[str(i) for i in sample.index],
-                y=sample.columns.tolist(),
-                colorscale=[[0, '#1e1e2e'], [1, '#f43f5e']],
-                showscale=False,
-                hoverongaps=False
-            ))
-            fig.update_layout(
-                title='Missing Data Pattern (first 100 rows)',
-                template='plotly_dark',
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(15,15,25,0.8)',
-                font=dict(color='#e2e8f0'),
-                xaxis_title='Row Index',
-                yaxis_title='Columns',
-                height=400
-            )
-            forensic_charts.append({
-                'title': 'Missing Data Pattern',
-                'plotly_json': fig_to_json(fig)
+    return sse_response(events(), stream_uses_cache(data), mode, 'query_stream')
+
+
+@app.route('/detective/stream', methods=['GET', 'POST'])
+def detective_stream():
+    """
+    Streaming /detective. Events: `forensics`, `charts` (both computed
+    before any LLM call), `case_file` (one per text delta), then `done`
+    with the same payload /detective returns, or `error`.
+    """
+    data = stream_request_data()
+    try:
+        mode = agent_runner.mode_for('detective', AGENT_MODES, data.get('mode'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        dataset_path = resolve_dataset(data.get('dataset_id'))
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({'error': str(e)}), 404
+
+    def events():
+        try:
+            prompt_tokens = prompt_budget.start_report()
+            df = load_dataset(dataset_path)
+            profile = get_profile(dataset_path, df)
+
+            forensics = compute_forensics(df)
+            yield sse_event('forensics', forensics)
+
+            forensic_charts = cached_charts(dataset_path, 'forensic_charts', None, lambda: build_forensic_charts(df, forensics))
+            yield sse_event('charts', {'forensic_charts': forensic_charts})
+
+            parts = []
+            for delta in stream_agent(detective_agent, detective_prompt(profile, forensics)):
+                parts.append(delta)
+                yield sse_event('case_file', {'delta': delta})
+
+            yield sse_event('done', {
+                'success': True,
+                'case_file': ''.join(parts),
+                'forensics': forensics,
+                'forensic_charts': forensic_charts,
+                'prompt_tokens': prompt_tokens,
+                **timings_block(data)
             })
+        except Exception as e:
+            tracing.mark_error()
+            yield sse_event('error', {'error': str(e)})
+
+    return sse_response(events(), stream_uses_cache(data), mode, 'detective_stream')
+
+
+@app.route('/admin/cache', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        'dataframe_cache': dataframe_cache.stats(),
+        'query_cache': nl_query_cache.stats(),
+        'jobs': job_manager.stats(),
+        'llm_gateway': llm_gateway.stats(),
+        'fast_path': fast_planner.stats(),
+        'chart_cache': chart_store.stats() if chart_store is not None else None,
+        'chart_pool': chart_renderer.stats(),
+        'agent_modes': {'configured': AGENT_MODES, 'runs': agent_runner.stats()}
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint: request, stage and LLM metrics plus cache / queue gauges."""
+    frames = dataframe_cache.stats()
+    gateway = llm_gateway.stats()
+    job_counts = job_manager.stats()
+    gauges = {
+        'datadetective_dataframe_cache_bytes': ('Bytes held by the DataFrame cache.', frames['bytes']),
+        'datadetective_dataframe_cache_entries': ('DataFrames held by the DataFrame cache.', frames['entries']),
+        'datadetective_query_cache_entries': ('Answers held by the NL query cache.', nl_query_cache.stats()['entries']),
+        'datadetective_llm_in_flight': ('LLM requests currently on the wire.', gateway['in_flight']),
+        'datadetective_jobs': ('Background jobs by status.', {
+            (('status', state),): job_counts[state] for state in (jobs.QUEUED, jobs.RUNNING, jobs.SUCCEEDED, jobs.FAILED)
+        }),
+    }
+    if 'cache' in gateway:
+        gauges['datadetective_llm_cache_entries'] = ('Completions held by the LLM response cache.', gateway['cache']['entries'])
+    if chart_store is not None:
+        charts = chart_store.stats()
+        gauges['datadetective_chart_cache_entries'] = ('Chart payloads held by the chart cache.', charts['entries'])
+        gauges['datadetective_chart_cache_bytes'] = ('Bytes held by the chart cache.', charts['bytes'])
+    return Response(tracing.render(gauges), mimetype='text/plain; version=0.0.4')
 
-        return jsonify({
-            'success': True,
-            'case_file': result.tasks_output[0].raw,
-            'forensics': forensics,
-            'forensic_charts': forensic_charts
-        })
 
+@app.route('/admin/indexes/<dataset_id>', methods=['GET'])
+def index_report(dataset_id):
+    try:
+        dataset_path = resolve_dataset(dataset_id)
+        return jsonify({'dataset_id': dataset_id, 'backend': QUERY_BACKEND, **sql_engine.index_report(dataset_path)})
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({'error': str(e)}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1111,13 +1632,19 @@ def cleanup():
         if dataset_id:
             try:
                 path = resolve_dataset(dataset_id)
-                os.unlink(path)
-            except Exception:
-                pass
+            except (ValueError, FileNotFoundError):
+                path = None
+            if path is not None:
+                # Uploads of identical content share one dataset; only the
+                # last reference removes the data. Cached frames and query
+                # connections go first so nothing still maps the files.
+                with dataset_store.dataset_lock(path):
+                    if dataset_store.drop_reference(path) == 0:
+                        dataframe_cache.invalidate(os.path.basename(path))
+                        if chart_store is not None:
+                            chart_store.drop_dataset(os.path.basename(path))
+                        sql_engine.release(path)
+                        dataset_store.remove_dataset(path)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-
-
-if __name__ == '__main__':
-    app.run(debug=True, port=5000, threaded=True)
\ No newline at end of file
@@ -0,0 +1,718 @@
+"""
+DataDetective performance benchmarks.
+
+Usage (from crewai_agents/):
+    python bench.py query-backends [--scale 100] [--repeat 5]
+    python bench.py llm-gateway [--prompts 16] [--latency 0.25] [--concurrency 8]
+    python bench.py agent-modes [--repeat 3] [--latency 0.25]
+    python bench.py charts [--scale 1] [--repeat 5]
+    python bench.py chart-reduce [--scale 100] [--repeat 3]
+    python bench.py kde [--scale 100] [--repeat 3]
+    python bench.py chart-cache [--scale 20] [--repeat 3]
+    python bench.py chart-pool [--scale 100] [--repeat 3] [--workers 1,2,4]
+
+Benchmarks run against the bundled Walmart-style sample (temp_dataset_*.csv)
+or a local stub OpenRouter server, and need no API key or network access.
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import threading
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import statistics
+import gzip
+
+import pandas as pd
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import dataset_store
+import query_engine
+from prompt_budget import estimate_tokens
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_sample(scale: int = 1) -> pd.DataFrame:
+    matches = sorted(glob.glob(os.path.join(HERE, 'temp_dataset_*.csv')))
+    if not matches:
+        raise SystemExit('No temp_dataset_*.csv sample found next to bench.py')
+    df = pd.read_csv(matches[0])
+    df['Date'] = pd.to_datetime(df['Date'], dayfirst=True)
+    if scale > 1:
+        df = pd.concat([df] * scale, ignore_index=True)
+    return df
+
+
+def timed(fn, repeat: int):
+    """Returns (median seconds, last result) over `repeat` runs."""
+    samples, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def import_app(**env):
+    """Imports the Flask app module offline (placeholder API key, no LLM response cache)."""
+    os.environ.update(env)
+    os.environ.setdefault('OPENROUTER_API_KEY', 'stub-key')
+    os.environ.setdefault('LLM_CACHE_PATH', '')
+    import app
+    return app
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print('  '.join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print('  '.join('-' * w for w in widths))
+    for row in rows:
+        print('  '.join(str(v).ljust(w) for v, w in zip(row, widths)))
+
+
+# ─────────────────────────────────────────────
+# QUERY BACKENDS
+# ─────────────────────────────────────────────
+
+# Typical sql_craftsman output shapes; written in the SQL subset both backends accept.
+BENCH_QUERIES = {
+    'top stores by sales': (
+        'SELECT Store, SUM(Weekly_Sales) AS total_sales FROM data_table '
+        'GROUP BY Store ORDER BY total_sales DESC LIMIT 10'
+    ),
+    'holiday vs non-holiday': (
+        'SELECT Holiday_Flag, AVG(Weekly_Sales) AS avg_sales, COUNT(*) AS weeks '
+        'FROM data_table GROUP BY Holiday_Flag'
+    ),
+    'filtered store aggregate': (
+        'SELECT AVG(Temperature) AS avg_temp, MAX(Fuel_Price) AS max_fuel '
+        'FROM data_table WHERE Store = 7 AND Holiday_Flag = 1'
+    ),
+    'multi-key group': (
+        'SELECT Store, Holiday_Flag, AVG(Unemployment) AS unemp, AVG(CPI) AS cpi '
+        'FROM data_table GROUP BY Store, Holiday_Flag ORDER BY Store LIMIT 100'
+    ),
+}
+
+
+def bench_query_backends(scale: int, repeat: int):
+    df = load_sample(scale)
+    workdir = tempfile.mkdtemp(prefix='dd_bench_')
+    dataset_path = os.path.join(workdir, dataset_store.new_dataset_id())
+    try:
+        dataset_store.write_dataset(dataset_path, df, 'csv')
+        print(f'Dataset: {len(df):,} rows x {df.shape[1]} columns (sample x{scale})\n')
+
+        start = time.perf_counter()
+        sqlite_engine = query_engine.create_engine('sqlite')
+        sqlite_engine.ensure(dataset_path)
+        build_seconds = time.perf_counter() - start
+        print(f'sqlite: one-off query.sqlite build {build_seconds:.2f}s')
+
+        start = time.perf_counter()
+        conn = sqlite3.connect(':memory:')
+        df.to_sql('data_table', conn, index=False)
+        conn.close()
+        print(f'legacy: per-request in-memory df.to_sql {time.perf_counter() - start:.2f}s\n')
+
+        engines = {'sqlite': sqlite_engine}
+        try:
+            engines['duckdb'] = query_engine.create_engine('duckdb')
+        except ImportError:
+            print('duckdb not installed — skipping the duckdb backend\n')
+
+        rows = []
+        for name, sql in BENCH_QUERIES.items():
+            seconds, results = {}, {}
+            for backend, engine in engines.items():
+                engine.execute(dataset_path, sql)  # warm-up
+                seconds[backend], results[backend] = timed(lambda: engine.execute(dataset_path, sql), repeat)
+            row = [name] + [f'{seconds[b] * 1000:.1f} ms' for b in engines]
+            if len(engines) == 2:
+                row.append(f"{seconds['sqlite'] / max(seconds['duckdb'], 1e-9):.1f}x")
+                row.append('yes' if len(results['sqlite']) == len(results['duckdb']) else 'NO')
+            rows.append(row)
+
+        headers = ['query'] + list(engines)
+        if len(engines) == 2:
+            headers += ['speedup', 'same rows']
+        print_table(headers, rows)
+
+        for engine in engines.values():
+            engine.release(dataset_path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ─────────────────────────────────────────────
+# LLM GATEWAY
+# ─────────────────────────────────────────────
+
+class StubOpenRouter(BaseHTTPRequestHandler):
+    """
+    OpenAI-compatible /chat/completions stub. Echoes the last user message
+    after `latency` seconds, streams word-by-word when asked, and records
+    client ports so connection reuse is visible. `fail_first` answers the
+    first attempt at each prompt with a 429; models in `rejected_models`
+    always get a 503. Prompts carrying CrewAI's ReAct instructions get a
+    well-formed "Final Answer:" reply, so a crew step finishes in one turn.
+    Usage reports estimated token counts.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.25
+    fail_first = False
+    rejected_models = set()
+    lock = threading.Lock()
+    requests = 0
+    ports = set()
+    seen = set()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = 'application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = payload['messages'][-1]['content']
+        cls = type(self)
+        with cls.lock:
+            cls.requests += 1
+            cls.ports.add(self.client_address[1])
+            fail = cls.fail_first and prompt not in cls.seen
+            cls.seen.add(prompt)
+        time.sleep(cls.latency)
+        if payload['model'] in cls.rejected_models:
+            return self._send(503, b'{"error": {"message": "model unavailable"}}')
+        if fail:
+            return self._send(429, b'{"error": {"message": "rate limited"}}')
+
+        answer = f'echo: {prompt}'
+        text = ' '.join(str(m.get('content') or '') for m in payload['messages'])
+        if 'Final Answer:' in text:
+            answer = f'Thought: I now know the final answer\nFinal Answer: {answer}'
+        if payload.get('stream'):
+            words = answer.split(' ')
+            events = [
+                'data: ' + json.dumps({'choices': [{'delta': {'content': piece}}]}) + '\n\n'
+                for piece in [words[0]] + [' ' + w for w in words[1:]]
+            ]
+            return self._send(200, (''.join(events) + 'data: [DONE]\n\n').encode(), 'text/event-stream')
+        body = {
+            'model': payload['model'],
+            'choices': [{'message': {'role': 'assistant', 'content': answer}}],
+            'usage': {'prompt_tokens': estimate_tokens(text), 'completion_tokens': estimate_tokens(answer)},
+        }
+        self._send(200, json.dumps(body).encode())
+
+
+def bench_llm_gateway(prompts: int, latency: float, concurrency: int):
+    import httpx
+    from llm_gateway import LLMGateway
+
+    StubOpenRouter.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOpenRouter)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}/api/v1'
+    model = 'openrouter/stub/model'
+    questions = [f'question {i}' for i in range(prompts)]
+    expected = [f'echo: {q}' for q in questions]
+    failures = []
+
+    def reset():
+        StubOpenRouter.requests, StubOpenRouter.ports, StubOpenRouter.seen = 0, set(), set()
+
+    def legacy_call(q):
+        # What every call used to do: a fresh HTTP session per completion.
+        with httpx.Client(base_url=base_url, timeout=30) as client:
+            r = client.post('/chat/completions', json={'model': 'stub/model', 'messages': [{'role': 'user', 'content': q}]})
+            return r.json()['choices'][0]['message']['content']
+
+    gateway = LLMGateway('stub-key', base_url=base_url, default_concurrency=concurrency, backoff_seconds=0.05)
+    try:
+        rows = []
+        reset()
+        start = time.perf_counter()
+        answers = [legacy_call(q) for q in questions]
+        rows.append(['sequential, new session per call', f'{time.perf_counter() - start:.2f}s', len(StubOpenRouter.ports)])
+        if answers != expected:
+            failures.append('legacy answers mismatch')
+
+        reset()
+        start = time.perf_counter()
+        answers = [gateway.complete([{'role': 'user', 'content': q}], model=model)['content'] for q in questions]
+        rows.append(['sequential, pooled gateway', f'{time.perf_counter() - start:.2f}s', len(StubOpenRouter.ports)])
+        if answers != expected:
+            failures.append('sequential gateway answers mismatch')
+
+        reset()
+        start = time.perf_counter()
+        results = gateway.batch([{'messages': [{'role': 'user', 'content': q}], 'model': model} for q in questions])
+        rows.append([f'gateway.batch (concurrency {concurrency})', f'{time.perf_counter() - start:.2f}s', len(StubOpenRouter.ports)])
+        if [r['content'] for r in results] != expected:
+            failures.append('batch answers mismatch or out of order')
+
+        print(f'{prompts} prompts, {latency * 1000:.0f} ms stub latency\n')
+        print_table(['mode', 'wall time', 'connections'], rows)
+
+        # Behaviour checks: retries on 429, fallback, streaming.
+        reset()
+        StubOpenRouter.fail_first = True
+        before = gateway.stats()['retries']
+        results = gateway.batch([{'messages': [{'role': 'user', 'content': q}], 'model': model} for q in questions[:6]])
+        StubOpenRouter.fail_first = False
+        if [r.get('content') if isinstance(r, dict) else r for r in results] != expected[:6] or gateway.stats()['retries'] == before:
+            failures.append('429 responses were not retried')
+
+        StubOpenRouter.rejected_models = {'stub/model'}
+        strict = LLMGateway('stub-key', base_url=base_url, max_retries=0)
+        try:
+            strict.complete([{'role': 'user', 'content': 'x'}], model=model)
+            failures.append('exhausted retries did not raise')
+        except Exception:
+            pass
+        result = strict.complete([{'role': 'user', 'content': 'fb'}], model=model, fallbacks=['openrouter/stub/other'])
+        if result['content'] != 'echo: fb' or result['model'] != 'stub/other':
+            failures.append('fallback model was not used')
+        streamed = ''.join(strict.stream([{'role': 'user', 'content': 'fb'}], model=model, fallbacks=['openrouter/stub/other']))
+        if streamed != 'echo: fb':
+            failures.append('stream did not fall back')
+        StubOpenRouter.rejected_models = set()
+        strict.close()
+
+        streamed = ''.join(gateway.stream([{'role': 'user', 'content': 'stream me please'}], model=model))
+        if streamed != 'echo: stream me please':
+            failures.append(f'streamed text mismatch: {streamed!r}')
+
+        print(f"\nchecks: {'ok' if not failures else 'FAILED'}  (gateway stats: {gateway.stats()})")
+        for failure in failures:
+            print(f'  - {failure}')
+    finally:
+        gateway.close()
+        server.shutdown()
+    if failures:
+        sys.exit(1)
+
+
+# ─────────────────────────────────────────────
+# AGENT MODES
+# ─────────────────────────────────────────────
+
+def bench_agent_modes(repeat: int, latency: float):
+    """
+    The LLM steps of /query (interpret → SQL, narrate) and /detective run
+    through CrewAI and as direct completions against the stub server.
+    """
+    StubOpenRouter.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOpenRouter)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app = import_app(OPENROUTER_BASE_URL=f'http://127.0.0.1:{server.server_address[1]}/api/v1', LLM_CACHE_PATH='')
+    import agent_runner
+
+    df = load_sample()
+    profile = app.build_rich_profile(df)
+    forensics = app.compute_forensics(df)
+    question = 'Which stores had the highest total weekly sales in holiday weeks?'
+    result_df = df[df['Holiday_Flag'] == 1].groupby('Store', as_index=False)['Weekly_Sales'].sum().nlargest(10, 'Weekly_Sales')
+    steps = 4
+
+    def workload():
+        app.generate_sql(question, profile)
+        app.narrate_result(question, result_df)
+        detective_task = app.Task(description=app.detective_prompt(profile, forensics), agent=app.detective_agent,
+                                  expected_output='A structured detective case file in markdown')
+        agent_runner.run_tasks([detective_task], app.llm)
+
+    rows = []
+    failures = []
+    try:
+        for mode in agent_runner.MODES:
+            StubOpenRouter.requests = 0
+            before = app.llm_gateway.stats()
+            with agent_runner.using(mode):
+                seconds, _ = timed(workload, repeat)
+            after = app.llm_gateway.stats()
+            calls = StubOpenRouter.requests / repeat
+            prompt_tokens = (after['prompt_tokens'] - before['prompt_tokens']) / repeat
+            completion_tokens = (after['completion_tokens'] - before['completion_tokens']) / repeat
+            rows.append([mode, f'{seconds:.2f}s', f'{calls:.1f}',
+                         f'{prompt_tokens:,.0f}', f'{completion_tokens:,.0f}'])
+            if mode == 'direct' and calls != steps:
+                failures.append(f'direct mode made {calls:.1f} LLM calls for {steps} steps')
+
+        print(f'{steps} agent steps per run, {repeat} runs, {latency * 1000:.0f} ms stub latency\n')
+        print_table(['mode', 'median run', 'LLM calls / run', 'prompt tokens / run', 'completion tokens / run'], rows)
+        print(f"\nchecks: {'ok' if not failures else 'FAILED'}")
+        for failure in failures:
+            print(f'  - {failure}')
+    finally:
+        app.llm_gateway.close()
+        server.shutdown()
+    if failures:
+        sys.exit(1)
+
+
+# ─────────────────────────────────────────────
+# CHART SERIALIZATION
+# ─────────────────────────────────────────────
+
+def _same_values(old, new) -> bool:
+    """Compares pio.to_json output with decoded figure_dict output (typed arrays → NumPy)."""
+    import numpy as np
+    if isinstance(new, np.ndarray):
+        expected = np.array([np.nan if v is None else v for v in np.ravel(np.array(old, dtype=object))], dtype=float)
+        return expected.shape == new.ravel().shape and np.allclose(expected, new.ravel().astype(float), equal_nan=True)
+    if isinstance(old, dict) and isinstance(new, dict):
+        return old.keys() == new.keys() and all(_same_values(old[k], new[k]) for k in old)
+    if isinstance(old, list) and isinstance(new, list):
+        return len(old) == len(new) and all(_same_values(a, b) for a, b in zip(old, new))
+    if isinstance(old, float) and isinstance(new, float):
+        return abs(old - new) <= 1e-12 * max(1.0, abs(old))
+    return old == new
+
+
+def bench_chart_serialization(scale: int, repeat: int):
+    """
+    pio.to_json → json.loads → json.dumps (the old fig_to_json + jsonify)
+    against figure_dict → orjson, for every chart smart_visualize plans.
+    """
+    import orjson
+    import plotly.io as pio
+    import chart_codec
+    app = import_app()
+
+    df = load_sample(scale)
+    figures = [(spec['title'], app.build_figure(df, spec, app.CHART_PARAMS)) for spec in app.plan_charts(df)]
+    rows, failures = [], []
+    totals = [0.0, 0.0, 0, 0, 0, 0]
+    for title, fig in figures:
+        old_seconds, old_body = timed(lambda: json.dumps(json.loads(pio.to_json(fig))).encode(), repeat)
+        new_seconds, new_body = timed(lambda: chart_codec.dumps(chart_codec.figure_dict(fig)), repeat)
+        old_gz, new_gz = len(gzip.compress(old_body)), len(gzip.compress(new_body))
+        for i, value in enumerate((old_seconds, new_seconds, len(old_body), len(new_body), old_gz, new_gz)):
+            totals[i] += value
+        rows.append([title[:40], f'{old_seconds * 1000:.1f}ms', f'{new_seconds * 1000:.1f}ms',
+                     f'{len(old_body) / 1024:.0f}K', f'{len(new_body) / 1024:.0f}K', f'{old_gz / 1024:.0f}K', f'{new_gz / 1024:.0f}K'])
+        if not _same_values(json.loads(old_body), chart_codec.decode(orjson.loads(new_body))):
+            failures.append(f'{title}: decoded values differ from pio.to_json')
+    rows.append(['total', f'{totals[0] * 1000:.1f}ms', f'{totals[1] * 1000:.1f}ms', f'{totals[2] / 1024:.0f}K',
+                 f'{totals[3] / 1024:.0f}K', f'{totals[4] / 1024:.0f}K', f'{totals[5] / 1024:.0f}K'])
+
+    print(f'{len(df):,} rows, {len(figures)} charts, median of {repeat}\n')
+    print_table(['chart', 'pio+json', 'codec+orjson', 'bytes (old)', 'bytes (new)', 'gzip (old)', 'gzip (new)'], rows)
+    print(f"\nchecks: {'ok' if not failures else 'FAILED'}")
+    for failure in failures:
+        print(f'  - {failure}')
+    app.llm_gateway.close()
+    if failures:
+        sys.exit(1)
+
+
+# ─────────────────────────────────────────────
+# CHART DATA REDUCTION
+# ─────────────────────────────────────────────
+
+def _unreduced_figure(df, spec):
+    """The histogram / box / scatter-matrix traces as built before reduction (every row shipped)."""
+    import numpy as np
+    import plotly.express as px
+    import plotly.graph_objects as go
+    from scipy import stats
+    if spec['chart_type'] == 'histogram':
+        values = df[spec['column']].dropna()
+        x_range = np.linspace(values.min(), values.max(), 200)
+        kde_vals = stats.gaussian_kde(values)(x_range) * len(values) * (values.max() - values.min()) / 40
+        return go.Figure([go.Histogram(x=values, nbinsx=40), go.Scatter(x=x_range, y=kde_vals, mode='lines')])
+    if spec['chart_type'] == 'boxplot':
+        return go.Figure([go.Box(y=df[col].dropna(), name=col, boxpoints='outliers') for col in spec['columns']])
+    cols = spec['columns'] + ([spec['color']] if spec['color'] else [])
+    return px.scatter_matrix(df[cols].dropna(), dimensions=spec['columns'], color=spec['color'])
+
+
+def _unreduced_outlier_map(df, column):
+    import plotly.graph_objects as go
+    from scipy import stats
+    z_scores = stats.zscore(df[column].dropna())
+    return go.Figure(go.Scatter(
+        x=list(range(len(z_scores))), y=z_scores, mode='markers',
+        marker=dict(color=['#f43f5e' if abs(z) > 3 else '#6366f1' for z in z_scores],
+                    size=[8 if abs(z) > 3 else 4 for z in z_scores]),
+    ))
+
+
+def _points(fig) -> int:
+    """Values shipped in the figure's traces (per axis, per scatter-matrix dimension)."""
+    total = 0
+    for trace in fig.data:
+        dims = getattr(trace, 'dimensions', None)
+        if dims:
+            total += sum(len(d.values) for d in dims)
+        else:
+            total += max((len(v) for v in (trace['x'], trace['y']) if v is not None and not isinstance(v, str)), default=0)
+    return total
+
+
+def _markers(fig) -> int:
+    """Individually drawn points: scatter markers and scatter-matrix rows."""
+    return sum(len(t.dimensions[0].values) if t.type == 'splom' else len(t.y) for t in fig.data if t.type in ('scatter', 'splom'))
+
+
+def bench_chart_reduce(scale: int, repeat: int):
+    """
+    Build + serialise time and payload size of the histogram, box-plot,
+    scatter-matrix and outlier-map charts with every row shipped against the
+    reduced charts, with checks that the reduction kept what the charts show.
+    """
+    import numpy as np
+    import chart_codec
+    from scipy import stats
+    app = import_app()
+
+    df = load_sample(scale)
+    serialise = lambda fig: chart_codec.dumps(chart_codec.figure_dict(fig))
+    jobs = [(spec['title'], lambda spec=spec: _unreduced_figure(df, spec), lambda spec=spec: app.build_figure(df, spec, app.CHART_PARAMS), spec)
+            for spec in app.plan_charts(df) if spec['chart_type'] in ('histogram', 'boxplot', 'scatter_matrix')]
+    forensics = app.compute_forensics(df)
+    worst = max(forensics['extreme_outliers_zscore'], key=lambda c: forensics['extreme_outliers_zscore'][c]['count'])
+    jobs.append((f'Outlier Map — {worst}', lambda: _unreduced_outlier_map(df, worst), lambda: app.build_outlier_map(df, worst), None))
+
+    rows, failures = [], []
+    for title, old_build, new_build, spec in jobs:
+        old_seconds, (old_fig, old_body) = timed(lambda: (lambda f: (f, serialise(f)))(old_build()), repeat)
+        new_seconds, (new_fig, new_body) = timed(lambda: (lambda f: (f, serialise(f)))(new_build()), repeat)
+        rows.append([title[:40], f'{old_seconds * 1000:.0f}ms', f'{new_seconds * 1000:.0f}ms', f'{_points(old_fig):,}',
+                     f'{_points(new_fig):,}', f'{len(old_body) / 1024:.0f}K', f'{len(new_body) / 1024:.0f}K'])
+
+        kind = spec['chart_type'] if spec else 'outlier_map'
+        if kind == 'histogram':
+            if int(np.sum(new_fig.data[0].y)) != int(df[spec['column']].notna().sum()):
+                failures.append(f'{title}: bin counts do not add up to the rows')
+        elif kind == 'boxplot':
+            boxes = [t for t in new_fig.data if t.type == 'box']
+            for box, col in zip(boxes, spec['columns']):
+                q1, med, q3 = np.percentile(df[col].dropna(), [25, 50, 75])
+                if not np.allclose([box.q1[0], box.median[0], box.q3[0]], [q1, med, q3]):
+                    failures.append(f'{title}: quartiles differ for {col}')
+        elif kind == 'scatter_matrix':
+            frame = df[spec['columns']].dropna()
+            z = np.abs(stats.zscore(frame, axis=0)).max(axis=1)
+            expected = set(np.round(frame.to_numpy()[z > 3][:, 0], 6))
+            shipped = set(np.round(np.concatenate([t.dimensions[0].values for t in new_fig.data]), 6))
+            if not expected <= shipped:
+                failures.append(f'{title}: outlier rows were sampled away')
+        else:
+            z = stats.zscore(df[worst].dropna())
+            flagged = np.flatnonzero(np.abs(z) > 3)
+            shipped = set(np.asarray(new_fig.data[0].x, dtype=int).tolist())
+            # More flagged rows than the budget: the budget is spent on flagged rows only
+            expected, within = (set(flagged.tolist()), shipped) if len(flagged) < app.CHART_POINT_BUDGET else (shipped, set(flagged.tolist()))
+            if not expected <= within:
+                failures.append(f'{title}: flagged rows missing from the outlier map')
+        if _markers(new_fig) > app.CHART_POINT_BUDGET:
+            failures.append(f'{title}: {_markers(new_fig):,} markers exceed the point budget')
+
+    print(f'{len(df):,} rows, point budget {app.CHART_POINT_BUDGET:,}, median of {repeat}\n')
+    print_table(['chart', 'every row', 'reduced', 'values (old)', 'values (new)', 'bytes (old)', 'bytes (new)'], rows)
+    print(f"\nchecks: {'ok' if not failures else 'FAILED'}")
+    for failure in failures:
+        print(f'  - {failure}')
+    app.llm_gateway.close()
+    if failures:
+        sys.exit(1)
+
+
+# ─────────────────────────────────────────────
+# KDE OVERLAY
+# ─────────────────────────────────────────────
+
+def bench_kde(scale: int, repeat: int):
+    """scipy.stats.gaussian_kde on 200 points vs chart_reduce.kde (binned FFT), per numeric column."""
+    import numpy as np
+    from scipy import stats
+    import chart_reduce
+
+    df = load_sample(scale)
+    rows, failures = [], []
+    totals = [0.0, 0.0]
+    for col in df.select_dtypes('number').columns:
+        values = df[col].dropna().to_numpy(dtype=float)
+        x = np.linspace(values.min(), values.max(), 200)
+        old_seconds, expected = timed(lambda: stats.gaussian_kde(values)(x), repeat)
+        new_seconds, (new_x, density) = timed(lambda: chart_reduce.kde(values), repeat)
+        error = float(np.abs(density - expected).max() / expected.max())
+        totals[0] += old_seconds
+        totals[1] += new_seconds
+        rows.append([col, f'{old_seconds * 1000:.1f}ms', f'{new_seconds * 1000:.1f}ms',
+                     f'{old_seconds / new_seconds:.0f}x', f'{error:.1e}'])
+        # 1% of the curve's peak is well under a pixel on a 400px-high chart
+        if not np.allclose(new_x, x) or error > 0.01:
+            failures.append(f'{col}: curve differs from gaussian_kde by {error:.1%} of its peak')
+    rows.append(['total', f'{totals[0] * 1000:.1f}ms', f'{totals[1] * 1000:.1f}ms', f'{totals[0] / totals[1]:.0f}x', ''])
+
+    print(f'{len(df):,} rows, 200-point curves, median of {repeat}\n')
+    print_table(['column', 'gaussian_kde', 'binned FFT', 'speedup', 'max error / peak'], rows)
+    print(f"\nchecks: {'ok' if not failures else 'FAILED'}")
+    for failure in failures:
+        print(f'  - {failure}')
+    if failures:
+        sys.exit(1)
+
+
+# ─────────────────────────────────────────────
+# CHART CACHE
+# ─────────────────────────────────────────────
+
+def bench_chart_cache(scale: int, repeat: int):
+    """The /visualize chart work (plan + every chart) rendered from scratch vs served from the chart cache."""
+    import chart_cache
+    import chart_codec
+    tmp = tempfile.mkdtemp(prefix='bench_chart_cache_')
+    try:
+        app = import_app(CHART_CACHE_PATH=os.path.join(tmp, 'charts.sqlite'))
+        dataset_path = os.path.join(tmp, dataset_store.new_dataset_id())
+        dataset_store.write_dataset(dataset_path, load_sample(scale), 'csv')
+
+        def dashboard():
+            plan = app.cached_charts(dataset_path, 'plan', None, lambda: app.plan_charts(app.load_dataset(dataset_path)))
+            return [app.cached_charts(dataset_path, 'chart', spec, lambda spec=spec: app.render_chart(app.load_dataset(dataset_path), spec, app.CHART_PARAMS))
+                    for spec in plan]
+
+        app.load_dataset(dataset_path)  # both sides start from the in-memory DataFrame
+        with chart_cache.disabled():
+            cold_seconds, cold = timed(dashboard, repeat)
+        dashboard()
+        warm_seconds, warm = timed(dashboard, repeat)
+        stats = app.chart_store.stats()
+
+        rows = [['rendered', f'{cold_seconds * 1000:.1f}ms', len(cold)],
+                ['chart cache', f'{warm_seconds * 1000:.1f}ms', len(warm)]]
+        print(f"{dataset_store.read_schema(dataset_path)['rows']:,} rows, median of {repeat}; "
+              f"{stats['entries']} cached payloads, {stats['bytes'] / 1024:.0f}K on disk\n")
+        print_table(['source', 'time', 'charts'], rows)
+        print(f'\nspeedup: {cold_seconds / warm_seconds:.0f}x')
+        same = chart_codec.dumps(cold) == chart_codec.dumps(warm)
+        print(f"checks: {'ok' if same else 'FAILED'}")
+        if not same:
+            print('  - cached payloads differ from freshly rendered ones')
+        app.llm_gateway.close()
+        if not same:
+            sys.exit(1)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# ─────────────────────────────────────────────
+# CHART PROCESS POOL
+# ─────────────────────────────────────────────
+
+def bench_chart_pool(scale: int, repeat: int, workers: list):
+    """Every /visualize chart rendered on one thread vs across N worker processes (warm pools)."""
+    import charts
+    import chart_codec
+    from chart_pool import ChartPool
+    tmp = tempfile.mkdtemp(prefix='bench_chart_pool_')
+    pools = []
+    try:
+        dataset_path = os.path.join(tmp, dataset_store.new_dataset_id())
+        dataset_store.write_dataset(dataset_path, load_sample(scale), 'csv')
+        df = dataset_store.read_dataset(dataset_path)
+        params = {'point_budget': 5000, 'histogram_bins': 40}
+        plan = charts.plan_charts(df)
+
+        base_seconds, expected = timed(lambda: [charts.render_chart(df, spec, params) for spec in plan], repeat)
+        expected = chart_codec.dumps(expected)
+        rows = [['1 thread', f'{base_seconds * 1000:.0f}ms', '1.0x']]
+        failures = []
+        for n in workers:
+            pool = ChartPool(n, min_rows=0)
+            pools.append(pool)
+            pool.render_all(dataset_path, plan, params)  # start workers, open the dataset in each
+            seconds, result = timed(lambda: pool.render_all(dataset_path, plan, params), repeat)
+            rows.append([f'{n} process{"es" if n > 1 else ""}', f'{seconds * 1000:.0f}ms', f'{base_seconds / seconds:.1f}x'])
+            if chart_codec.dumps(result) != expected:
+                failures.append(f'{n} workers: charts differ from in-process rendering or arrive out of order')
+
+        print(f'{len(df):,} rows, {len(plan)} charts, {os.cpu_count()} CPUs, median of {repeat}\n')
+        print_table(['renderer', 'time', 'speedup'], rows)
+        print(f"\nchecks: {'ok' if not failures else 'FAILED'}")
+        for failure in failures:
+            print(f'  - {failure}')
+        if failures:
+            sys.exit(1)
+    finally:
+        for pool in pools:
+            pool.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    qb = sub.add_parser('query-backends', help='SQLite vs DuckDB on typical generated SQL')
+    qb.add_argument('--scale', type=int, default=100)
+    qb.add_argument('--repeat', type=int, default=5)
+
+    lg = sub.add_parser('llm-gateway', help='sequential LLM calls vs pooled gateway fan-out (local stub server)')
+    lg.add_argument('--prompts', type=int, default=16)
+    lg.add_argument('--latency', type=float, default=0.25, help='stub response latency in seconds')
+    lg.add_argument('--concurrency', type=int, default=8, help='per-model in-flight limit')
+
+    am = sub.add_parser('agent-modes', help='CrewAI vs direct-completion agent steps (local stub server)')
+    am.add_argument('--repeat', type=int, default=3)
+    am.add_argument('--latency', type=float, default=0.25, help='stub response latency in seconds')
+
+    ch = sub.add_parser('charts', help='pio.to_json + json round trip vs typed-array figure dicts + orjson')
+    ch.add_argument('--scale', type=int, default=1, help='replicate the sample this many times')
+    ch.add_argument('--repeat', type=int, default=5)
+
+    cr = sub.add_parser('chart-reduce', help='every row shipped vs binned / box-stat / downsampled charts')
+    cr.add_argument('--scale', type=int, default=100, help='replicate the sample this many times')
+    cr.add_argument('--repeat', type=int, default=3)
+
+    kd = sub.add_parser('kde', help='scipy gaussian_kde vs binned FFT density for histogram overlays')
+    kd.add_argument('--scale', type=int, default=100, help='replicate the sample this many times')
+    kd.add_argument('--repeat', type=int, default=3)
+
+    cc = sub.add_parser('chart-cache', help='/visualize chart rendering vs chart cache hits')
+    cc.add_argument('--scale', type=int, default=20, help='replicate the sample this many times')
+    cc.add_argument('--repeat', type=int, default=3)
+
+    cp = sub.add_parser('chart-pool', help='/visualize charts on one thread vs a worker process pool')
+    cp.add_argument('--scale', type=int, default=100, help='replicate the sample this many times')
+    cp.add_argument('--repeat', type=int, default=3)
+    cp.add_argument('--workers', default='1,2,4', help='comma-separated pool sizes')
+
+    args = parser.parse_args()
+    if args.bench == 'query-backends':
+        bench_query_backends(args.scale, args.repeat)
+    elif args.bench == 'llm-gateway':
+        bench_llm_gateway(args.prompts, args.latency, args.concurrency)
+    elif args.bench == 'agent-modes':
+        bench_agent_modes(args.repeat, args.latency)
+    elif args.bench == 'charts':
+        bench_chart_serialization(args.scale, args.repeat)
+    elif args.bench == 'chart-reduce':
+        bench_chart_reduce(args.scale, args.repeat)
+    elif args.bench == 'kde':
+        bench_kde(args.scale, args.repeat)
+    elif args.bench == 'chart-cache':
+        bench_chart_cache(args.scale, args.repeat)
+    elif args.bench == 'chart-pool':
+        bench_chart_pool(args.scale, args.repeat, [int(n) for n in args.workers.split(',')])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Storage shared by the on-disk caches.
+
+llm_cache.ResponseCache (completions) and chart_cache.ChartCache (chart
+payloads) keep their entries the same way: encoded values in a local
+SQLite file — survives restarts, shared by worker processes — evicted
+least-recently-used once the total size exceeds a byte budget, with a
+per-request switch to bypass the cache for a block of work.
+
+    store = LRUStore(path, 'charts', max_bytes, columns={'dataset_id': 'TEXT NOT NULL'},
+                     indexed=('dataset_id',), encode=orjson.dumps, decode=orjson.loads)
+    store.put(key, payload, dataset_id=dataset_id)
+    store.get(key)                          # decoded value or None
+    store.delete(dataset_id=dataset_id)
+
+    switch = Switch('chart_cache_enabled')
+    with switch.disabled():
+        ...                                 # switch.is_enabled() is False here
+"""
+
+import time
+import sqlite3
+import threading
+import contextvars
+from contextlib import contextmanager
+
+
+class Switch:
+    """A context-local on/off flag for one cache, on by default."""
+
+    def __init__(self, name: str):
+        self._enabled = contextvars.ContextVar(name, default=True)
+
+    @contextmanager
+    def disabled(self, flag: bool = True):
+        """Turns the cache off (lookups and stores) inside this block when `flag` is true."""
+        token = self._enabled.set(not flag and self._enabled.get())
+        try:
+            yield
+        finally:
+            self._enabled.reset(token)
+
+    def is_enabled(self) -> bool:
+        return self._enabled.get()
+
+
+class LRUStore:
+    """
+    One SQLite table of encoded values, evicted least-recently-used by total
+    size. Thread-safe; one connection guarded by a lock, WAL mode so other
+    processes can read while one writes. `columns` are metadata columns
+    (name -> SQL type) that put() fills and delete() filters on; `encode`
+    turns a value into bytes, `decode` turns them back. A table left by an
+    older layout is dropped, since its contents are only a cache.
+    """
+
+    def __init__(self, path: str, table: str, max_bytes: int, columns: dict = None, indexed=(),
+                 encode=None, decode=None):
+        self.path = path
+        self.table = table
+        self.max_bytes = max_bytes
+        self.columns = dict(columns or {})
+        self.encode = encode
+        self.decode = decode
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+
+        definitions = {
+            'key': 'TEXT PRIMARY KEY',
+            **self.columns,
+            'value': 'BLOB NOT NULL',
+            'size': 'INTEGER NOT NULL',
+            'created_at': 'REAL NOT NULL',
+            'last_used': 'REAL NOT NULL',
+            'hits': 'INTEGER NOT NULL DEFAULT 0',
+        }
+        existing = [row[1] for row in self._conn.execute(f'PRAGMA table_info({table})')]
+        if existing and existing != list(definitions):
+            self._conn.execute(f'DROP TABLE {table}')
+        self._conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {table} ('
+            + ', '.join(f'{name} {sql_type}' for name, sql_type in definitions.items()) + ')'
+        )
+        for name in ('last_used', *indexed):
+            self._conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_{name} ON {table} ({name})')
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        """Returns the decoded value (fresh objects on every call) or None, refreshing its recency."""
+        with self._lock:
+            row = self._conn.execute(f'SELECT value FROM {self.table} WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(f'UPDATE {self.table} SET last_used = ?, hits = hits + 1 WHERE key = ?',
+                               (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return self.decode(row[0])
+
+    def put(self, key: str, value, **metadata):
+        body = self.encode(value)
+        size = len(body) + len(key)
+        if size > self.max_bytes:
+            return
+        names = ['key', *self.columns, 'value', 'size', 'created_at', 'last_used']
+        now = time.time()
+        row = [key, *(metadata.get(name) for name in self.columns), body, size, now, now]
+        with self._lock:
+            self._conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} ({", ".join(names)}) VALUES ({", ".join("?" * len(names))})',
+                row
+            )
+            total = self._conn.execute(f'SELECT COALESCE(SUM(size), 0) FROM {self.table}').fetchone()[0]
+            while total > self.max_bytes:
+                victim = self._conn.execute(
+                    f'SELECT key, size FROM {self.table} ORDER BY last_used LIMIT 1'
+                ).fetchone()
+                self._conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (victim[0],))
+                total -= victim[1]
+                self.evictions += 1
+            self._conn.commit()
+
+    def delete(self, **metadata):
+        """Removes the entries whose metadata columns equal the given values."""
+        where = ' AND '.join(f'{name} = ?' for name in metadata)
+        with self._lock:
+            self._conn.execute(f'DELETE FROM {self.table} WHERE {where}', list(metadata.values()))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f'DELETE FROM {self.table}')
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                f'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}'
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
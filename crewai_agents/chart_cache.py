@@ -0,0 +1,92 @@
+"""
+Persistent cache of rendered chart payloads.
+
+/visualize re-planned and re-rendered every overview chart on each call,
+and /detective rebuilt its forensic charts, although a stored dataset
+never changes: dataset ids are derived from the upload's SHA-256 and the
+data file is written once. Reloading a dashboard paid for the pandas
+work (column selection, binning, box stats, sampling) and the Plotly
+work (figure construction, serialisation) again every time.
+
+Entries are keyed by the dataset id (its content hash), the data file's
+version stamp, what was built (the chart plan, one chart spec, the
+forensic chart set) and every setting that changes the output (point
+budget, histogram bins, FORMAT_VERSION). Payloads are stored as the
+orjson bytes sent to the client in a cache_store.LRUStore (SQLite,
+evicted least-recently-used past `max_bytes`). Removing a dataset drops
+its entries.
+
+The "use_cache": false request flag bypasses this cache as well:
+
+    with chart_cache.disabled():
+        charts = run_visualize(data)
+"""
+
+import json
+import hashlib
+
+import orjson
+import cache_store
+import chart_codec
+
+# Bump when chart construction changes, so stale payloads stop matching
+FORMAT_VERSION = 1
+
+_switch = cache_store.Switch('chart_cache_enabled')
+
+# Bypasses the cache (lookups and stores) for charts built in the block
+disabled = _switch.disabled
+is_enabled = _switch.is_enabled
+
+
+def chart_key(dataset_id: str, data_version: str, kind: str, spec, params: dict) -> str:
+    canonical = json.dumps({
+        'dataset': dataset_id, 'version': data_version, 'kind': kind,
+        'spec': spec, 'params': params, 'format': FORMAT_VERSION,
+    }, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ChartCache:
+    """Chart payloads by chart_key(), tagged with their dataset so they can be dropped with it."""
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 ** 2):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._store = cache_store.LRUStore(
+            path, 'charts', max_bytes,
+            columns={'dataset_id': 'TEXT NOT NULL', 'kind': 'TEXT NOT NULL'},
+            indexed=('dataset_id',),
+            encode=chart_codec.dumps,
+            decode=orjson.loads,
+        )
+
+    def get(self, key: str):
+        """Returns the stored payload (fresh objects on every call) or None, refreshing its recency."""
+        return self._store.get(key)
+
+    def put(self, key: str, dataset_id: str, kind: str, payload):
+        self._store.put(key, payload, dataset_id=dataset_id, kind=kind)
+
+    def get_or_build(self, dataset_id: str, data_version: str, kind: str, spec, params: dict, build):
+        """
+        The cached payload for (dataset version, kind, spec, params), else
+        build() — stored for next time. Bypassed inside disabled().
+        """
+        if not is_enabled():
+            return build()
+        key = chart_key(dataset_id, data_version, kind, spec, params)
+        payload = self.get(key)
+        if payload is None:
+            payload = build()
+            self.put(key, dataset_id, kind, payload)
+        return payload
+
+    def drop_dataset(self, dataset_id: str):
+        self._store.delete(dataset_id=dataset_id)
+
+    def clear(self):
+        self._store.clear()
+
+    def stats(self) -> dict:
+        return self._store.stats()
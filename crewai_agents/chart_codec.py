@@ -0,0 +1,178 @@
+"""
+Plotly figure serialization and the JSON encoder for API responses.
+
+fig_to_json used to serialise every figure with pio.to_json, parse the
+string straight back with json.loads, and let jsonify serialise the
+result a third time — each pass over every raw data point of the scatter
+matrix and histograms, written out as decimal text.
+
+figure_dict() takes the figure's validated properties from
+fig.to_plotly_json() (no second validation pass, no JSON text round-trip)
+and encodes numeric NumPy arrays in traces as plotly.js typed-array specs:
+
+    {"dtype": "f8", "bdata": "<base64 of the little-endian buffer>", "shape": "4, 4"}
+
+which plotly.js (>= 2.28; the frontend loads 2.32) decodes natively.
+Integer columns (and whole-number floats) are narrowed to the smallest
+integer type plotly.js supports, so a store id costs one byte; a
+full-precision float costs 8 bytes instead of up to ~20 characters. An
+array keeps its plain JSON form when that is shorter (short decimals
+such as 42.31). Everything else becomes plain JSON values.
+
+Responses are then written once with orjson: dumps() for SSE events and
+job payloads, OrjsonProvider for Flask's jsonify.
+"""
+
+import base64
+import datetime
+import decimal
+
+import numpy as np
+import orjson
+from flask.json.provider import JSONProvider
+
+# NumPy dtype → plotly.js typed-array dtype
+TYPED_ARRAY_DTYPES = {
+    'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2',
+    'int32': 'i4', 'uint32': 'u4', 'float32': 'f4', 'float64': 'f8',
+}
+_DTYPE_NAMES = {v: k for k, v in TYPED_ARRAY_DTYPES.items()}
+
+# Keys plotly.js never reads as typed arrays (GeoJSON payloads, map layers, axis ranges)
+PLAIN_KEYS = {'geojson', 'layer', 'layers', 'range'}
+_INT_LADDER = (np.int8, np.int16, np.int32)
+_UINT_LADDER = (np.uint8, np.uint16, np.uint32)
+
+_DUMPS_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _narrow_int(arr: np.ndarray):
+    """int64/uint64 → the smallest plotly.js integer type holding the values, or float64."""
+    if arr.size == 0:
+        return arr.astype(np.int32)
+    low, high = arr.min(), arr.max()
+    for kind in (_UINT_LADDER if arr.dtype.kind == 'u' else _INT_LADDER):
+        info = np.iinfo(kind)
+        if info.min <= low and high <= info.max:
+            return arr.astype(kind)
+    return arr.astype(np.float64)
+
+
+def typed_array(arr: np.ndarray):
+    """A plotly.js typed-array spec for a numeric array, or None when it has no typed form."""
+    if arr.dtype.kind == 'f' and arr.size and np.isfinite(arr).all() and (arr == np.trunc(arr)).all():
+        arr = _narrow_int(arr.astype(np.int64))  # whole-number floats (counts, codes) as integers
+    elif arr.dtype.kind in 'iu' and arr.dtype.itemsize == 8:
+        arr = _narrow_int(arr)
+    name = TYPED_ARRAY_DTYPES.get(arr.dtype.name)
+    if name is None or arr.size == 0:
+        return None
+    buffer = np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder('<'))
+    spec = {'dtype': name, 'bdata': base64.b64encode(buffer.data).decode('ascii')}
+    if arr.ndim > 1:
+        spec['shape'] = ', '.join(str(n) for n in arr.shape)
+    return spec
+
+
+def _plain_array(arr: np.ndarray) -> list:
+    if arr.dtype.kind == 'M':
+        return np.datetime_as_string(arr, unit='auto').tolist()
+    if arr.dtype.kind == 'f':
+        return np.where(np.isfinite(arr), arr, None).tolist()
+    return [_plain(v) for v in arr.tolist()] if arr.dtype.kind == 'O' else arr.tolist()
+
+
+def _plain(value, binary: bool = False):
+    """Copies `value` into JSON-ready containers; with `binary`, numeric arrays become typed arrays."""
+    if isinstance(value, dict):
+        return {k: _plain(v, binary and k not in PLAIN_KEYS) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v, binary) for v in value]
+    if isinstance(value, np.ndarray):
+        if binary:
+            spec = typed_array(value)
+            # Short decimals (42.31) are cheaper as text than as 8 bytes of base64.
+            if spec is not None and len(spec['bdata']) < len(orjson.dumps(value, option=_DUMPS_OPTIONS)):
+                return spec
+        return _plain_array(value)
+    if isinstance(value, (np.generic, float)):
+        value = value.item() if isinstance(value, np.generic) else value
+        if isinstance(value, float) and not np.isfinite(value):
+            return None
+        return value
+    if value is None or isinstance(value, (str, int, bool)):
+        return value
+    return _default(value)
+
+
+def decode(value):
+    """Inverse of the typed-array encoding: specs become NumPy arrays again."""
+    if isinstance(value, dict):
+        if set(value) >= {'dtype', 'bdata'} and value['dtype'] in _DTYPE_NAMES:
+            arr = np.frombuffer(base64.b64decode(value['bdata']), dtype=np.dtype(_DTYPE_NAMES[value['dtype']]).newbyteorder('<'))
+            if 'shape' in value:
+                arr = arr.reshape([int(n) for n in str(value['shape']).split(',')])
+            return arr
+        return {k: decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    return value
+
+
+def figure_dict(fig, binary: bool = True) -> dict:
+    """
+    {'data': [...], 'layout': {...}} for a plotly Figure. Trace arrays are
+    typed-array specs when `binary`; the layout is always plain JSON.
+    """
+    figure = fig.to_plotly_json()
+    return {
+        'data': [_plain(trace, binary) for trace in figure['data']],
+        'layout': _plain(figure['layout']),
+    }
+
+
+# ─────────────────────────────────────────────
+# RESPONSE ENCODING
+# ─────────────────────────────────────────────
+
+def _default(value):
+    """Types orjson does not serialise natively (same fallbacks as json.dumps(default=str))."""
+    if isinstance(value, np.ndarray):
+        return _plain_array(value)
+    if isinstance(value, np.generic):
+        return _plain(value)
+    try:
+        if value != value:  # NaN-likes: pandas NaT, NaN Decimal
+            return None
+    except TypeError:  # pandas NA refuses truth testing
+        return None
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return str(value)
+
+
+def dumps(value) -> bytes:
+    """UTF-8 JSON bytes; NaN/inf become null."""
+    return orjson.dumps(value, default=_default, option=_DUMPS_OPTIONS)
+
+
+def dumps_str(value) -> str:
+    return dumps(value).decode('utf-8')
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider (app.json) so jsonify serialises with orjson in one pass."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps_str(obj)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype='application/json')
@@ -0,0 +1,163 @@
+"""
+Process pool for overview chart rendering.
+
+/visualize renders up to ~10 independent figures. The pipeline ran them
+on threads, but binning, value_counts, box statistics, scatter-matrix
+sampling and Plotly figure construction are CPU-bound and hold the GIL,
+so the charts effectively rendered one after another.
+
+Each chart is now a job (dataset path, chart spec, chart settings) for a
+pool of worker processes. Nothing large is pickled: a worker opens the
+dataset's Arrow file itself — memory-mapped, so the pages are shared
+with the web process and every other worker through the OS page cache —
+and keeps the last few frames it opened, keyed by data version, until
+their dataset is removed. Only the serialised chart payload travels back.
+
+Workers are started from a forkserver (spawn where that is unavailable)
+that has preloaded charts and dataset_store, never forked from the
+threaded web process. What a worker imports is those chart modules
+(charts, chart_reduce, chart_codec, tracing, with pandas and plotly) and
+the parent's entry script, which every multiprocessing child re-imports
+as __mp_main__. For the development server that is serve.py (`python
+app.py` hands over to it), which is empty outside its __main__ guard;
+WSGI servers' entry scripts are guarded the same way. Workers therefore
+never import app.py or repeat its set-up. Datasets below
+`min_rows` are rendered in the calling thread, where process hand-off
+would cost more than it saves. If a worker dies the pool is replaced and
+the chart is rendered in-process.
+
+    pool = ChartPool(workers=4, min_rows=50_000)
+    charts = pool.render_all(dataset_path, plan, params)   # plan order
+"""
+
+import os
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import tracing
+import dataset_store
+
+# DataFrames each worker keeps open (one per dataset version)
+WORKER_FRAMES = 2
+
+_frames = OrderedDict()
+
+
+def _worker_frame(dataset_path: str):
+    key = (dataset_path, dataset_store.dataset_version(dataset_path))
+    # Let go of frames over removed or replaced data files, so their memory maps close
+    for stale in [k for k in _frames if k != key and (k[0] == dataset_path or not dataset_store.dataset_exists(k[0]))]:
+        del _frames[stale]
+    df = _frames.get(key)
+    if df is None:
+        df = dataset_store.read_dataset(dataset_path)
+        _frames[key] = df
+        while len(_frames) > WORKER_FRAMES:
+            _frames.popitem(last=False)
+    _frames.move_to_end(key)
+    return df
+
+
+def _render_job(dataset_path: str, spec: dict, params: dict) -> dict:
+    """Runs in a worker process."""
+    import charts
+    return charts.render_chart(_worker_frame(dataset_path), spec, params)
+
+
+def _context():
+    methods = multiprocessing.get_all_start_methods()
+    if 'forkserver' in methods:
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['charts', 'dataset_store'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+class ChartPool:
+    """
+    Renders chart specs in worker processes; `workers` = 0 renders
+    everything in the calling thread. Thread-safe; the pool starts on the
+    first job that needs it.
+    """
+
+    def __init__(self, workers: int, min_rows: int = 50_000, local_frame=None):
+        self.workers = workers
+        self.min_rows = min_rows
+        # dataset_path -> DataFrame for in-thread rendering (the web process's DataFrame cache)
+        self.local_frame = local_frame or dataset_store.read_dataset
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pooled = 0
+        self.local = 0
+        self.restarts = 0
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_context())
+            return self._executor
+
+    def _reset(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def uses_pool(self, dataset_path: str) -> bool:
+        return self.workers > 0 and dataset_store.read_schema(dataset_path)['rows'] >= self.min_rows
+
+    def _render_local(self, dataset_path: str, spec: dict, params: dict) -> dict:
+        import charts
+        with self._lock:
+            self.local += 1
+        return charts.render_chart(self.local_frame(dataset_path), spec, params)
+
+    def submit(self, dataset_path: str, spec: dict, params: dict):
+        executor = self._pool()
+        with self._lock:
+            self.pooled += 1
+        return executor, executor.submit(_render_job, dataset_path, spec, params)
+
+    def _result(self, dataset_path, spec, params, executor, future) -> dict:
+        try:
+            with tracing.span('chart.pool', chart=spec['chart_type']):
+                return future.result()
+        except BrokenProcessPool:
+            self._reset(executor)
+            return self._render_local(dataset_path, spec, params)
+
+    def render(self, dataset_path: str, spec: dict, params: dict) -> dict:
+        """One chart payload, from a worker process when the dataset is large enough."""
+        if not self.uses_pool(dataset_path):
+            return self._render_local(dataset_path, spec, params)
+        executor, future = self.submit(dataset_path, spec, params)
+        return self._result(dataset_path, spec, params, executor, future)
+
+    def render_all(self, dataset_path: str, specs: list, params: dict) -> list:
+        """Chart payloads for `specs`, rendered concurrently, returned in `specs` order."""
+        if not self.uses_pool(dataset_path):
+            return [self._render_local(dataset_path, spec, params) for spec in specs]
+        jobs = [self.submit(dataset_path, spec, params) for spec in specs]
+        return [self._result(dataset_path, spec, params, executor, future)
+                for spec, (executor, future) in zip(specs, jobs)]
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'min_rows': self.min_rows,
+                'started': self._executor is not None,
+                'pooled': self.pooled,
+                'local': self.local,
+                'restarts': self.restarts,
+            }
@@ -0,0 +1,213 @@
+"""
+Server-side data reduction for charts.
+
+Overview and forensic charts used to ship every row: df[col].dropna()
+into go.Histogram and go.Box, the whole frame into px.scatter_matrix and
+one marker (plus a Python-built colour and size entry) per row into the
+detective's outlier map. On million-row datasets that is hundreds of MB
+of JSON and a frozen browser, for charts that show a few dozen bars or
+five numbers per box.
+
+Everything here is NumPy and independent of plotly:
+
+- histogram()     bin counts (integer-aligned bins for small integer ranges)
+- box_stats()     quartiles, Tukey whiskers, mean, and only the outliers
+- kde()           Gaussian KDE curve from binned data convolved via FFT
+- lttb()          Largest-Triangle-Three-Buckets indices for a line / index plot
+- downsample_series() / sample_rows()
+                  reduce to a point budget while always keeping flagged
+                  outliers (extremes first when even those exceed it);
+                  row sampling is stratified by an optional group key
+
+Reductions are deterministic (fixed seed) so identical requests draw
+identical charts.
+"""
+
+import numpy as np
+
+SEED = 0
+
+
+def histogram(values: np.ndarray, bins: int = 40) -> dict:
+    """
+    {'centers', 'counts', 'width'} for `values` (no NaNs). Integer data
+    spanning at most `bins` values gets one bin per integer.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.size == 0:
+        return {'centers': np.array([]), 'counts': np.array([], dtype=np.int64), 'width': 1.0}
+    low, high = values.min(), values.max()
+    if np.all(values == np.trunc(values)) and high - low + 1 <= bins:
+        edges = np.arange(low - 0.5, high + 1.5)
+    else:
+        edges = np.histogram_bin_edges(values, bins=bins, range=(low, high) if high > low else (low - 0.5, high + 0.5))
+    counts, edges = np.histogram(values, bins=edges)
+    return {'centers': (edges[:-1] + edges[1:]) / 2, 'counts': counts, 'width': float(edges[1] - edges[0])}
+
+
+def kde(values: np.ndarray, points: int = 200, grid: int = 1024):
+    """
+    (x, density) of a Gaussian KDE with Scott's bandwidth on `points`
+    evenly spaced x over [min, max] — the curve scipy's gaussian_kde draws
+    — or None when the data has no spread. gaussian_kde evaluates every
+    sample at every point (O(n·points) with n×points temporaries); here the
+    samples are linearly binned onto a fine grid and convolved with the
+    kernel by FFT, O(n + m log m) for m grid cells.
+    """
+    values = np.asarray(values, dtype=float)
+    n = values.size
+    if n < 2:
+        return None
+    bandwidth = values.std(ddof=1) * n ** (-1 / 5)
+    low, high = values.min(), values.max()
+    if not bandwidth > 0 or high <= low:
+        return None
+
+    # Keep several cells per bandwidth so binning error stays far below line width
+    m = int(min(max(grid, 4 * (high - low) / bandwidth + 1), 1 << 18))
+    delta = (high - low) / (m - 1)
+    position = (values - low) / delta
+    left = np.minimum(position.astype(np.int64), m - 2)
+    right_share = position - left
+    binned = np.bincount(left, weights=1 - right_share, minlength=m) + np.bincount(left + 1, weights=right_share, minlength=m)
+
+    # Linear (zero-padded) convolution; the kernel is cut at 5 bandwidths
+    reach = int(min(np.ceil(5 * bandwidth / delta), m - 1))
+    offsets = np.arange(-reach, reach + 1) * delta
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    size = 1 << int(np.ceil(np.log2(m + 2 * reach + 1)))
+    smoothed = np.fft.irfft(np.fft.rfft(binned, size) * np.fft.rfft(kernel, size), size)[reach:reach + m] / n
+
+    x = np.linspace(low, high, points)
+    return x, np.interp(x, low + np.arange(m) * delta, np.maximum(smoothed, 0))
+
+
+def box_stats(values: np.ndarray, max_outliers: int) -> dict:
+    """
+    Box-plot statistics as plotly computes them (linear quartiles, whiskers
+    at the furthest points within 1.5 IQR) plus the points beyond the
+    whiskers, the most extreme `max_outliers` of them when there are more.
+    None for an empty column.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.size == 0:
+        return None
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    lower, upper = (inside.min(), inside.max()) if inside.size else (q1, q3)
+    outliers = values[(values < lower) | (values > upper)]
+    total = outliers.size
+    if total > max_outliers:
+        distance = np.maximum(lower - outliers, outliers - upper)
+        outliers = outliers[np.argsort(distance)[::-1][:max_outliers]]
+    return {
+        'q1': float(q1), 'median': float(median), 'q3': float(q3),
+        'lowerfence': float(lower), 'upperfence': float(upper),
+        'mean': float(values.mean()),
+        'outliers': np.sort(outliers),
+        'outliers_total': int(total),
+    }
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indices of `threshold` points chosen by Largest-Triangle-Three-Buckets:
+    first and last point, then per bucket the point forming the largest
+    triangle with the previous pick and the next bucket's average. Keeps
+    the visual shape (peaks included) of a series far better than striding.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    every = (n - 2) / (threshold - 2)
+    edges = (np.arange(threshold - 1) * every).astype(np.int64) + 1
+    edges = np.append(edges, n)
+    # Bucket averages all at once; bucket i + 1 is the "next bucket" of bucket i, the last point closes
+    sizes = np.diff(edges)
+    avg_x = np.append(np.add.reduceat(x, edges[:-1]) / sizes, x[-1])[1:]
+    avg_y = np.append(np.add.reduceat(y, edges[:-1]) / sizes, y[-1])[1:]
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        xa, ya = x[a], y[a]
+        area = np.abs((xa - avg_x[i]) * (y[start:end] - ya) - (xa - x[start:end]) * (avg_y[i] - ya))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def _keep_extremes(kept: np.ndarray, score: np.ndarray, budget: int) -> np.ndarray:
+    return np.sort(kept[np.argsort(score[kept])[::-1][:budget]])
+
+
+def downsample_series(y: np.ndarray, budget: int, keep: np.ndarray = None) -> np.ndarray:
+    """
+    Sorted indices of at most `budget` points of an index plot: every
+    `keep` point, the rest of the budget chosen by LTTB.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= budget:
+        return np.arange(n)
+    kept = np.flatnonzero(keep) if keep is not None else np.array([], dtype=np.int64)
+    if len(kept) >= budget:
+        return _keep_extremes(kept, np.abs(y), budget)
+    return np.union1d(lttb(np.arange(n), y, max(budget - len(kept), 3)), kept)
+
+
+def sample_rows(n: int, budget: int, keep: np.ndarray = None, strata: np.ndarray = None,
+                score: np.ndarray = None) -> np.ndarray:
+    """
+    Sorted indices of at most `budget` of `n` rows: every `keep` row (the
+    highest-`score` ones if they alone exceed the budget), the remainder
+    sampled without replacement in proportion to each `strata` group, with
+    every group represented where the budget allows.
+    """
+    if n <= budget:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool) if keep is None else np.asarray(keep, dtype=bool)
+    kept = np.flatnonzero(keep)
+    if len(kept) >= budget:
+        return _keep_extremes(kept, score if score is not None else np.zeros(n), budget)
+
+    rng = np.random.default_rng(SEED)
+    rest = np.flatnonzero(~keep)
+    remaining = budget - len(kept)
+    if strata is None:
+        return np.union1d(kept, rng.choice(rest, size=remaining, replace=False))
+
+    groups, inverse = np.unique(np.asarray(strata)[rest], return_inverse=True)
+    sizes = np.bincount(inverse, minlength=len(groups))
+    quotas = np.floor(sizes / sizes.sum() * remaining).astype(np.int64)
+    quotas = np.maximum(quotas, np.minimum(sizes, 1 if remaining >= len(groups) else 0))
+    while quotas.sum() > remaining:
+        quotas[np.argmax(quotas)] -= 1
+    leftover = remaining - quotas.sum()
+    if leftover:
+        spare = sizes - quotas
+        quotas += np.floor(spare / max(spare.sum(), 1) * leftover).astype(np.int64)
+    chosen = [kept]
+    for g, quota in enumerate(quotas):
+        if quota:
+            members = rest[inverse == g]
+            chosen.append(rng.choice(members, size=min(quota, len(members)), replace=False))
+    return np.unique(np.concatenate(chosen))
+
+
+def zscore_outliers(frame_values: np.ndarray, threshold: float = 3.0):
+    """
+    (row mask, score) for a 2-D float array: rows where any column is more
+    than `threshold` standard deviations from its mean, scored by the
+    largest |z| in the row.
+    """
+    values = np.asarray(frame_values, dtype=float)
+    std = values.std(axis=0)
+    std[std == 0] = 1.0
+    z = np.abs((values - values.mean(axis=0)) / std)
+    score = np.nan_to_num(z, nan=0.0).max(axis=1) if z.size else np.zeros(len(values))
+    return score > threshold, score
@@ -0,0 +1,296 @@
+"""
+Overview chart engine: picks the charts for a dataset and renders them.
+
+plan_charts() decides what to draw from dtypes and null counts;
+build_figure() / render_chart() turn one planned spec into a Plotly
+figure / chart payload. Rendering depends only on the DataFrame, the spec
+and the chart settings passed as `params` ({'point_budget',
+'histogram_bins'}, app.CHART_PARAMS), so it runs the same in the web
+process and in chart_pool's worker processes, which import this module
+without the Flask app, the agents or the LLM gateway.
+"""
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+import tracing
+import chart_codec
+import chart_reduce
+
+PLOTLY_THEME = {
+    "template": "plotly_dark",
+    "paper_bgcolor": "rgba(0,0,0,0)",
+    "plot_bgcolor": "rgba(15,15,25,0.8)",
+    "font_color": "#e2e8f0",
+    "colorscale": "Viridis"
+}
+
+
+@tracing.traced('chart.serialize')
+def fig_to_json(fig) -> dict:
+    """Returns Plotly JSON (typed arrays for numeric data) for interactive frontend rendering."""
+    return chart_codec.figure_dict(fig)
+
+
+@tracing.traced('chart.plan')
+def plan_charts(df: pd.DataFrame) -> list:
+    """
+    Decides which overview charts to draw (type, title, description, and
+    the columns involved) from dtypes and null counts alone. Cheap enough
+    to hand the titles to the viz_strategist agent before rendering starts.
+    """
+    numeric_cols = df.select_dtypes(include='number').columns.tolist()
+    categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
+    plan = []
+
+    # 1. Distribution charts for all numeric columns (top 3)
+    for col in numeric_cols[:3]:
+        plan.append({
+            'chart_type': 'histogram',
+            'title': f'Distribution of {col}',
+            'description': f'Shows value distribution and density curve for {col}',
+            'column': col
+        })
+
+    # 2. Box plots for outlier visualization
+    if len(numeric_cols) >= 2:
+        plan.append({
+            'chart_type': 'boxplot',
+            'title': 'Outlier Analysis — Box Plots',
+            'description': 'Reveals outliers and spread across all numeric columns',
+            'columns': numeric_cols[:6]
+        })
+
+    # 3. Correlation heatmap
+    if len(numeric_cols) > 1:
+        plan.append({
+            'chart_type': 'heatmap',
+            'title': 'Correlation Heatmap',
+            'description': 'Shows linear relationships between all numeric variables. Red = negative, Blue = positive correlation.',
+            'columns': numeric_cols
+        })
+
+    # 4. Categorical bar charts
+    for col in categorical_cols[:2]:
+        plan.append({
+            'chart_type': 'bar',
+            'title': f'Top Categories in {col}',
+            'description': f'Frequency distribution of categories in {col}',
+            'column': col
+        })
+
+    # 5. Scatter matrix for numeric cols (top 4)
+    if len(numeric_cols) >= 3:
+        plan.append({
+            'chart_type': 'scatter_matrix',
+            'title': 'Scatter Matrix — Pairwise Relationships',
+            'description': 'Explores relationships between every pair of numeric columns simultaneously',
+            'columns': numeric_cols[:4],
+            'color': categorical_cols[0] if categorical_cols else None
+        })
+
+    # 6. Missing values bar
+    if df.isnull().values.any():
+        plan.append({
+            'chart_type': 'missing',
+            'title': 'Missing Values by Column',
+            'description': 'Highlights data completeness issues requiring attention'
+        })
+
+    return plan
+
+
+@tracing.traced('chart.render')
+def build_figure(df: pd.DataFrame, spec: dict, params: dict) -> go.Figure:
+    """Builds the Plotly figure for one planned chart; `params` holds the point budget and histogram bins."""
+    template = PLOTLY_THEME["template"]
+    chart_type = spec['chart_type']
+
+    if chart_type == 'histogram':
+        col = spec['column']
+        kde_data = df[col].dropna()
+        # Bins are counted here; the browser gets one bar per bin, not every value
+        bins = chart_reduce.histogram(kde_data.to_numpy(dtype=float), params['histogram_bins'])
+        fig = go.Figure()
+        fig.add_trace(go.Bar(
+            x=bins['centers'],
+            y=bins['counts'],
+            width=bins['width'],
+            name=col,
+            marker_color='#6366f1',
+            opacity=0.85
+        ))
+        # Add KDE overlay (binned FFT density, scaled to bin counts)
+        curve = chart_reduce.kde(kde_data.to_numpy(dtype=float)) if len(kde_data) > 5 else None
+        if curve is not None:
+            x_range, density = curve
+            fig.add_trace(go.Scatter(
+                x=x_range, y=density * len(kde_data) * bins['width'],
+                mode='lines',
+                name='Density',
+                line=dict(color='#f43f5e', width=2.5)
+            ))
+
+        fig.update_layout(
+            title=spec['title'],
+            template=template,
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(15,15,25,0.8)',
+            font=dict(color='#e2e8f0'),
+            xaxis_title=col,
+            yaxis_title='Frequency',
+            showlegend=True,
+            bargap=0,
+            height=400
+        )
+
+    elif chart_type == 'boxplot':
+        fig = go.Figure()
+        per_column = max(params['point_budget'] // max(len(spec['columns']), 1), 1)
+        for col in spec['columns']:
+            # Precomputed quartiles and whiskers; only the outliers travel as points
+            box = chart_reduce.box_stats(df[col].dropna().to_numpy(dtype=float), per_column)
+            if box is None:
+                # All-null column: an empty box keeps its slot on the axis
+                fig.add_trace(go.Box(x=[], y=[], name=col, marker_color='#8b5cf6', legendgroup=col))
+                continue
+            fig.add_trace(go.Box(
+                x=[col],
+                q1=[box['q1']], median=[box['median']], q3=[box['q3']],
+                lowerfence=[box['lowerfence']], upperfence=[box['upperfence']],
+                mean=[box['mean']],
+                name=col,
+                marker_color='#8b5cf6',
+                line_color='#c4b5fd',
+                legendgroup=col
+            ))
+            if len(box['outliers']):
+                fig.add_trace(go.Scatter(
+                    x=np.full(len(box['outliers']), col, dtype=object),
+                    y=box['outliers'],
+                    mode='markers',
+                    marker=dict(color='#8b5cf6', size=5, opacity=0.7),
+                    name=f'{col} outliers ({box["outliers_total"]})',
+                    legendgroup=col,
+                    showlegend=False
+                ))
+        fig.update_layout(
+            title=spec['title'],
+            template=template,
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(15,15,25,0.8)',
+            font=dict(color='#e2e8f0'),
+            height=420
+        )
+
+    elif chart_type == 'heatmap':
+        corr = df[spec['columns']].corr().round(2)
+        fig = go.Figure(data=go.Heatmap(
+            z=corr.values,
+            x=corr.columns.tolist(),
+            y=corr.index.tolist(),
+            colorscale='RdBu',
+            zmid=0,
+            text=corr.values,
+            texttemplate='%{text}',
+            textfont=dict(size=11),
+            hoverongaps=False
+        ))
+        fig.update_layout(
+            title=spec['title'],
+            template=template,
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(15,15,25,0.8)',
+            font=dict(color='#e2e8f0'),
+            height=450
+        )
+
+    elif chart_type == 'bar':
+        col = spec['column']
+        vc = df[col].value_counts().head(15)
+        fig = go.Figure(go.Bar(
+            x=vc.values,
+            y=vc.index.tolist(),
+            orientation='h',
+            marker=dict(
+                color=vc.values,
+                colorscale='Plasma',
+                showscale=True
+            )
+        ))
+        fig.update_layout(
+            title=spec['title'],
+            template=template,
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(15,15,25,0.8)',
+            font=dict(color='#e2e8f0'),
+            xaxis_title='Count',
+            yaxis_title=col,
+            height=400
+        )
+
+    elif chart_type == 'scatter_matrix':
+        top_cols = spec['columns']
+        color_col = spec['color']
+        frame = df[top_cols + ([color_col] if color_col else [])].dropna()
+        # Sample rows to the point budget, per colour group, keeping every |z| > 3 row
+        outliers, score = chart_reduce.zscore_outliers(frame[top_cols].to_numpy(dtype=float))
+        rows = chart_reduce.sample_rows(
+            len(frame), params['point_budget'], keep=outliers, score=score,
+            strata=frame[color_col].astype(str).to_numpy() if color_col else None
+        )
+        fig = px.scatter_matrix(
+            frame.iloc[rows],
+            dimensions=top_cols,
+            color=color_col,
+            title=spec['title'],
+            template=template,
+            height=550
+        )
+        fig.update_traces(diagonal_visible=False, showupperhalf=False)
+        fig.update_layout(
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(15,15,25,0.8)',
+            font=dict(color='#e2e8f0')
+        )
+
+    elif chart_type == 'missing':
+        missing = df.isnull().sum()
+        missing = missing[missing > 0].sort_values(ascending=True)
+        fig = go.Figure(go.Bar(
+            x=missing.values,
+            y=missing.index.tolist(),
+            orientation='h',
+            marker_color='#f43f5e',
+            text=[f'{v} ({v/len(df)*100:.1f}%)' for v in missing.values],
+            textposition='outside'
+        ))
+        fig.update_layout(
+            title=spec['title'],
+            template=template,
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(15,15,25,0.8)',
+            font=dict(color='#e2e8f0'),
+            xaxis_title='Missing Count',
+            height=350
+        )
+
+    else:
+        raise ValueError(f'Unknown chart type: {chart_type}')
+
+    return fig
+
+
+def render_chart(df: pd.DataFrame, spec: dict, params: dict) -> dict:
+    """Builds one planned chart and returns the chart object."""
+    chart = {
+        'chart_type': spec['chart_type'],
+        'title': spec['title'],
+        'description': spec['description'],
+        'plotly_json': fig_to_json(build_figure(df, spec, params))
+    }
+    if 'column' in spec:
+        chart['column'] = spec['column']
+    return chart
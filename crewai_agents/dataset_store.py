@@ -0,0 +1,445 @@
+"""
+Columnar dataset store.
+
+Uploads are parsed once and written as an uncompressed Arrow IPC file with a
+JSON schema sidecar. Every later request memory-maps that file instead of
+re-parsing text, so dtypes (including datetimes coerced at upload) survive and
+numeric columns without nulls are handed to pandas without a copy.
+
+Layout (one directory per dataset under DATASET_DIR):
+
+    temp_dataset_<id>/
+        data.arrow     Arrow IPC file — memory-mappable, zero-copy reads
+        schema.json    columns, pandas/arrow dtypes, row count, source format
+        profile.json   build_rich_profile output, stamped with the data version
+        refs.json      number of uploads currently holding this dataset
+
+Uploads are content-addressed: the dataset id is derived from a SHA-256 of
+the uploaded bytes (and their format), so re-uploading the same file maps to
+the existing entry and only bumps its reference count. New datasets are
+ingested into a staging directory while the upload streams in, then renamed
+into place once the content hash is known (or discarded as a duplicate).
+"""
+
+import gc
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+
+DATASET_PREFIX = 'temp_dataset_'
+DATA_FILE = 'data.arrow'
+SCHEMA_FILE = 'schema.json'
+PROFILE_FILE = 'profile.json'
+REFS_FILE = 'refs.json'
+STAGING_PREFIX = 'staging_'
+STORE_FORMAT_VERSION = 1
+
+
+def new_dataset_id() -> str:
+    return f"{DATASET_PREFIX}{uuid.uuid4()}"
+
+
+def content_dataset_id(digest: str) -> str:
+    """Dataset id for content with the given SHA-256 hex digest."""
+    return f"{DATASET_PREFIX}{digest[:32]}"
+
+
+def content_hasher(salt: str = ''):
+    """
+    SHA-256 hasher for upload content. The salt (the file format) keeps
+    identical bytes uploaded as .csv and .tsv apart.
+    """
+    return hashlib.sha256(f"{salt}\0".encode('utf-8'))
+
+
+def staging_path(parent_dir: str) -> str:
+    """Private directory an upload is ingested into before its id is known."""
+    return os.path.join(parent_dir, f"{STAGING_PREFIX}{uuid.uuid4().hex}")
+
+
+def publish_dataset(staging: str, dataset_path: str):
+    """Atomically moves a fully written staging directory into place."""
+    os.rename(staging, dataset_path)
+
+
+def data_path(dataset_path: str) -> str:
+    return os.path.join(dataset_path, DATA_FILE)
+
+
+def schema_path(dataset_path: str) -> str:
+    return os.path.join(dataset_path, SCHEMA_FILE)
+
+
+def profile_path(dataset_path: str) -> str:
+    return os.path.join(dataset_path, PROFILE_FILE)
+
+
+def dataset_version(dataset_path: str) -> str:
+    """Identifies one immutable version of the stored data file."""
+    st = os.stat(data_path(dataset_path))
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+
+def _write_json_atomic(path: str, payload: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, default=str)
+    os.replace(tmp_path, path)
+
+
+def to_arrow_table(df: pd.DataFrame) -> pa.Table:
+    """
+    Converts a DataFrame to Arrow. Object columns holding mixed Python types
+    (common after Excel/SQL imports) cannot be typed by Arrow, so they are
+    stored as strings rather than failing the upload.
+    """
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        df = df.copy()
+        for col in df.select_dtypes(include='object').columns:
+            try:
+                pa.array(df[col], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def build_schema(arrow_schema: pa.Schema, rows: int, dataset_id: str, source_format: str) -> dict:
+    pandas_dtypes = arrow_schema.empty_table().to_pandas().dtypes
+    return {
+        'format_version': STORE_FORMAT_VERSION,
+        'dataset_id': dataset_id,
+        'source_format': source_format,
+        'rows': int(rows),
+        'columns': [
+            {
+                'name': field.name,
+                'dtype': str(pandas_dtypes[field.name]),
+                'arrow_type': str(field.type),
+            }
+            for field in arrow_schema
+        ],
+        'created_at': time.time(),
+    }
+
+
+def write_dataset(dataset_path: str, df: pd.DataFrame, source_format: str) -> dict:
+    """
+    Persists a DataFrame into the store and returns its schema sidecar.
+    The Arrow file is written to a temp name and renamed so a concurrent
+    reader never maps a half-written file.
+    """
+    os.makedirs(dataset_path, exist_ok=True)
+    table = to_arrow_table(df)
+
+    target = data_path(dataset_path)
+    tmp_path = f"{target}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, target)
+
+    schema = build_schema(table.schema, table.num_rows, os.path.basename(dataset_path), source_format)
+    _write_json_atomic(schema_path(dataset_path), schema)
+    return schema
+
+
+def _promote_type(current: pa.DataType, incoming: pa.DataType) -> pa.DataType:
+    """Smallest common type for a column whose inferred type drifted between chunks."""
+    if current == incoming or pa.types.is_null(incoming):
+        return current
+    if pa.types.is_null(current):
+        return incoming
+    if (pa.types.is_integer(current) or pa.types.is_floating(current)) and \
+            (pa.types.is_integer(incoming) or pa.types.is_floating(incoming)):
+        return pa.float64()
+    return pa.string()
+
+
+class ChunkedDatasetWriter:
+    """
+    Writes a dataset into the store one DataFrame chunk at a time, so large
+    uploads never need to be materialised. The first chunk fixes the Arrow
+    schema; when a later chunk's inferred type drifts (e.g. an int column
+    gains NaNs, or a numeric column gains text) the column is promoted and
+    the already-written batches are rewritten once under the wider schema.
+    """
+
+    def __init__(self, dataset_path: str, source_format: str):
+        os.makedirs(dataset_path, exist_ok=True)
+        self.dataset_path = dataset_path
+        self.source_format = source_format
+        self.schema = None
+        self.rows = 0
+        self._generation = 0
+        self._sink = None
+        self._writer = None
+
+    @property
+    def tmp_path(self) -> str:
+        return f"{data_path(self.dataset_path)}.tmp{self._generation}"
+
+    def _open(self, schema: pa.Schema):
+        self.schema = schema
+        self._sink = pa.OSFile(self.tmp_path, 'wb')
+        self._writer = pa.ipc.new_file(self._sink, schema)
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._sink.close()
+            self._writer = self._sink = None
+
+    def _promote(self, incoming: pa.Schema):
+        promoted = pa.schema([
+            pa.field(field.name, _promote_type(field.type, incoming.field(field.name).type))
+            for field in self.schema
+        ])
+        self._close_writer()
+        previous = self.tmp_path
+        with pa.memory_map(previous, 'r') as source:
+            written = pa.ipc.open_file(source).read_all()
+            self._generation += 1
+            self._open(promoted)
+            self._writer.write_table(written.cast(promoted))
+            del written
+        os.unlink(previous)
+
+    def write(self, df: pd.DataFrame):
+        table = to_arrow_table(df)
+        if self.schema is None:
+            self._open(table.schema)
+        elif not table.schema.equals(self.schema, check_metadata=False):
+            table = table.select(self.schema.names)
+            try:
+                table = table.cast(self.schema)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                self._promote(table.schema)
+                table = table.cast(self.schema)
+        self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self) -> dict:
+        """Finalises the Arrow file, writes the schema sidecar and returns it."""
+        if self.schema is None:
+            self.write(pd.DataFrame())
+        self._close_writer()
+        os.replace(self.tmp_path, data_path(self.dataset_path))
+        schema = build_schema(self.schema, self.rows, os.path.basename(self.dataset_path), self.source_format)
+        _write_json_atomic(schema_path(self.dataset_path), schema)
+        return schema
+
+    def abort(self):
+        self._close_writer()
+        remove_dataset(self.dataset_path)
+
+
+def open_table(dataset_path: str, columns: list = None) -> pa.Table:
+    """
+    Memory-maps the dataset's Arrow file; no bytes are read until touched.
+    The file handle is closed straight away: the mapping itself lives only
+    as long as the table's buffers (and frames viewing them) are referenced.
+    """
+    with pa.memory_map(data_path(dataset_path), 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    return table
+
+
+def read_dataset(dataset_path: str, columns: list = None) -> pd.DataFrame:
+    """
+    Loads the stored dataset as a DataFrame. Null-free numeric columns are
+    zero-copy views over the memory map, so the frame must be treated as
+    read-only (assigning whole columns is fine, in-place edits are not).
+    """
+    return open_table(dataset_path, columns).to_pandas(split_blocks=True)
+
+
+def read_schema(dataset_path: str) -> dict:
+    with open(schema_path(dataset_path), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_profile(dataset_path: str, profile: dict) -> dict:
+    """
+    Stores a computed profile next to the dataset, stamped with the data
+    version it was built from. Returns the profile as it will be served
+    (JSON-normalised), so the upload response matches later reads.
+    """
+    normalized = json.loads(json.dumps(profile, default=str))
+    _write_json_atomic(profile_path(dataset_path), {
+        'data_version': dataset_version(dataset_path),
+        'profile': normalized,
+    })
+    return normalized
+
+
+def read_profile(dataset_path: str):
+    """Returns the stored profile, or None if missing or built from older data."""
+    try:
+        with open(profile_path(dataset_path), 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if stored.get('data_version') != dataset_version(dataset_path):
+        return None
+    return stored.get('profile')
+
+
+def dataset_exists(dataset_path: str) -> bool:
+    return os.path.isfile(data_path(dataset_path))
+
+
+# ─────────────────────────────────────────────
+# REFERENCE COUNTING
+# Callers hold dataset_lock(path) around these so a concurrent upload of
+# the same content cannot race a cleanup of the last reference.
+# ─────────────────────────────────────────────
+
+# dataset id -> [lock, holders and waiters]; an entry lives only while in use
+_dataset_locks = {}
+_dataset_locks_guard = threading.Lock()
+
+
+@contextmanager
+def dataset_lock(dataset_path: str):
+    key = os.path.basename(dataset_path)
+    with _dataset_locks_guard:
+        entry = _dataset_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _dataset_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _dataset_locks[key]
+
+
+def reference_count(dataset_path: str) -> int:
+    try:
+        with open(os.path.join(dataset_path, REFS_FILE), 'r', encoding='utf-8') as f:
+            return int(json.load(f)['count'])
+    except (OSError, ValueError, KeyError):
+        # Datasets stored before reference counting have one implicit owner.
+        return 1 if dataset_exists(dataset_path) else 0
+
+
+def _write_reference_count(dataset_path: str, count: int):
+    _write_json_atomic(os.path.join(dataset_path, REFS_FILE), {'count': count, 'updated_at': time.time()})
+
+
+def add_reference(dataset_path: str, initial: bool = False) -> int:
+    count = 1 if initial else reference_count(dataset_path) + 1
+    _write_reference_count(dataset_path, count)
+    return count
+
+
+def drop_reference(dataset_path: str) -> int:
+    """Decrements the reference count and returns what is left (never below 0)."""
+    count = max(reference_count(dataset_path) - 1, 0)
+    if count:
+        _write_reference_count(dataset_path, count)
+    return count
+
+
+def remove_dataset(dataset_path: str, retries=5, delay=0.1):
+    """
+    Best-effort removal of a dataset directory. Windows refuses to delete a
+    file that is still memory-mapped, so between retries unreachable frames
+    are collected to release their mappings; callers drop their own cached
+    frames (DataFrameCache.invalidate) first.
+    """
+    for attempt in range(retries):
+        try:
+            if os.path.isdir(dataset_path):
+                shutil.rmtree(dataset_path)
+            return
+        except PermissionError:
+            if attempt == retries - 1:
+                raise
+            gc.collect()
+            time.sleep(delay)
+
+
+# ─────────────────────────────────────────────
+# IN-PROCESS DATAFRAME CACHE
+# ─────────────────────────────────────────────
+
+class DataFrameCache:
+    """
+    Thread-safe LRU cache of loaded DataFrames keyed by (dataset_id, mtime).
+    Entries are sized with memory_usage(deep=True) and evicted least-recently
+    used first once the byte budget is exceeded. Cached frames are shared
+    between requests and must not be mutated in place.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+
+    def get_or_load(self, dataset_id: str, mtime_ns: int, loader) -> pd.DataFrame:
+        key = (dataset_id, mtime_ns)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        df = loader()
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            return df
+
+        with self._lock:
+            # Drop stale versions of the same dataset before inserting.
+            for stale in [k for k in self._entries if k[0] == dataset_id and k != key]:
+                self._drop(stale)
+            if key not in self._entries:
+                self._entries[key] = (df, size)
+                self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return df
+
+    def _drop(self, key):
+        _, size = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def invalidate(self, dataset_id: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == dataset_id]:
+                self._drop(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
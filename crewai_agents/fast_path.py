@@ -0,0 +1,475 @@
+"""
+Deterministic NL → SQL fast path.
+
+A large share of /query traffic is simple shapes — "top 5 stores by
+Weekly_Sales", "average Temperature by Holiday_Flag", "count rows where
+Fuel_Price > 3.5" — for which the interpret → SQL → narrate crew is pure
+latency and cost. FastPathPlanner recognises these with a small grammar:
+
+    1. column mentions are resolved against the profile's columns
+       (Weekly_Sales, "weekly sales", or a distinctive word like "sales")
+    2. the rest of the question is reduced to keywords
+       (TOP/BOTTOM, AGG, COUNT, BY, WHERE, comparison operators, numbers)
+    3. the keyword skeleton is matched against a handful of templates;
+       anything unrecognised (a stray "in 2011", a join, a ratio) fails
+       the match instead of being guessed at
+
+A plan carries a confidence (lower for inferred aggregates and partial
+column matches); the caller only uses it above a threshold and otherwise
+falls back to the crew. narrate() writes a short template narrative from
+the result so the whole request needs no LLM call.
+"""
+
+import re
+import threading
+
+from query_engine import TABLE_NAME, quote_identifier
+
+_TOKEN = re.compile(r"'[^']*'|\"[^\"]*\"|-?\d+(?:\.\d+)?(?![A-Za-z_])|[<>!=]=?|[A-Za-z0-9_]+")
+_WORD = re.compile(r'[a-z0-9]+')
+
+FILLERS = {
+    'show', 'me', 'give', 'list', 'find', 'get', 'display', 'what', 'which', 'who', 'are', 'was', 'were',
+    'the', 'a', 'an', 'of', 'all', 'please', 'tell', 'return', 'compute', 'calculate', 'i', 'want', 'to',
+    'see', 'us', 'do', 'does', 'have', 'has', 'had', 'there', 'data', 'dataset', 'table', 'value', 'values',
+    'overall', 'that', 'whats', 'can', 'you', 'my', 'our',
+}
+
+# Multi-word phrases first; matched longest-first at each position.
+PHRASES = [
+    (('greater', 'than', 'or', 'equal', 'to'), ('OP', '>=')),
+    (('less', 'than', 'or', 'equal', 'to'), ('OP', '<=')),
+    (('broken', 'down', 'by'), ('BY', None)),
+    (('not', 'equal', 'to'), ('OP', '!=')),
+    (('group', 'by'), ('BY', None)),
+    (('grouped', 'by'), ('BY', None)),
+    (('for', 'each'), ('BY', None)),
+    (('for', 'every'), ('BY', None)),
+    (('split', 'by'), ('BY', None)),
+    (('how', 'many'), ('COUNT', None)),
+    (('number', 'of'), ('COUNT', None)),
+    (('count', 'of'), ('COUNT', None)),
+    (('at', 'least'), ('OP', '>=')),
+    (('at', 'most'), ('OP', '<=')),
+    (('greater', 'than'), ('OP', '>')),
+    (('more', 'than'), ('OP', '>')),
+    (('higher', 'than'), ('OP', '>')),
+    (('larger', 'than'), ('OP', '>')),
+    (('less', 'than'), ('OP', '<')),
+    (('lower', 'than'), ('OP', '<')),
+    (('fewer', 'than'), ('OP', '<')),
+    (('smaller', 'than'), ('OP', '<')),
+    (('equal', 'to'), ('OP', '=')),
+    (('is', 'not'), ('OP', '!=')),
+]
+WORDS = {
+    'by': ('BY', None), 'per': ('BY', None), 'across': ('BY', None),
+    'count': ('COUNT', None), 'counts': ('COUNT', None),
+    'top': ('TOP', 'DESC'), 'highest': ('TOP', 'DESC'), 'largest': ('TOP', 'DESC'), 'biggest': ('TOP', 'DESC'),
+    'most': ('TOP', 'DESC'), 'best': ('TOP', 'DESC'), 'greatest': ('TOP', 'DESC'),
+    'bottom': ('TOP', 'ASC'), 'lowest': ('TOP', 'ASC'), 'smallest': ('TOP', 'ASC'), 'least': ('TOP', 'ASC'),
+    'worst': ('TOP', 'ASC'), 'fewest': ('TOP', 'ASC'),
+    'average': ('AGG', 'AVG'), 'avg': ('AGG', 'AVG'), 'mean': ('AGG', 'AVG'),
+    'total': ('AGG', 'SUM'), 'sum': ('AGG', 'SUM'),
+    'maximum': ('AGG', 'MAX'), 'max': ('AGG', 'MAX'),
+    'minimum': ('AGG', 'MIN'), 'min': ('AGG', 'MIN'),
+    'distinct': ('DISTINCT', None), 'unique': ('DISTINCT', None), 'different': ('DISTINCT', None),
+    'where': ('WHERE', None), 'when': ('WHERE', None), 'whose': ('WHERE', None), 'if': ('WHERE', None),
+    'and': ('AND', None),
+    'rows': ('ROWS', None), 'row': ('ROWS', None), 'records': ('ROWS', None), 'record': ('ROWS', None),
+    'entries': ('ROWS', None), 'observations': ('ROWS', None),
+    'above': ('OP', '>'), 'over': ('OP', '>'), 'exceeds': ('OP', '>'), 'exceeding': ('OP', '>'),
+    'below': ('OP', '<'), 'under': ('OP', '<'), 'equals': ('OP', '='),
+    '>': ('OP', '>'), '>=': ('OP', '>='), '<': ('OP', '<'), '<=': ('OP', '<='),
+    '=': ('OP', '='), '==': ('OP', '='), '!=': ('OP', '!='),
+}
+# Words that only mean something next to a column ("Store is 5", "with Holiday_Flag = 1")
+CONTEXTUAL = {'is': ('OP', '='), 'with': ('WHERE', None), 'for': ('WHERE', None)}
+
+AGG_LABELS = {'AVG': 'average', 'SUM': 'total', 'MAX': 'maximum', 'MIN': 'minimum', 'COUNT': 'count'}
+
+# (keyword skeleton, template, base confidence); first full match wins
+TEMPLATES = [
+    (r'TOP(?: NUM)? COL BY(?: AGG)? COL', 'rank_group', 1.0),
+    (r'TOP(?: NUM)? COL BY COUNT(?: ROWS)?', 'rank_count', 1.0),
+    (r'COL TOP(?: AGG)? COL', 'rank_group', 0.9),
+    (r'TOP(?: NUM)?(?: ROWS)? BY COL', 'rank_rows', 1.0),
+    (r'(?:AGG )?COL BY COL', 'group_agg', 1.0),
+    (r'COUNT(?: ROWS)? BY COL', 'group_count', 1.0),
+    (r'AGG COL', 'scalar_agg', 1.0),
+    (r'COUNT(?: DISTINCT)? COL', 'count_distinct', 0.85),
+    (r'COUNT(?: ROWS)?', 'count_rows', 1.0),
+    (r'(?:ROWS)?', 'filter_rows', 0.9),
+]
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    return word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+
+
+def _parts(name: str) -> list:
+    return [_stem(w) for w in _WORD.findall(str(name).lower())]
+
+
+class _ColumnIndex:
+    """Resolves column mentions: full name sequences, then distinctive single words."""
+
+    def __init__(self, columns: list):
+        self.sequences = sorted(((tuple(_parts(c)), c) for c in columns if _parts(c)), key=lambda x: -len(x[0]))
+        frequency = {}
+        for parts, _ in self.sequences:
+            for part in set(parts):
+                frequency[part] = frequency.get(part, 0) + 1
+        self.distinctive = {
+            part: col for parts, col in self.sequences for part in parts
+            if frequency[part] == 1 and len(part) > 2 and not part.isdigit()
+        }
+
+    def match(self, words: list, i: int):
+        """Returns (column, words consumed, quality) for a mention starting at words[i], or None."""
+        for parts, col in self.sequences:
+            n = len(parts)
+            if tuple(_stem(w) for w in words[i:i + n]) == parts:
+                return col, n, 1.0
+        col = self.distinctive.get(_stem(words[i]))
+        if col is not None:
+            return col, 1, 0.85
+        return None
+
+
+def tokenize(query: str, columns: list) -> list:
+    """Reduces a question to (kind, value, quality) tokens; unknown words become ('WORD', w)."""
+    index = _ColumnIndex(columns)
+    raw = []
+    for tok in _TOKEN.findall(query or ''):
+        if tok[0] in '\'"':
+            raw.append(('STR', tok[1:-1]))
+        elif re.fullmatch(r'-?\d+(?:\.\d+)?', tok):
+            raw.append(('NUM', tok))
+        elif tok[0] in '<>!=':
+            raw.append(('SYM', tok))
+        else:
+            raw.extend(('W', w) for w in _WORD.findall(tok.lower()))
+
+    tokens = []
+    i = 0
+    while i < len(raw):
+        kind, value = raw[i]
+        if kind != 'W':
+            tokens.append(WORDS[value] + (1.0,) if kind == 'SYM' else (kind, value, 1.0))
+            i += 1
+            continue
+        words = []
+        for k, v in raw[i:]:
+            if k not in ('W', 'NUM'):
+                break
+            words.append(v)
+        hit = index.match(words, 0)
+        if hit:
+            tokens.append(('COL', hit[0], hit[2]))
+            i += hit[1]
+            continue
+        for phrase, canonical in PHRASES:
+            if tuple(words[:len(phrase)]) == phrase:
+                tokens.append(canonical + (1.0,))
+                i += len(phrase)
+                break
+        else:
+            word = words[0]
+            if word in WORDS:
+                tokens.append(WORDS[word] + (1.0,))
+            elif word in CONTEXTUAL:
+                tokens.append(('CTX', word, 1.0))
+            elif word not in FILLERS:
+                tokens.append(('WORD', word, 1.0))
+            i += 1
+
+    # Contextual words: 'is' after a column is '=', 'with'/'for' before one starts a filter.
+    resolved = []
+    for j, tok in enumerate(tokens):
+        if tok[0] != 'CTX':
+            resolved.append(tok)
+            continue
+        prev_col = resolved and resolved[-1][0] == 'COL'
+        next_col = j + 1 < len(tokens) and tokens[j + 1][0] == 'COL'
+        if tok[1] == 'is' and prev_col:
+            resolved.append(CONTEXTUAL['is'] + (1.0,))
+        elif tok[1] in ('with', 'for') and next_col:
+            resolved.append(CONTEXTUAL[tok[1]] + (1.0,))
+    return resolved
+
+
+def _parse_conditions(tokens: list):
+    """COL [OP] VALUE (AND COL [OP] VALUE)* → [(col, op, value, kind)], or None."""
+    conditions = []
+    i = 0
+    while i < len(tokens):
+        if tokens[i][0] != 'COL':
+            return None
+        col = tokens[i][1]
+        op = '='
+        i += 1
+        if i < len(tokens) and tokens[i][0] == 'OP':
+            op = tokens[i][1]
+            i += 1
+        if i >= len(tokens) or tokens[i][0] not in ('NUM', 'STR'):
+            return None
+        conditions.append((col, op, tokens[i][1], tokens[i][0]))
+        i += 1
+        if i < len(tokens):
+            if tokens[i][0] != 'AND':
+                return None
+            i += 1
+    return conditions
+
+
+def _split_filter(tokens: list):
+    """Separates a trailing filter (after WHERE, or a bare 'COL OP VALUE …' tail)."""
+    for i, tok in enumerate(tokens):
+        if tok[0] == 'WHERE':
+            conditions = _parse_conditions(tokens[i + 1:])
+            return (tokens[:i], conditions) if conditions else (None, None)
+    # No WHERE: accept a tail of explicit comparisons ("records with Fuel_Price above 3.5").
+    for start in range(len(tokens)):
+        if tokens[start][0] == 'COL' and start + 1 < len(tokens) and tokens[start + 1][0] == 'OP':
+            conditions = _parse_conditions(tokens[start:])
+            if conditions:
+                return tokens[:start], conditions
+    return tokens, []
+
+
+def _literal(value: str, kind: str) -> str:
+    return value if kind == 'NUM' else "'" + value.replace("'", "''") + "'"
+
+
+class FastPathPlanner:
+    """
+    Matches questions against the templates above. plan() returns None
+    when no template matches or the confidence is below `min_confidence`.
+    record_served() tallies which path (fast_path / cache / crew) finally
+    answered each /query, for hit-rate tracking; record_failed() counts
+    plans whose SQL did not execute (the caller then asks the crew).
+    """
+
+    def __init__(self, min_confidence: float = 0.8, max_rows: int = 100):
+        self.min_confidence = min_confidence
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.planned = 0
+        self.low_confidence = 0
+        self.unmatched = 0
+        self.failed = 0
+        self.served = {'fast_path': 0, 'cache': 0, 'crew': 0}
+
+    def _count(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def plan(self, query: str, profile: dict):
+        """Returns {'sql', 'interpretation', 'template', 'confidence', ...} or None."""
+        self._count('attempts')
+        plan = self._match(query, profile)
+        if plan is None:
+            self._count('unmatched')
+            return None
+        if plan['confidence'] < self.min_confidence:
+            self._count('low_confidence')
+            return None
+        self._count('planned')
+        return plan
+
+    def _match(self, query: str, profile: dict):
+        columns = profile.get('columns', [])
+        numeric = set(profile.get('numeric_columns', []))
+        tokens = tokenize(query, columns)
+        head, conditions = _split_filter(tokens)
+        if head is None or any(t[0] == 'WORD' for t in head):
+            return None
+
+        skeleton = ' '.join(t[0] for t in head)
+        for pattern, template, base in TEMPLATES:
+            if re.fullmatch(pattern, skeleton):
+                break
+        else:
+            return None
+        if template == 'filter_rows' and not conditions:
+            return None
+
+        cols = [t[1] for t in head if t[0] == 'COL']
+        nums = [t[1] for t in head if t[0] == 'NUM']
+        aggs = [t[1] for t in head if t[0] == 'AGG']
+        direction = next((t[1] for t in head if t[0] == 'TOP'), 'DESC')
+        quality = 1.0
+        for t in head:
+            if t[0] == 'COL':
+                quality *= t[2]
+        confidence = base * quality
+
+        limit = self.max_rows
+        if nums:
+            if not re.fullmatch(r'\d+', nums[0]):
+                return None
+            limit = max(1, min(int(nums[0]), self.max_rows))
+        if template == 'rank_group' and skeleton.startswith('COL'):
+            limit = 1
+
+        where = ''
+        if conditions:
+            clauses = []
+            for col, op, value, kind in conditions:
+                if kind == 'NUM' and col not in numeric:
+                    confidence *= 0.9
+                clauses.append(f'{quote_identifier(col)} {op} {_literal(value, kind)}')
+            where = ' WHERE ' + ' AND '.join(clauses)
+        q = quote_identifier
+
+        agg = aggs[0] if aggs else None
+        if template in ('rank_group', 'group_agg', 'scalar_agg'):
+            measure = cols[-1]
+            if agg is None:
+                agg = 'SUM'
+                confidence *= 0.9
+            if measure not in numeric and agg in ('AVG', 'SUM'):
+                return None
+
+        if template == 'rank_group':
+            dim, measure = cols[0], cols[1]
+            if dim == measure:
+                return None
+            alias = f'{AGG_LABELS[agg]}_{measure}'
+            sql = (f'SELECT {q(dim)}, {agg}({q(measure)}) AS {q(alias)} FROM {TABLE_NAME}{where} '
+                   f'GROUP BY {q(dim)} ORDER BY {q(alias)} {direction} LIMIT {limit}')
+            kind, intent = 'ranking', f"{'Top' if direction == 'DESC' else 'Bottom'} {limit} {dim} by {AGG_LABELS[agg]} {measure}"
+        elif template == 'rank_count':
+            dim = cols[0]
+            sql = (f'SELECT {q(dim)}, COUNT(*) AS row_count FROM {TABLE_NAME}{where} '
+                   f'GROUP BY {q(dim)} ORDER BY row_count {direction} LIMIT {limit}')
+            kind, intent = 'ranking', f"{'Top' if direction == 'DESC' else 'Bottom'} {limit} {dim} by row count"
+        elif template == 'rank_rows':
+            col = cols[0]
+            limit = limit if nums else 10
+            sql = f'SELECT * FROM {TABLE_NAME}{where} ORDER BY {q(col)} {direction} LIMIT {limit}'
+            kind, intent = 'ranking', f"{'Top' if direction == 'DESC' else 'Bottom'} {limit} rows by {col}"
+        elif template == 'group_agg':
+            measure, dim = cols[0], cols[1]
+            if dim == measure:
+                return None
+            alias = f'{AGG_LABELS[agg]}_{measure}'
+            sql = (f'SELECT {q(dim)}, {agg}({q(measure)}) AS {q(alias)} FROM {TABLE_NAME}{where} '
+                   f'GROUP BY {q(dim)} ORDER BY {q(dim)} LIMIT {self.max_rows}')
+            kind, intent = 'aggregation', f'{AGG_LABELS[agg].capitalize()} {measure} by {dim}'
+        elif template == 'group_count':
+            dim = cols[0]
+            sql = (f'SELECT {q(dim)}, COUNT(*) AS row_count FROM {TABLE_NAME}{where} '
+                   f'GROUP BY {q(dim)} ORDER BY row_count DESC LIMIT {self.max_rows}')
+            kind, intent = 'aggregation', f'Row count by {dim}'
+        elif template == 'scalar_agg':
+            measure = cols[0]
+            alias = f'{AGG_LABELS[agg]}_{measure}'
+            sql = f'SELECT {agg}({q(measure)}) AS {q(alias)} FROM {TABLE_NAME}{where}'
+            kind, intent = 'aggregation', f'{AGG_LABELS[agg].capitalize()} {measure}'
+        elif template == 'count_distinct':
+            col = cols[0]
+            sql = f'SELECT COUNT(DISTINCT {q(col)}) AS {q("distinct_" + col)} FROM {TABLE_NAME}{where}'
+            kind, intent = 'aggregation', f'Number of distinct {col} values'
+        elif template == 'count_rows':
+            sql = f'SELECT COUNT(*) AS row_count FROM {TABLE_NAME}{where}'
+            kind, intent = 'aggregation', 'Number of rows'
+        else:  # filter_rows
+            sql = f'SELECT * FROM {TABLE_NAME}{where} LIMIT {self.max_rows}'
+            kind, intent = 'filter', 'Rows'
+
+        if conditions:
+            intent += ' where ' + ' and '.join(f'{c} {op} {v}' for c, op, v, _ in conditions)
+        required = list(dict.fromkeys(cols + [c[0] for c in conditions]))
+        return {
+            'sql': sql,
+            'template': template,
+            'confidence': round(confidence, 4),
+            'aggregate': agg,
+            'direction': direction,
+            'interpretation': {
+                'valid': True,
+                'interpreted_intent': intent,
+                'required_columns': required,
+                'analysis_type': kind,
+                'suggestion': None,
+                'confidence': round(confidence, 4),
+            },
+        }
+
+    def record_served(self, path: str):
+        with self._lock:
+            self.served[path] = self.served.get(path, 0) + 1
+
+    def record_failed(self):
+        self._count('failed')
+
+    def stats(self) -> dict:
+        with self._lock:
+            served = sum(self.served.values())
+            return {
+                'min_confidence': self.min_confidence,
+                'attempts': self.attempts,
+                'planned': self.planned,
+                'low_confidence': self.low_confidence,
+                'unmatched': self.unmatched,
+                'failed': self.failed,
+                'hit_rate': round(self.planned / self.attempts, 4) if self.attempts else 0.0,
+                'served': dict(self.served),
+                'served_fast_path_rate': round(self.served['fast_path'] / served, 4) if served else 0.0,
+            }
+
+
+# ─────────────────────────────────────────────
+# TEMPLATE NARRATIVE
+# ─────────────────────────────────────────────
+
+def _fmt(value) -> str:
+    if isinstance(value, bool) or value is None:
+        return str(value)
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer() and abs(value) < 1e15):
+        return f'{int(value):,}'
+    if isinstance(value, float):
+        return f'{value:,.2f}'
+    try:
+        return _fmt(value.item())
+    except AttributeError:
+        return str(value)
+
+
+def narrate(plan: dict, result_df) -> str:
+    """A short factual narrative of a fast-path result (no LLM involved)."""
+    intent = plan['interpretation']['interpreted_intent']
+    if result_df is None or result_df.empty:
+        return f'**{intent}**: the query returned no rows.'
+    template = plan['template']
+    rows = len(result_df)
+    cols = result_df.columns.tolist()
+
+    if template in ('scalar_agg', 'count_distinct', 'count_rows'):
+        return f'**{intent}**: {_fmt(result_df.iloc[0, 0])}.'
+    if template in ('rank_group', 'rank_count'):
+        dim, value = cols[0], cols[1]
+        first = result_df.iloc[0]
+        text = f'**{intent}**: {dim} {_fmt(first[dim])} ranks first ({_fmt(first[value])})'
+        if rows > 1:
+            second = result_df.iloc[1]
+            text += f', followed by {dim} {_fmt(second[dim])} ({_fmt(second[value])})'
+        if rows > 2:
+            last = result_df.iloc[-1]
+            text += f'; number {rows} is {dim} {_fmt(last[dim])} ({_fmt(last[value])})'
+        return text + '.'
+    if template in ('group_agg', 'group_count'):
+        dim, value = cols[0], cols[1]
+        if result_df[value].isna().all():
+            # e.g. the average of a column that is null in every group
+            return f'**{intent}** across {rows} groups: {value} is null in every group.'
+        hi = result_df.loc[result_df[value].idxmax()]
+        lo = result_df.loc[result_df[value].idxmin()]
+        return (f'**{intent}** across {rows} groups: highest for {dim} {_fmt(hi[dim])} '
+                f'({_fmt(hi[value])}), lowest for {dim} {_fmt(lo[dim])} ({_fmt(lo[value])}).')
+    return f'**{intent}**: {rows} row{"s" if rows != 1 else ""} returned.'
@@ -0,0 +1,143 @@
+"""
+In-process job queue for the long-running agent endpoints.
+
+A Crew.kickoff() can take 20–60 s, longer than the frontend's HTTP timeout
+and long enough to pin a request thread per user. Endpoints submitted with
+{"async": true} run here instead: the POST returns a job id at once, the
+work runs on a bounded worker pool, and clients poll GET /jobs/<id> or
+subscribe to GET /jobs/<id>/events (server-sent events) for progress and
+the result.
+
+Jobs live in memory; finished jobs are kept for `ttl_seconds` so a client
+can still collect the result, then purged.
+"""
+
+import time
+import uuid
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+TERMINAL_STATES = {SUCCEEDED, FAILED}
+
+_current_job = contextvars.ContextVar('current_job', default=None)
+
+
+class QueueFull(Exception):
+    """Raised when the number of queued + running jobs reaches the limit."""
+
+
+def report_progress(stage: str, message: str = None):
+    """
+    Records the current stage of the job running on this thread (e.g.
+    'generating_sql', 'narrating'). A no-op for synchronous requests.
+    """
+    job = _current_job.get()
+    if job is not None:
+        job['manager']._update(job['id'], progress={'stage': stage, 'message': message, 'at': time.time()})
+
+
+class JobManager:
+    """
+    Thread-safe registry of jobs executed on a ThreadPoolExecutor. The
+    runner passed to submit() returns (payload, http_status) just like a
+    synchronous route; a status >= 400 marks the job failed.
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 64, ttl_seconds: float = 3600):
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self.submitted = 0
+        self.rejected = 0
+
+    def _purge(self, now: float):
+        for job_id in [j for j, job in self._jobs.items()
+                       if job['status'] in TERMINAL_STATES and now - job['finished_at'] > self.ttl_seconds]:
+            del self._jobs[job_id]
+
+    def submit(self, kind: str, runner, *args) -> dict:
+        now = time.time()
+        with self._cond:
+            self._purge(now)
+            pending = sum(1 for job in self._jobs.values() if job['status'] not in TERMINAL_STATES)
+            if pending >= self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f'Too many jobs in flight ({pending}); retry shortly.')
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'kind': kind,
+                'status': QUEUED,
+                'progress': None,
+                'created_at': now,
+                'started_at': None,
+                'finished_at': None,
+                'status_code': None,
+                'result': None,
+                'error': None,
+                'version': 0,
+            }
+            self.submitted += 1
+            snapshot = dict(self._jobs[job_id])
+        self._executor.submit(self._run, job_id, runner, args)
+        return snapshot
+
+    def _update(self, job_id: str, **fields):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            job['version'] += 1
+            self._cond.notify_all()
+
+    def _run(self, job_id: str, runner, args):
+        self._update(job_id, status=RUNNING, started_at=time.time())
+        token = _current_job.set({'id': job_id, 'manager': self})
+        try:
+            payload, status_code = runner(*args)
+        except Exception as e:
+            payload, status_code = {'error': str(e)}, 500
+        finally:
+            _current_job.reset(token)
+        failed = status_code >= 400
+        self._update(
+            job_id,
+            status=FAILED if failed else SUCCEEDED,
+            finished_at=time.time(),
+            status_code=status_code,
+            result=None if failed else payload,
+            error=payload.get('error') if failed else None,
+        )
+
+    def get(self, job_id: str):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def wait_for_change(self, job_id: str, version: int, timeout: float = 15.0):
+        """
+        Blocks until the job's version moves past `version` (or `timeout`
+        elapses) and returns the latest snapshot, None if the job is unknown.
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: job_id not in self._jobs or self._jobs[job_id]['version'] > version,
+                timeout=timeout
+            )
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def stats(self) -> dict:
+        with self._cond:
+            counts = {state: 0 for state in (QUEUED, RUNNING, SUCCEEDED, FAILED)}
+            for job in self._jobs.values():
+                counts[job['status']] += 1
+            return {**counts, 'submitted': self.submitted, 'rejected': self.rejected, 'max_pending': self.max_pending}
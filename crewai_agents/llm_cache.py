@@ -0,0 +1,67 @@
+"""
+Persistent exact-prompt LLM response cache.
+
+Re-opening a dataset sends /analyze and /detective the very same prompt
+(same profile, same template), and each time we paid for a full
+completion. The cache sits under the LLM gateway, so every caller — the
+LangChain chain used by the CrewAI agents, the streaming routes and the
+legacy LitellmLLM — shares it. Entries are keyed by model, temperature,
+the other sampling parameters and a hash of the messages, and kept in a
+cache_store.LRUStore (SQLite, evicted least-recently-used past
+`max_bytes`).
+
+Callers opt out for a block of work with
+
+    with llm_cache.disabled():
+        crew.kickoff()
+
+per call with gateway.complete(..., use_cache=False), or per agent by
+giving it a chat model built with use_cache=False:
+
+    fresh_llm = llm.uncached()
+"""
+
+import json
+import hashlib
+
+import cache_store
+
+_switch = cache_store.Switch('llm_cache_enabled')
+
+# Bypasses the cache (lookups and stores) for LLM calls made in the block
+disabled = _switch.disabled
+is_enabled = _switch.is_enabled
+
+
+def cache_key(model: str, messages: list, params: dict) -> str:
+    canonical = json.dumps({'model': model, 'messages': messages, 'params': params},
+                           sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Completions by cache_key(), with the model that answered and its token usage."""
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 ** 2):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._store = cache_store.LRUStore(
+            path, 'responses', max_bytes,
+            columns={'model': 'TEXT NOT NULL', 'temperature': 'REAL'},
+            encode=lambda entry: json.dumps(entry).encode('utf-8'),
+            decode=json.loads,
+        )
+
+    def get(self, key: str):
+        """Returns {'content', 'model', 'usage'} or None, refreshing the entry's recency."""
+        return self._store.get(key)
+
+    def put(self, key: str, model: str, temperature, content: str, usage: dict = None):
+        self._store.put(key, {'content': content, 'model': model, 'usage': usage or {}},
+                        model=model, temperature=temperature)
+
+    def clear(self):
+        self._store.clear()
+
+    def stats(self) -> dict:
+        return self._store.stats()
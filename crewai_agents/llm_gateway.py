@@ -0,0 +1,449 @@
+"""
+Async LLM gateway for OpenRouter (OpenAI-compatible chat completions).
+
+Every LLM call used to be a blocking litellm completion that set up its own
+HTTP session. The gateway instead owns one pooled httpx.AsyncClient
+(keep-alive connections reused across requests and threads) running on a
+dedicated event-loop thread, and bounds in-flight requests per model with a
+semaphore so a burst of agents cannot trip provider rate limits.
+
+    gateway = LLMGateway(api_key)
+    gateway.complete([{'role': 'user', 'content': 'hi'}], model='openrouter/openai/gpt-4o-mini',
+                     fallbacks=['openrouter/deepseek/deepseek-chat-v3-0324'])
+    gateway.batch([{'messages': [...], 'model': ...}, ...])    # fanned out concurrently
+    for delta in gateway.stream(messages, model=...): ...
+
+Synchronous callers (Flask handlers, CrewAI agents) use complete / batch /
+stream; async code can await acomplete / abatch / astream directly on the
+gateway loop. With a llm_cache.ResponseCache attached, identical requests
+are answered from disk (sync callers honour llm_cache.disabled()).
+
+Fallback models are tried by the gateway itself, in order, once a model
+has exhausted its retries (for streams: only before the first delta);
+results say which model answered and whether it was a fallback.
+GatewayChatModel adapts the gateway to LangChain so CrewAI agents keep
+working unchanged. Sync calls are reported to the caller's request
+trace (tracing.py).
+"""
+
+import json
+import time
+import queue
+import random
+import asyncio
+import threading
+from typing import Any, Optional, Tuple
+
+import httpx
+import llm_cache
+import tracing
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+_STREAM_DONE = object()
+
+
+class GatewayError(Exception):
+    """A completion failed on every model/attempt (or with a non-retryable error)."""
+
+    def __init__(self, message: str, status_code: int = None, attempts: int = 1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.attempts = attempts
+
+
+def provider_model(model: str) -> str:
+    """Maps LiteLLM-style names ('openrouter/openai/gpt-4o-mini') to OpenRouter ids."""
+    return model[len('openrouter/'):] if model.startswith('openrouter/') else model
+
+
+class LLMGateway:
+    def __init__(self, api_key: str, base_url: str = OPENROUTER_BASE_URL, headers: dict = None,
+                 max_connections: int = 32, max_keepalive: int = 16, default_concurrency: int = 4,
+                 model_concurrency: dict = None, timeout: float = 60.0, max_retries: int = 2,
+                 backoff_seconds: float = 0.5, cache=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.headers = dict(headers or {})
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.timeout = timeout
+        self.default_concurrency = default_concurrency
+        self.model_concurrency = dict(model_concurrency or {})
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.cache = cache
+
+        self._semaphores = {}
+        self._client = None
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'failures': 0, 'fallbacks': 0, 'in_flight': 0,
+                       'prompt_tokens': 0, 'completion_tokens': 0}
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='llm-gateway', daemon=True)
+        self._thread.start()
+
+    # ── plumbing ──────────────────────────────
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for key, value in deltas.items():
+                self._stats[key] += value
+
+    def _http(self) -> httpx.AsyncClient:
+        # Created lazily on the gateway loop, which is the only loop that uses it.
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={'Authorization': f'Bearer {self.api_key}', **self.headers},
+                limits=self.limits,
+                timeout=self.timeout,
+            )
+        return self._client
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        sem = self._semaphores.get(model)
+        if sem is None:
+            sem = asyncio.Semaphore(self.model_concurrency.get(model, self.default_concurrency))
+            self._semaphores[model] = sem
+        return sem
+
+    def _run(self, coro):
+        """Runs a coroutine on the gateway loop from synchronous code and waits for it."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError('Synchronous gateway calls cannot be made from the gateway loop; await instead')
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _backoff(self, attempt: int):
+        await asyncio.sleep(self.backoff_seconds * (2 ** attempt) * (0.5 + random.random()))
+
+    @staticmethod
+    def _payload(model: str, messages: list, params: dict) -> dict:
+        return {'model': provider_model(model), 'messages': messages,
+                **{k: v for k, v in params.items() if v is not None}}
+
+    @staticmethod
+    def _cache_key(model: str, messages: list, params: dict) -> str:
+        return llm_cache.cache_key(provider_model(model), messages,
+                                   {k: v for k, v in params.items() if v is not None})
+
+    async def _cached(self, candidates, messages: list, params: dict):
+        for candidate in candidates:
+            hit = await asyncio.to_thread(self.cache.get, self._cache_key(candidate, messages, params))
+            if hit is not None:
+                return hit
+        return None
+
+    async def _store(self, model: str, messages: list, params: dict, content: str, usage: dict = None):
+        await asyncio.to_thread(self.cache.put, self._cache_key(model, messages, params), provider_model(model),
+                                params.get('temperature'), content, usage)
+
+    # ── async API ─────────────────────────────
+
+    async def _complete_one(self, model: str, messages: list, params: dict) -> dict:
+        payload = self._payload(model, messages, params)
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count(retries=1)
+                await self._backoff(attempt - 1)
+            async with self._semaphore(model):
+                self._count(requests=1, in_flight=1)
+                try:
+                    response = await self._http().post('/chat/completions', json=payload)
+                except httpx.TransportError as e:
+                    last_error = GatewayError(f'{model}: {type(e).__name__}: {e}')
+                    continue
+                finally:
+                    self._count(in_flight=-1)
+            if response.status_code in RETRYABLE_STATUS:
+                last_error = GatewayError(f'{model}: HTTP {response.status_code}', response.status_code)
+                continue
+            if response.status_code >= 400:
+                raise GatewayError(f'{model}: HTTP {response.status_code}: {response.text[:300]}',
+                                   response.status_code, attempt + 1)
+
+            data = response.json()
+            if 'error' in data:
+                raise GatewayError(f"{model}: {data['error']}", attempts=attempt + 1)
+            usage = data.get('usage') or {}
+            self._count(prompt_tokens=usage.get('prompt_tokens', 0), completion_tokens=usage.get('completion_tokens', 0))
+            return {
+                'content': data['choices'][0]['message'].get('content') or '',
+                'model': data.get('model', model),
+                'usage': usage,
+                'attempts': attempt + 1,
+                'cached': False,
+            }
+        last_error.attempts = self.max_retries + 1
+        raise last_error
+
+    async def acomplete(self, messages: list, model: str, fallbacks=(), use_cache: bool = True, **params) -> dict:
+        """
+        One chat completion, retried with jittered backoff on transport
+        errors and retryable statuses, then tried on each fallback model.
+        Returns {'content', 'model', 'usage', 'attempts', 'retries',
+        'fallback', 'cached'}; `retries` counts every attempt after the
+        first, across models.
+        """
+        candidates = [model, *fallbacks]
+        use_cache = use_cache and self.cache is not None
+        if use_cache:
+            hit = await self._cached(candidates, messages, params)
+            if hit is not None:
+                return {**hit, 'attempts': 0, 'retries': 0, 'fallback': False, 'cached': True}
+
+        last_error = None
+        failed_attempts = 0
+        for i, candidate in enumerate(candidates):
+            if i:
+                self._count(fallbacks=1)
+            try:
+                result = await self._complete_one(candidate, messages, params)
+            except GatewayError as e:
+                last_error = e
+                failed_attempts += e.attempts
+                continue
+            if use_cache and result['content']:
+                await self._store(candidate, messages, params, result['content'], result['usage'])
+            return {**result, 'retries': failed_attempts + result['attempts'] - 1, 'fallback': i > 0}
+        self._count(failures=1)
+        last_error.attempts = failed_attempts
+        raise last_error
+
+    async def abatch(self, requests: list, return_exceptions: bool = True) -> list:
+        """
+        Fans out many completions at once; each request is a dict of
+        acomplete keyword arguments. Results come back in request order.
+        Per-model semaphores still bound how many are on the wire.
+        """
+        return await asyncio.gather(*(self.acomplete(**req) for req in requests),
+                                    return_exceptions=return_exceptions)
+
+    async def _stream_one(self, model: str, messages: list, params: dict):
+        payload = {**self._payload(model, messages, params), 'stream': True}
+        async with self._semaphore(model):
+            self._count(requests=1, in_flight=1)
+            try:
+                async with self._http().stream('POST', '/chat/completions', json=payload) as response:
+                    if response.status_code >= 400:
+                        body = (await response.aread()).decode('utf-8', 'replace')
+                        raise GatewayError(f'{model}: HTTP {response.status_code}: {body[:300]}', response.status_code)
+                    lines = response.aiter_lines()
+                    try:
+                        async for line in lines:
+                            if not line.startswith('data:'):
+                                continue
+                            data = line[5:].strip()
+                            if data == '[DONE]':
+                                break
+                            chunk = json.loads(data)
+                            if chunk.get('error'):
+                                raise GatewayError(f"{model}: {chunk['error']}")
+                            for choice in chunk.get('choices', []):
+                                delta = (choice.get('delta') or {}).get('content')
+                                if delta:
+                                    yield delta
+                    finally:
+                        await lines.aclose()
+            except httpx.TransportError as e:
+                raise GatewayError(f'{model}: {type(e).__name__}: {e}')
+            finally:
+                self._count(in_flight=-1)
+
+    async def astream(self, messages: list, model: str, fallbacks=(), use_cache: bool = True,
+                      outcome: dict = None, **params):
+        """
+        Yields content deltas of a streamed completion. A model that fails
+        before its first delta hands over to the next fallback; once tokens
+        flow there is no retry. A cached answer is replayed as a single
+        delta; a completed stream is stored. `outcome`, when given, receives
+        {'model', 'fallback', 'cached'} for the stream that answered.
+        """
+        outcome = {} if outcome is None else outcome
+        candidates = [model, *fallbacks]
+        use_cache = use_cache and self.cache is not None
+        if use_cache:
+            hit = await self._cached(candidates, messages, params)
+            if hit is not None:
+                outcome.update(model=hit['model'], fallback=False, cached=True)
+                yield hit['content']
+                return
+
+        for i, candidate in enumerate(candidates):
+            if i:
+                self._count(fallbacks=1)
+            parts = []
+            try:
+                async for delta in self._stream_one(candidate, messages, params):
+                    parts.append(delta)
+                    yield delta
+            except GatewayError:
+                if parts or i == len(candidates) - 1:
+                    self._count(failures=1)
+                    raise
+                continue
+            outcome.update(model=provider_model(candidate), fallback=i > 0, cached=False)
+            if use_cache and parts:
+                await self._store(candidate, messages, params, ''.join(parts))
+            return
+
+    # ── sync API ──────────────────────────────
+
+    # The cache opt-out is a contextvar of the calling thread, so it is read
+    # here rather than on the gateway loop.
+
+    def complete(self, messages: list, model: str, fallbacks=(), **params) -> dict:
+        params.setdefault('use_cache', llm_cache.is_enabled())
+        start = time.perf_counter()
+        try:
+            result = self._run(self.acomplete(messages, model, fallbacks, **params))
+        except GatewayError as e:
+            tracing.record_llm_call(provider_model(model), time.perf_counter() - start, retries=max(e.attempts - 1, 0), error=str(e))
+            raise
+        self._trace(model, time.perf_counter() - start, result)
+        return result
+
+    def batch(self, requests: list, return_exceptions: bool = True) -> list:
+        use_cache = llm_cache.is_enabled()
+        requests = [{'use_cache': use_cache, **req} for req in requests]
+        start = time.perf_counter()
+        results = self._run(self.abatch(requests, return_exceptions))
+        seconds = time.perf_counter() - start
+        for req, result in zip(requests, results):
+            if isinstance(result, dict):
+                self._trace(req['model'], seconds, result)
+            else:
+                tracing.record_llm_call(provider_model(req['model']), seconds, error=str(result))
+        return results
+
+    @staticmethod
+    def _trace(requested_model: str, seconds: float, result: dict):
+        tracing.record_llm_call(provider_model(requested_model), seconds, model=result['model'], usage=result['usage'],
+                                retries=result['retries'], cached=result['cached'], fallback=result['fallback'])
+
+    def stream(self, messages: list, model: str, fallbacks=(), **params):
+        """Synchronous generator over astream, bridged through a queue."""
+        params.setdefault('use_cache', llm_cache.is_enabled())
+        out = queue.Queue()
+        outcome = {}
+
+        async def pump():
+            try:
+                async for delta in self.astream(messages, model, fallbacks, outcome=outcome, **params):
+                    out.put(delta)
+                out.put(_STREAM_DONE)
+            except Exception as e:
+                out.put(e)
+
+        start = time.perf_counter()
+        error = None
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                item = out.get()
+                if item is _STREAM_DONE:
+                    return
+                if isinstance(item, Exception):
+                    error = str(item)
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+            tracing.record_llm_call(provider_model(model), time.perf_counter() - start, model=outcome.get('model'),
+                                    cached=outcome.get('cached', False), fallback=outcome.get('fallback', False),
+                                    streamed=True, error=error)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        if self.cache is not None:
+            stats['cache'] = self.cache.stats()
+        return stats
+
+    def close(self):
+        if self._client is not None:
+            self._run(self._client.aclose())
+        self._run(self._loop.shutdown_asyncgens())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+# ─────────────────────────────────────────────
+# LANGCHAIN ADAPTER
+# ─────────────────────────────────────────────
+
+_ROLES = {'system': 'system', 'human': 'user', 'ai': 'assistant', 'tool': 'tool', 'function': 'function'}
+
+
+def to_openai_messages(messages) -> list:
+    converted = []
+    for message in messages:
+        role = getattr(message, 'role', None) if message.type == 'chat' else _ROLES.get(message.type, 'user')
+        converted.append({'role': role or 'user', 'content': message.content})
+    return converted
+
+
+class GatewayChatModel(BaseChatModel):
+    """
+    LangChain chat model backed by an LLMGateway (drop-in for ChatLiteLLM).
+    `fallbacks` are handed to the gateway, which tries them in order.
+    `use_cache=False` keeps this model's calls out of the response cache
+    (uncached() gives an agent or task its own such copy); otherwise the
+    cache is used unless llm_cache.disabled() is in effect.
+    """
+
+    gateway: Any
+    model: str
+    fallbacks: Tuple[str, ...] = ()
+    temperature: float = 0.3
+    max_tokens: Optional[int] = None
+    use_cache: bool = True
+
+    @property
+    def _llm_type(self) -> str:
+        return 'llm-gateway'
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {'model': self.model, 'fallbacks': self.fallbacks, 'temperature': self.temperature, 'max_tokens': self.max_tokens}
+
+    def uncached(self) -> 'GatewayChatModel':
+        """This model with use_cache=False."""
+        return GatewayChatModel(gateway=self.gateway, model=self.model, fallbacks=self.fallbacks,
+                                temperature=self.temperature, max_tokens=self.max_tokens, use_cache=False)
+
+    def _params(self, stop) -> dict:
+        # Read per call, in the caller's context, so llm_cache.disabled() applies
+        return {'temperature': self.temperature, 'max_tokens': self.max_tokens, 'stop': stop,
+                'use_cache': self.use_cache and llm_cache.is_enabled()}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result = self.gateway.complete(to_openai_messages(messages), model=self.model, fallbacks=self.fallbacks,
+                                       **self._params(stop))
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=result['content']))],
+            llm_output={'token_usage': result['usage'], 'model_name': result['model'], 'cached': result['cached']},
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        future = asyncio.run_coroutine_threadsafe(
+            self.gateway.acomplete(to_openai_messages(messages), model=self.model, fallbacks=self.fallbacks,
+                                   **self._params(stop)),
+            self.gateway._loop
+        )
+        result = await asyncio.wrap_future(future)
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=result['content']))],
+            llm_output={'token_usage': result['usage'], 'model_name': result['model'], 'cached': result['cached']},
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for delta in self.gateway.stream(to_openai_messages(messages), model=self.model, fallbacks=self.fallbacks,
+                                         **self._params(stop)):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=delta))
+            if run_manager:
+                run_manager.on_llm_new_token(delta, chunk=chunk)
+            yield chunk
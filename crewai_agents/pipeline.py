@@ -0,0 +1,72 @@
+"""
+Tiny DAG executor for request pipelines.
+
+The agentic endpoints mix slow, I/O-bound LLM calls with CPU-bound chart
+building that often does not depend on them (the /query result chart only
+needs the result rows, not the narrative). A Pipeline runs each step as
+soon as the steps it depends on have finished, on a shared thread pool, so
+chart work overlaps outstanding LLM calls instead of queuing behind them.
+
+    dag = Pipeline(executor)
+    dag.add('plan', plan_charts, df)
+    dag.add('charts', lambda plan: render_charts(df, plan), after=['plan'])
+    dag.add('insights', lambda plan: describe(plan), after=['plan'])
+    results = dag.run()          # {'plan': ..., 'charts': ..., 'insights': ...}
+
+Dependency results are passed to a step as keyword arguments named after
+the dependencies. Steps run in a copy of the caller's context, so
+contextvars such as the current job (jobs.report_progress) carry over.
+"""
+
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+class Pipeline:
+    def __init__(self, executor):
+        self.executor = executor
+        self._steps = {}
+
+    def add(self, name: str, fn, *args, after=(), **kwargs):
+        if name in self._steps:
+            raise ValueError(f'Duplicate pipeline step: {name}')
+        missing = [dep for dep in after if dep not in self._steps]
+        if missing:
+            raise ValueError(f'Step {name} depends on unknown steps: {missing}')
+        self._steps[name] = (fn, args, kwargs, tuple(after))
+        return self
+
+    def _submit(self, name: str, results: dict):
+        fn, args, kwargs, after = self._steps[name]
+        dep_results = {dep: results[dep] for dep in after}
+        ctx = contextvars.copy_context()
+        return self.executor.submit(ctx.run, fn, *args, **kwargs, **dep_results)
+
+    def run(self) -> dict:
+        """
+        Executes every step and returns {name: result}. If a step raises,
+        no further steps are started, running ones are awaited, and the
+        first error is re-raised.
+        """
+        results = {}
+        pending = dict(self._steps)
+        running = {}
+        error = None
+        while pending or running:
+            if error is None:
+                for name in [n for n, step in pending.items() if all(dep in results for dep in step[3])]:
+                    running[self._submit(name, results)] = name
+                    del pending[name]
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    if error is None:
+                        error = e
+        if error is not None:
+            raise error
+        return results
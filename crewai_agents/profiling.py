@@ -0,0 +1,335 @@
+"""
+Dataset profiling engine.
+
+build_rich_profile() produces the statistical profile shared by every agent.
+Per-column statistics for the numeric block (missing counts, moments,
+quantiles, min/max, IQR outliers, skew/kurtosis) are computed in batched
+NumPy passes over one float64 matrix instead of a Python loop per column,
+and describe() is assembled from those same arrays rather than recomputed.
+
+StreamingProfiler builds the same profile schema chunk by chunk from
+mergeable sketches (see sketches.py) for uploads too large to materialise.
+"""
+
+import numpy as np
+import pandas as pd
+
+from sketches import (
+    CoMomentSketch, DuplicateSampler, HyperLogLog, KLLSketch, MisraGries, MomentSketch, hash_values
+)
+
+QUANTILES = (0.25, 0.5, 0.75)
+DESCRIBE_KEYS = ('count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max')
+
+
+def numeric_matrix(df: pd.DataFrame, cols: list) -> np.ndarray:
+    """Stacks numeric columns into an (n_rows, n_cols) float64 matrix with NaN for nulls."""
+    if not cols:
+        return np.empty((len(df), 0))
+    arrays = []
+    for col in cols:
+        series = df[col]
+        if pd.api.types.is_timedelta64_dtype(series):
+            series = series.dt.total_seconds()
+        arrays.append(series.to_numpy(dtype='float64', na_value=np.nan))
+    return np.column_stack(arrays)
+
+
+def _lerp(a, b, t):
+    # Same formulation as numpy's linear quantile method, so results match
+    # Series.quantile bit-for-bit.
+    diff = b - a
+    return np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+
+
+def column_quantiles(sorted_block: np.ndarray, counts: np.ndarray, qs=QUANTILES) -> np.ndarray:
+    """
+    Linear-interpolated quantiles for every column of a NaN-last sorted
+    matrix. Returns shape (len(qs), n_cols); all-NaN columns yield NaN.
+    """
+    n_cols = sorted_block.shape[1]
+    out = np.full((len(qs), n_cols), np.nan)
+    valid = counts > 0
+    if not valid.any() or sorted_block.shape[0] == 0:
+        return out
+    col_idx = np.nonzero(valid)[0]
+    n = counts[valid]
+    for i, q in enumerate(qs):
+        pos = (n - 1) * q
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, n - 1)
+        out[i, valid] = _lerp(sorted_block[lo, col_idx], sorted_block[hi, col_idx], pos - lo)
+    return out
+
+
+def column_moments(block: np.ndarray, counts: np.ndarray) -> dict:
+    """
+    Mean, sample std and biased skewness/kurtosis (scipy.stats defaults)
+    per column. Near-zero variance yields NaN skew/kurtosis as in scipy.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        safe_n = np.where(counts > 0, counts, np.nan)
+        mean = np.nansum(block, axis=0) / safe_n
+        dev = block - mean
+        dev = np.where(np.isnan(dev), 0.0, dev)
+        dev2 = dev * dev
+        m2 = dev2.sum(axis=0) / safe_n
+        m3 = (dev2 * dev).sum(axis=0) / safe_n
+        m4 = (dev2 * dev2).sum(axis=0) / safe_n
+        std = np.sqrt(m2 * safe_n / np.where(counts > 1, counts - 1, np.nan))
+
+        degenerate = m2 <= (np.finfo(np.float64).resolution * mean) ** 2
+        skew = np.where(degenerate, np.nan, m3 / m2 ** 1.5)
+        kurt = np.where(degenerate, np.nan, m4 / m2 ** 2 - 3.0)
+    return {'mean': mean, 'std': std, 'skewness': skew, 'kurtosis': kurt}
+
+
+def _round(value, digits=4):
+    return round(float(value), digits)
+
+
+def numeric_column_stats(df: pd.DataFrame, numeric_cols: list, total_rows: int) -> dict:
+    """
+    Computes describe(), IQR outlier counts and skew/kurtosis for every
+    numeric column from one sorted matrix.
+    """
+    block = numeric_matrix(df, numeric_cols)
+    counts = (~np.isnan(block)).sum(axis=0)
+    sorted_block = np.sort(block, axis=0)
+    q1, q2, q3 = column_quantiles(sorted_block, counts)
+    moments = column_moments(block, counts)
+
+    col_min = np.full(len(numeric_cols), np.nan)
+    col_max = np.full(len(numeric_cols), np.nan)
+    valid = counts > 0
+    if valid.any():
+        col_min[valid] = sorted_block[0, valid]
+        col_max[valid] = sorted_block[counts[valid] - 1, np.nonzero(valid)[0]]
+
+    iqr = q3 - q1
+    with np.errstate(invalid='ignore'):
+        outside = (block < q1 - 1.5 * iqr) | (block > q3 + 1.5 * iqr)
+    outlier_counts = outside.sum(axis=0)
+
+    numeric_summary, outlier_flags, distribution_stats = {}, {}, {}
+    for i, col in enumerate(numeric_cols):
+        values = (counts[i], moments['mean'][i], moments['std'][i], col_min[i], q1[i], q2[i], q3[i], col_max[i])
+        numeric_summary[col] = {key: _round(v) for key, v in zip(DESCRIBE_KEYS, values)}
+
+        outlier_count = int(outlier_counts[i])
+        outlier_flags[col] = {'count': outlier_count, 'percent': round(outlier_count / total_rows * 100, 2)}
+
+        if counts[i] > 3:
+            distribution_stats[col] = {
+                'skewness': _round(moments['skewness'][i]),
+                'kurtosis': _round(moments['kurtosis'][i])
+            }
+
+    return {
+        'block': block,
+        'numeric_summary': numeric_summary,
+        'outlier_analysis': outlier_flags,
+        'distribution_stats': distribution_stats,
+    }
+
+
+def pairwise_corr(block: np.ndarray) -> np.ndarray:
+    """
+    Pearson correlation over pairwise-complete observations (what
+    DataFrame.corr() does) using masked matrix products instead of a
+    per-pair loop.
+    """
+    if not np.isnan(block).any():
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.corrcoef(block, rowvar=False)
+    with np.errstate(invalid='ignore'):
+        sketch = CoMomentSketch(np.nanmean(block, axis=0))
+    sketch.update(block)
+    return sketch.corr()
+
+
+def top_correlations_from_matrix(corr: np.ndarray, numeric_cols: list, threshold=0.5, limit=10) -> list:
+    i_idx, j_idx = np.triu_indices(len(numeric_cols), k=1)
+    vals = corr[i_idx, j_idx]
+    with np.errstate(invalid='ignore'):
+        keep = np.abs(vals) > threshold
+    pairs = [
+        {'col1': numeric_cols[i], 'col2': numeric_cols[j], 'correlation': _round(v)}
+        for i, j, v in zip(i_idx[keep], j_idx[keep], vals[keep])
+    ]
+    pairs.sort(key=lambda x: abs(x['correlation']), reverse=True)
+    return pairs[:limit]
+
+
+def build_rich_profile(df: pd.DataFrame) -> dict:
+    """
+    Builds a comprehensive statistical profile used by all agents.
+    This is the shared memory/context that powers all agentic tasks.
+    """
+    numeric_cols = df.select_dtypes(include='number').columns.tolist()
+    categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
+    datetime_cols = df.select_dtypes(include='datetime').columns.tolist()
+
+    missing = df.isnull().sum()
+    total_rows = max(len(df), 1)
+
+    numeric = numeric_column_stats(df, numeric_cols, total_rows)
+
+    # Top correlations
+    top_correlations = []
+    if len(numeric_cols) > 1:
+        top_correlations = top_correlations_from_matrix(pairwise_corr(numeric['block']), numeric_cols)
+
+    # Categorical value distributions
+    cat_summaries = {}
+    for col in categorical_cols[:5]:  # limit for token budget
+        vc = df[col].value_counts()
+        cat_summaries[col] = {
+            'unique_count': int(len(vc)),
+            'top_5': vc.head(5).to_dict()
+        }
+
+    # Duplicate detection
+    dup_count = int(df.duplicated().sum())
+
+    return {
+        'shape': {'rows': int(df.shape[0]), 'columns': int(df.shape[1])},
+        'columns': df.columns.tolist(),
+        'dtypes': {k: str(v) for k, v in df.dtypes.items()},
+        'numeric_columns': numeric_cols,
+        'categorical_columns': categorical_cols,
+        'datetime_columns': datetime_cols,
+        'missing': {
+            col: {'count': int(missing[col]), 'percent': round(float(missing[col] / total_rows * 100), 2)}
+            for col in df.columns
+        },
+        'numeric_summary': numeric['numeric_summary'],
+        'outlier_analysis': numeric['outlier_analysis'],
+        'distribution_stats': numeric['distribution_stats'],
+        'top_correlations': top_correlations,
+        'categorical_summaries': cat_summaries,
+        'duplicate_rows': {'count': dup_count, 'percent': round(dup_count / total_rows * 100, 2)},
+        'sample_rows': df.head(5).replace({pd.NA: None}).where(pd.notnull(df.head(5)), None).to_dict('records'),
+    }
+
+
+# ─────────────────────────────────────────────
+# STREAMING (CHUNKED) PROFILE
+# ─────────────────────────────────────────────
+
+class StreamingProfiler:
+    """
+    Bounded-memory profiler fed one DataFrame chunk at a time. Column roles
+    are fixed by the first chunk; later chunks are coerced to them. Produces
+    the build_rich_profile schema from sketches: moments (Chan/Welford), KLL
+    quantiles with outlier counts from KLL ranks, HyperLogLog distinct
+    counts, Misra-Gries top values and sampled duplicate-row estimates.
+    """
+
+    def __init__(self, kll_k: int = 2048, top_k: int = 1024, duplicate_capacity: int = 200_000):
+        self.kll_k = kll_k
+        self.top_k = top_k
+        self.rows = 0
+        self.columns = None
+        self.duplicates = DuplicateSampler(duplicate_capacity)
+
+    def _init_columns(self, chunk: pd.DataFrame):
+        self.columns = chunk.columns.tolist()
+        self.dtypes = {k: str(v) for k, v in chunk.dtypes.items()}
+        self.numeric_cols = chunk.select_dtypes(include='number').columns.tolist()
+        self.categorical_cols = chunk.select_dtypes(include=['object', 'category']).columns.tolist()
+        self.datetime_cols = chunk.select_dtypes(include='datetime').columns.tolist()
+        self.missing = pd.Series(0, index=self.columns, dtype='int64')
+        self.moments = MomentSketch(len(self.numeric_cols))
+        self.quantiles = [KLLSketch(self.kll_k, seed=i) for i in range(len(self.numeric_cols))]
+        self.correlation = CoMomentSketch(
+            np.nanmean(numeric_matrix(chunk, self.numeric_cols), axis=0) if len(chunk) else np.zeros(len(self.numeric_cols))
+        )
+        self.distinct = {col: HyperLogLog() for col in self.categorical_cols[:5]}
+        self.top_values = {col: MisraGries(self.top_k) for col in self.categorical_cols[:5]}
+        head = chunk.head(5)
+        self.sample_rows = head.replace({pd.NA: None}).where(pd.notnull(head), None).to_dict('records')
+
+    def update(self, chunk: pd.DataFrame):
+        if self.columns is None:
+            self._init_columns(chunk)
+        chunk = chunk.reindex(columns=self.columns)
+        for col in self.numeric_cols:
+            if not pd.api.types.is_numeric_dtype(chunk[col]):
+                chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+
+        self.rows += len(chunk)
+        self.missing = self.missing.add(chunk.isnull().sum(), fill_value=0).astype('int64')
+
+        block = numeric_matrix(chunk, self.numeric_cols)
+        self.moments.update(block)
+        for i, sketch in enumerate(self.quantiles):
+            sketch.update(block[:, i])
+        if len(self.numeric_cols) > 1:
+            self.correlation.update(block)
+
+        for col in self.distinct:
+            values = chunk[col].dropna()
+            self.distinct[col].update_hashes(hash_values(values))
+            self.top_values[col].update(values)
+
+        self.duplicates.update(chunk)
+
+    def result(self) -> dict:
+        if self.columns is None:
+            return build_rich_profile(pd.DataFrame())
+
+        total_rows = max(self.rows, 1)
+        moments = self.moments.finalize()
+        counts = self.moments.n
+
+        numeric_summary, outlier_flags, distribution_stats = {}, {}, {}
+        for i, col in enumerate(self.numeric_cols):
+            sketch = self.quantiles[i]
+            q1, q2, q3 = sketch.quantiles(QUANTILES)
+            values = (counts[i], moments['mean'][i], moments['std'][i],
+                      self.moments.min[i], q1, q2, q3, self.moments.max[i])
+            numeric_summary[col] = {key: _round(v) for key, v in zip(DESCRIBE_KEYS, values)}
+
+            iqr = q3 - q1
+            below = sketch.rank(q1 - 1.5 * iqr)
+            above = sketch.n - sketch.rank(q3 + 1.5 * iqr, inclusive=True)
+            outlier_count = int(round(below + above))
+            outlier_flags[col] = {'count': outlier_count, 'percent': round(outlier_count / total_rows * 100, 2)}
+
+            if counts[i] > 3:
+                distribution_stats[col] = {
+                    'skewness': _round(moments['skewness'][i]),
+                    'kurtosis': _round(moments['kurtosis'][i])
+                }
+
+        top_correlations = []
+        if len(self.numeric_cols) > 1:
+            top_correlations = top_correlations_from_matrix(self.correlation.corr(), self.numeric_cols)
+
+        cat_summaries = {
+            col: {'unique_count': self.distinct[col].count(), 'top_5': self.top_values[col].top(5)}
+            for col in self.distinct
+        }
+
+        dup_count = min(self.duplicates.duplicate_count(), self.rows)
+
+        return {
+            'shape': {'rows': int(self.rows), 'columns': len(self.columns)},
+            'columns': self.columns,
+            'dtypes': self.dtypes,
+            'numeric_columns': self.numeric_cols,
+            'categorical_columns': self.categorical_cols,
+            'datetime_columns': self.datetime_cols,
+            'missing': {
+                col: {'count': int(self.missing[col]), 'percent': round(float(self.missing[col] / total_rows * 100), 2)}
+                for col in self.columns
+            },
+            'numeric_summary': numeric_summary,
+            'outlier_analysis': outlier_flags,
+            'distribution_stats': distribution_stats,
+            'top_correlations': top_correlations,
+            'categorical_summaries': cat_summaries,
+            'duplicate_rows': {'count': dup_count, 'percent': round(dup_count / total_rows * 100, 2)},
+            'sample_rows': self.sample_rows,
+        }
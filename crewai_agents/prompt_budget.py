@@ -0,0 +1,254 @@
+"""
+Token-aware profile compaction for agent prompts.
+
+Every agent used to receive json.dumps(build_rich_profile(...)): a missing
+entry for every column, a describe() dict per numeric column, distribution
+stats and sample rows. On wide datasets that is tens of thousands of tokens
+per prompt — slow to first token and expensive — most of it irrelevant to
+the task at hand.
+
+compact_profile() re-packs the profile per column and fills a token budget
+in priority order: the most relevant columns first (columns named in the
+user's question, then columns with missing values, outliers, strong
+correlations or skew), cheap facts (name, dtype) before detailed ones
+(summary stats, top values, distribution shape), and correlations / sample
+rows trimmed to the columns that made it in. Which details an agent sees is
+set per agent: the SQL writer only needs names, types, value ranges and
+examples, not kurtosis.
+
+Token counts are estimates from a regex split that tracks BPE tokenizers
+closely on JSON (words, 3-digit number groups, punctuation); no tokenizer
+download is needed. Each compaction is recorded on the current request's
+report (see start_report) so endpoints can return per-agent token usage.
+"""
+
+import re
+import json
+import contextvars
+
+# Default profile token budget per agent (keys are the agent variable names in app.py)
+DEFAULT_BUDGETS = {
+    'data_profiler': 4000,
+    'query_interpreter': 1500,
+    'sql_craftsman': 800,
+    'viz_strategist': 1500,
+    'detective_agent': 4000,
+}
+
+# Per-column details each agent is given, in the order they are added
+ALL_DETAILS = ('summary', 'top_values', 'outliers', 'distribution')
+AGENT_DETAILS = {
+    'data_profiler': ALL_DETAILS,
+    'query_interpreter': ('summary', 'top_values'),
+    'sql_craftsman': ('range', 'top_values'),
+    'viz_strategist': ('summary', 'top_values', 'distribution'),
+    'detective_agent': ALL_DETAILS,
+}
+
+_TOKEN = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+_WORD = re.compile(r'[a-z0-9]+')
+_report = contextvars.ContextVar('prompt_budget_report', default=None)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(_TOKEN.findall(text))
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, default=str, separators=(',', ':'))
+
+
+def _cost(value) -> int:
+    return estimate_tokens(_dumps(value))
+
+
+def parse_budgets(spec: str) -> dict:
+    """'sql_craftsman=600,detective_agent=3000' → DEFAULT_BUDGETS with overrides."""
+    budgets = dict(DEFAULT_BUDGETS)
+    for part in (spec or '').split(','):
+        if '=' in part:
+            agent, tokens = part.split('=', 1)
+            budgets[agent.strip()] = int(tokens)
+    return budgets
+
+
+def _stem(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith('s') else word
+
+
+def query_columns(query: str, columns: list) -> dict:
+    """
+    Scores columns by how directly `query` mentions them: 3 for the full
+    name, 2 when every word of the name appears ('weekly sales' →
+    Weekly_Sales), 1 for a distinctive partial word ('sales' → Weekly_Sales,
+    but not 'metric' when fifty columns are metric_*). Unmentioned columns
+    are omitted.
+    """
+    text = (query or '').lower()
+    words = {_stem(w) for w in _WORD.findall(text) if len(w) > 2}
+    col_parts = {col: [_stem(w) for w in _WORD.findall(str(col).lower())] for col in columns}
+    frequency = {}
+    for parts in col_parts.values():
+        for part in set(parts):
+            frequency[part] = frequency.get(part, 0) + 1
+    scores = {}
+    for col, parts in col_parts.items():
+        if not parts:
+            continue
+        if re.search(rf'(?<![a-z0-9_]){re.escape(str(col).lower())}(?![a-z0-9_])', text):
+            scores[col] = 3
+        elif all(p in words for p in parts):
+            scores[col] = 2
+        elif any(p in words for p in parts if len(p) > 2 and frequency[p] <= 3):
+            scores[col] = 1
+    return scores
+
+
+def _interest(profile: dict, col) -> float:
+    """Data-driven relevance of a column when the task names no columns."""
+    score = profile.get('missing', {}).get(col, {}).get('percent', 0) / 10
+    score += profile.get('outlier_analysis', {}).get(col, {}).get('percent', 0) / 5
+    skew = profile.get('distribution_stats', {}).get(col, {}).get('skewness')
+    if isinstance(skew, (int, float)):
+        score += min(abs(skew), 5) / 5
+    for pair in profile.get('top_correlations', []):
+        if col in (pair.get('col1'), pair.get('col2')):
+            score += abs(pair.get('correlation') or 0)
+    return score
+
+
+def _column_details(profile: dict, col, detail: str):
+    if detail == 'summary':
+        return profile.get('numeric_summary', {}).get(col)
+    if detail == 'range':
+        summary = profile.get('numeric_summary', {}).get(col)
+        return {k: summary[k] for k in ('min', 'max') if k in summary} if summary else None
+    if detail == 'top_values':
+        cat = profile.get('categorical_summaries', {}).get(col)
+        return {'unique': cat.get('unique_count'), 'top': cat.get('top_5')} if cat else None
+    if detail == 'outliers':
+        outliers = profile.get('outlier_analysis', {}).get(col)
+        return outliers if outliers and outliers.get('count') else None
+    if detail == 'distribution':
+        return profile.get('distribution_stats', {}).get(col)
+    return None
+
+
+def compact_profile(profile: dict, budget: int, focus: dict = None, details=ALL_DETAILS,
+                    sample_rows: int = 3) -> tuple:
+    """
+    Returns (compact profile, stats). `focus` maps column → relevance (see
+    query_columns); focused columns are placed and detailed first. The
+    result keeps the profile's facts under a per-column layout:
+
+        {'shape', 'duplicate_rows', 'columns': {col: {'dtype', 'missing_pct', ...}},
+         'top_correlations', 'sample_rows', 'omitted_columns'}
+    """
+    focus = focus or {}
+    columns = profile.get('columns', [])
+    dtypes = profile.get('dtypes', {})
+    missing = profile.get('missing', {})
+    ranked = sorted(columns, key=lambda c: (-focus.get(c, 0), -_interest(profile, c)))
+
+    compact = {'shape': profile.get('shape')}
+    if profile.get('duplicate_rows', {}).get('count'):
+        compact['duplicate_rows'] = profile['duplicate_rows']
+    compact['columns'] = {}
+    used = _cost(compact)
+
+    def add_names(cols, limit):
+        nonlocal used
+        for col in cols:
+            entry = {'dtype': dtypes.get(col)}
+            pct = missing.get(col, {}).get('percent')
+            if pct:
+                entry['missing_pct'] = pct
+            cost = _cost({col: entry})
+            if used + cost > limit:
+                return
+            compact['columns'][col] = entry
+            used += cost
+
+    def add_details(cols):
+        nonlocal used
+        for col in cols:
+            for detail in details:
+                value = _column_details(profile, col, detail)
+                if not value or detail in compact['columns'][col]:
+                    continue
+                cost = _cost({detail: value})
+                if used + cost <= budget:
+                    compact['columns'][col][detail] = value
+                    used += cost
+
+    # 1. The columns the task is about, with their details.
+    focused = [c for c in ranked if focus.get(c)]
+    add_names(focused, budget)
+    add_details(list(compact['columns']))
+
+    # 2. Names and dtypes (plus missing % when non-zero) of the other columns by
+    #    rank, using at most half of what is left so details still fit.
+    others = [c for c in ranked if not focus.get(c)]
+    add_names(others, used + (budget - used) // 2)
+    kept = list(compact['columns'])
+    kept_set = set(kept)
+    if any(d in details for d in ('summary', 'distribution')):
+        correlations = []
+        for pair in profile.get('top_correlations', []):
+            if pair.get('col1') in kept_set and pair.get('col2') in kept_set:
+                cost = _cost(pair)
+                if used + cost > budget:
+                    break
+                correlations.append(pair)
+                used += cost
+        if correlations:
+            compact['top_correlations'] = correlations
+
+    # 3. Details for everything else, then example rows restricted to kept
+    #    columns, then any remaining names.
+    add_details([c for c in kept if not focus.get(c)])
+    rows = []
+    for row in profile.get('sample_rows', [])[:sample_rows]:
+        trimmed = {c: row.get(c) for c in kept}
+        cost = _cost(trimmed)
+        if used + cost > budget:
+            break
+        rows.append(trimmed)
+        used += cost
+    if rows:
+        compact['sample_rows'] = rows
+    add_names([c for c in others if c not in kept_set], budget)
+    kept = list(compact['columns'])
+
+    if len(kept) < len(columns):
+        compact['omitted_columns'] = len(columns) - len(kept)
+
+    stats = {
+        'budget': budget,
+        'tokens': _cost(compact),
+        'tokens_full': _cost(profile),
+        'columns_total': len(columns),
+        'columns_included': len(kept),
+        'columns_focused': [c for c in kept if focus.get(c)],
+    }
+    return compact, stats
+
+
+# ─────────────────────────────────────────────
+# PER-REQUEST REPORTING
+# ─────────────────────────────────────────────
+
+def start_report() -> dict:
+    """Begins a token report for the current request; compactions are added to it."""
+    report = {'agents': {}, 'tokens': 0, 'tokens_full': 0}
+    _report.set(report)
+    return report
+
+
+def record(agent: str, stats: dict):
+    report = _report.get()
+    if report is None:
+        return
+    report['agents'][agent] = stats
+    report['tokens'] = sum(s['tokens'] for s in report['agents'].values())
+    report['tokens_full'] = sum(s['tokens_full'] for s in report['agents'].values())
@@ -0,0 +1,169 @@
+"""
+Semantic NL → SQL cache.
+
+/query spends 10–30 s in LLM round-trips (interpret → SQL → narrate). The
+SQL only depends on the question and the dataset's schema, so answers are
+cached under a schema fingerprint (column names + dtypes) and the
+normalised question text. Rewordings are caught by an optional cosine
+match over hashed word / bigram features — no model download needed.
+Bag-of-words similarity cannot tell "stores with sales above 5" from
+"stores without sales below 5", so a reworded match must also agree
+exactly on the question's numbers, negations and comparison words.
+
+A hit returns the stored interpretation and SQL; the caller re-runs the SQL
+(milliseconds) and only reuses the stored narrative when the data version
+matches the one it was written for.
+"""
+
+import re
+import time
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+STOPWORDS = {
+    'a', 'an', 'the', 'of', 'in', 'on', 'for', 'to', 'by', 'with', 'and', 'is', 'are', 'was', 'were',
+    'me', 'show', 'give', 'list', 'find', 'what', 'which', 'please', 'can', 'you', 'i', 'want', 'tell',
+    'display', 'get', 'all', 'do', 'does', 'there', 'from', 'data', 'dataset',
+}
+# Words that flip or bound the answer; these must match exactly between reworded questions
+NEGATIONS = {'not', 'no', 'non', 'without', 'except', 'excluding', 'exclude', 'never', 'nor', 'neither'}
+COMPARISONS = {
+    'above', 'below', 'over', 'under', 'greater', 'less', 'more', 'fewer', 'higher', 'lower',
+    'larger', 'smaller', 'most', 'least', 'top', 'bottom', 'highest', 'lowest', 'max', 'min',
+    'maximum', 'minimum', 'first', 'last', 'earliest', 'latest', 'before', 'after', 'between',
+    'asc', 'ascending', 'desc', 'descending', '<', '>', '<=', '>=', '=', '!=',
+}
+_TOKEN = re.compile(r'[a-z_][a-z0-9_]*|\d+(?:\.\d+)?|[<>!]=|[<>=]')
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+
+
+def schema_fingerprint(schema: dict) -> str:
+    """Stable hash of a dataset's column names and dtypes (schema.json)."""
+    parts = [f"{c['name']}:{c['dtype']}" for c in schema['columns']]
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def normalize_query(text: str) -> str:
+    return ' '.join(_TOKEN.findall((text or '').lower().replace("n't", ' not')))
+
+
+def guard_tokens(normalized: str) -> tuple:
+    """The numbers, negations and comparison words of a question, in order."""
+    return tuple(t for t in normalized.split() if t in NEGATIONS or t in COMPARISONS or _NUMBER.fullmatch(t))
+
+
+def _features(normalized: str) -> list:
+    words = [w for w in normalized.split() if w not in STOPWORDS]
+    return words + [f'{a} {b}' for a, b in zip(words, words[1:])]
+
+
+def embed(normalized: str, n_features: int = 4096) -> np.ndarray:
+    """L2-normalised hashing-trick vector over content words and bigrams."""
+    vec = np.zeros(n_features, dtype=np.float32)
+    for feature in _features(normalized):
+        h = zlib.crc32(feature.encode('utf-8'))
+        vec[h % n_features] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class QueryCache:
+    """
+    Thread-safe TTL + LRU cache of answered /query requests. Entries are
+    grouped by schema fingerprint; a similarity lookup only compares against
+    entries of the same schema, and never matches two questions whose
+    numbers, negations or comparisons differ ("top 5" vs "top 10",
+    "with" vs "without", "above" vs "below").
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600,
+                 similarity_threshold: float = 0.92, n_features: int = 4096):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.n_features = n_features
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return now - entry['stored_at'] > self.ttl_seconds
+
+    def lookup(self, fingerprint: str, query: str):
+        """Returns (entry, match) with match 'exact' or 'similar', or (None, None)."""
+        normalized = normalize_query(query)
+        key = (fingerprint, normalized)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry, similarity=1.0), 'exact'
+
+            if self.similarity_threshold > 0:
+                vec = embed(normalized, self.n_features)
+                guards = guard_tokens(normalized)
+                best_key, best_score = None, self.similarity_threshold
+                for k, candidate in self._entries.items():
+                    if k[0] != fingerprint or self._expired(candidate, now) or candidate['guards'] != guards:
+                        continue
+                    score = float(vec @ candidate['vector'])
+                    if score >= best_score:
+                        best_key, best_score = k, score
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.hits += 1
+                    self.similar_hits += 1
+                    return dict(self._entries[best_key], similarity=round(best_score, 4)), 'similar'
+
+            self.misses += 1
+            return None, None
+
+    def store(self, fingerprint: str, query: str, interpretation: dict, sql: str,
+              narrative: str, data_version: str):
+        normalized = normalize_query(query)
+        entry = {
+            'query': query,
+            'interpretation': interpretation,
+            'sql': sql,
+            'narrative': narrative,
+            'data_version': data_version,
+            'stored_at': time.time(),
+            'guards': guard_tokens(normalized),
+            'vector': embed(normalized, self.n_features),
+        }
+        with self._lock:
+            self._entries[(fingerprint, normalized)] = entry
+            self._entries.move_to_end((fingerprint, normalized))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'similar_hits': self.similar_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,479 @@
+"""
+Query execution over stored datasets.
+
+Two interchangeable backends expose the same prepare/ensure/execute/release
+interface and a `dialect` name for the SQL prompt:
+
+- sqlite: each dataset gets a read-only, indexed SQLite file (query.sqlite)
+  built once from the Arrow store, in the background right after upload,
+  and opened through a small per-dataset pool of read-only connections.
+  An IndexAdvisor watches executed SQL and adds secondary indexes on
+  columns that keep showing up in WHERE / GROUP BY / JOIN clauses.
+- duckdb: a vectorised columnar engine that queries the memory-mapped
+  Arrow file in place (no build step), suited to GROUP BY/aggregate
+  workloads over millions of rows.
+"""
+
+import os
+import re
+import json
+import queue
+import sqlite3
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow.compute as pc
+
+import dataset_store
+import tracing
+
+QUERY_DB_FILE = 'query.sqlite'
+INDEX_USAGE_FILE = 'index_usage.json'
+TABLE_NAME = 'data_table'
+AUTO_INDEX_PREFIX = 'idx_auto_'
+
+
+def query_db_path(dataset_path: str) -> str:
+    return os.path.join(dataset_path, QUERY_DB_FILE)
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def index_name(col: str, auto: bool = False) -> str:
+    return f"{AUTO_INDEX_PREFIX if auto else 'idx_'}{col}"
+
+
+def create_index(conn, col: str, auto: bool = False):
+    conn.execute(
+        f'CREATE INDEX IF NOT EXISTS {quote_identifier(index_name(col, auto))} '
+        f'ON {TABLE_NAME} ({quote_identifier(col)})'
+    )
+
+
+def _index_candidates(table, max_indexes: int) -> list:
+    """
+    Columns worth a B-tree index up front: dates, plus low-cardinality
+    categorical/integer columns that queries typically filter or group on.
+    """
+    rows = max(table.num_rows, 1)
+    scored = []
+    for field in table.schema:
+        column = table.column(field.name)
+        if str(field.type).startswith('timestamp') or str(field.type).startswith('date'):
+            scored.append((0, field.name))
+            continue
+        if not (str(field.type) in ('string', 'large_string') or str(field.type).startswith('int')
+                or str(field.type).startswith('dictionary')):
+            continue
+        distinct = pc.count_distinct(column).as_py()
+        if 1 < distinct <= max(rows * 0.05, 2):
+            scored.append((distinct, field.name))
+    scored.sort()
+    return [name for _, name in scored[:max_indexes]]
+
+
+@tracing.traced('query_db.build')
+def build_query_db(dataset_path: str, batch_rows: int = 100_000, max_indexes: int = 8) -> str:
+    """
+    Materialises the dataset into an on-disk SQLite file in record-batch
+    sized pieces (bounded memory), adds indexes, then atomically renames it
+    into place. Values are written exactly as DataFrame.to_sql would.
+    """
+    target = query_db_path(dataset_path)
+    tmp_path = f"{target}.tmp"
+    if os.path.exists(tmp_path):
+        os.unlink(tmp_path)
+
+    table = dataset_store.open_table(dataset_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute('PRAGMA journal_mode=OFF')
+        conn.execute('PRAGMA synchronous=OFF')
+        batches = table.to_batches(max_chunksize=batch_rows) or [table.schema.empty_table()]
+        for batch in batches:
+            batch.to_pandas().to_sql(TABLE_NAME, conn, index=False, if_exists='append')
+        for col in _index_candidates(table, max_indexes):
+            create_index(conn, col)
+        conn.execute('ANALYZE')
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, target)
+    return target
+
+
+# ─────────────────────────────────────────────
+# INDEX ADVISOR
+# ─────────────────────────────────────────────
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_CLAUSE_KEYWORD = re.compile(
+    r'\b(select|from|where|group\s+by|having|order\s+by|limit|join|on|using|union|window)\b',
+    re.IGNORECASE
+)
+_IDENTIFIER = re.compile(r'"((?:[^"]|"")+)"|\[([^\]]+)\]|`([^`]+)`|\b([A-Za-z_][A-Za-z0-9_]*)\b')
+ADVISED_CLAUSES = {'where': 'where', 'group by': 'group_by', 'on': 'join', 'using': 'join'}
+
+
+def referenced_columns(sql: str, columns: list) -> dict:
+    """
+    Maps each advised clause (where / group_by / join) to the dataset
+    columns it references. String literals are stripped first so values
+    such as WHERE Type = 'Store' are not mistaken for columns.
+    """
+    lookup = {str(c).lower(): c for c in columns}
+    text = _STRING_LITERAL.sub("''", sql or '')
+    found = {clause: set() for clause in set(ADVISED_CLAUSES.values())}
+    matches = list(_CLAUSE_KEYWORD.finditer(text))
+    for i, match in enumerate(matches):
+        clause = ADVISED_CLAUSES.get(re.sub(r'\s+', ' ', match.group(1).lower()))
+        if clause is None:
+            continue
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        for ident in _IDENTIFIER.finditer(text[match.end():end]):
+            name = next(g for g in ident.groups() if g is not None).replace('""', '"')
+            col = lookup.get(name.lower())
+            if col is not None:
+                found[clause].add(col)
+    return found
+
+
+class IndexAdvisor:
+    """
+    Counts, per dataset, how often each column appears in WHERE, GROUP BY
+    or JOIN clauses of executed SQL (persisted in index_usage.json) and
+    builds a secondary index in the background once a column's count
+    reaches `threshold`.
+
+    The query pool only holds read-only connections, so index builds go
+    through one dedicated writer connection per dataset, opened on first
+    use and closed by forget(). Pooled readers pick a new index up on their
+    next statement. The dataset's index list is read once and then kept in
+    step with the builds, instead of being queried on every scheduling pass.
+    """
+
+    def __init__(self, executor, threshold: int = 3, max_auto_indexes: int = 8):
+        self.executor = executor
+        self.threshold = threshold
+        self.max_auto_indexes = max_auto_indexes
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._usage = {}
+        self._pending = {}
+        self._writers = {}
+        self._indexes = {}
+
+    def _usage_path(self, dataset_path: str) -> str:
+        return os.path.join(dataset_path, INDEX_USAGE_FILE)
+
+    def _load_usage(self, dataset_path: str) -> Counter:
+        usage = self._usage.get(dataset_path)
+        if usage is None:
+            try:
+                with open(self._usage_path(dataset_path), 'r', encoding='utf-8') as f:
+                    usage = Counter(json.load(f))
+            except (OSError, ValueError):
+                usage = Counter()
+            self._usage[dataset_path] = usage
+        return usage
+
+    def record(self, dataset_path: str, sql: str):
+        columns = [c['name'] for c in dataset_store.read_schema(dataset_path)['columns']]
+        refs = referenced_columns(sql, columns)
+        used = set().union(*refs.values())
+        if not used:
+            return
+        with self._lock:
+            usage = self._load_usage(dataset_path)
+            usage.update(used)
+            tmp_path = f"{self._usage_path(dataset_path)}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(dict(usage), f)
+            os.replace(tmp_path, self._usage_path(dataset_path))
+            hot = [c for c in used if usage[c] >= self.threshold]
+        if hot:
+            self._schedule(dataset_path, hot)
+
+    def _writer(self, dataset_path: str) -> sqlite3.Connection:
+        with self._lock:
+            conn = self._writers.get(dataset_path)
+            if conn is None:
+                conn = sqlite3.connect(query_db_path(dataset_path), timeout=30, check_same_thread=False)
+                self._writers[dataset_path] = conn
+            return conn
+
+    def _read_indexes(self, dataset_path: str) -> list:
+        conn = self._writer(dataset_path)
+        with self._write_lock:
+            indexes = []
+            for row in conn.execute(f'PRAGMA index_list({TABLE_NAME})').fetchall():
+                name = row[1]
+                cols = [r[2] for r in conn.execute(f'PRAGMA index_info({quote_identifier(name)})').fetchall()]
+                indexes.append({
+                    'name': name,
+                    'columns': cols,
+                    'origin': 'advisor' if name.startswith(AUTO_INDEX_PREFIX) else 'upload',
+                })
+            return indexes
+
+    def existing_indexes(self, dataset_path: str) -> list:
+        with self._lock:
+            indexes = self._indexes.get(dataset_path)
+        if indexes is None:
+            indexes = self._read_indexes(dataset_path)
+            with self._lock:
+                indexes = self._indexes.setdefault(dataset_path, indexes)
+        with self._lock:
+            return [dict(i) for i in indexes]
+
+    def _schedule(self, dataset_path: str, columns: list):
+        existing = self.existing_indexes(dataset_path)
+        indexed = {tuple(i['columns']) for i in existing}
+        auto_count = sum(1 for i in existing if i['origin'] == 'advisor')
+        with self._lock:
+            for col in columns:
+                key = (dataset_path, col)
+                if (col,) in indexed or key in self._pending:
+                    continue
+                if auto_count >= self.max_auto_indexes:
+                    break
+                auto_count += 1
+                self._pending[key] = self.executor.submit(self._build, dataset_path, col)
+
+    def _build(self, dataset_path: str, col: str):
+        try:
+            conn = self._writer(dataset_path)
+            with self._write_lock:
+                create_index(conn, col, auto=True)
+                conn.execute('ANALYZE')
+                conn.commit()
+            with self._lock:
+                indexes = self._indexes.get(dataset_path)
+                if indexes is not None and not any(i['columns'] == [col] for i in indexes):
+                    indexes.append({'name': index_name(col, auto=True), 'columns': [col], 'origin': 'advisor'})
+        finally:
+            with self._lock:
+                self._pending.pop((dataset_path, col), None)
+
+    def report(self, dataset_path: str) -> dict:
+        with self._lock:
+            usage = dict(self._load_usage(dataset_path))
+            pending = sorted(col for path, col in self._pending if path == dataset_path)
+        indexes = self.existing_indexes(dataset_path) if os.path.exists(query_db_path(dataset_path)) else []
+        return {
+            'indexes': indexes,
+            'pending': pending,
+            'column_usage': dict(sorted(usage.items(), key=lambda kv: -kv[1])),
+            'threshold': self.threshold,
+        }
+
+    def forget(self, dataset_path: str):
+        with self._lock:
+            self._usage.pop(dataset_path, None)
+            pending = [f for (path, _), f in self._pending.items() if path == dataset_path]
+        for future in pending:
+            try:
+                future.result()
+            except Exception:
+                pass
+        with self._lock:
+            self._indexes.pop(dataset_path, None)
+            writer = self._writers.pop(dataset_path, None)
+        if writer is not None:
+            with self._write_lock:
+                writer.close()
+
+
+class ConnectionPool:
+    """Fixed-size pool of read-only SQLite connections to one database file."""
+
+    def __init__(self, db_path: str, size: int = 4):
+        self.db_path = db_path
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self.size = size
+        self._all = []
+
+    def _connect(self):
+        uri = pathlib.Path(self.db_path).resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute('PRAGMA query_only=ON')
+        conn.execute('PRAGMA mmap_size=268435456')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                conn = self._connect()
+                with self._lock:
+                    self._all.append(conn)
+            else:
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._all = []
+            self._created = 0
+        self._idle = queue.LifoQueue()
+
+
+class SQLiteQueryEngine:
+    """
+    Owns per-dataset query databases: background builds after upload and
+    pooled read-only execution for /query.
+    """
+
+    dialect = 'SQLite'
+
+    def __init__(self, pool_size: int = 4, build_workers: int = 1, index_threshold: int = 3):
+        self.pool_size = pool_size
+        self._builder = ThreadPoolExecutor(max_workers=build_workers, thread_name_prefix='query-db')
+        self.advisor = IndexAdvisor(self._builder, threshold=index_threshold)
+        self._builds = {}
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, dataset_path: str):
+        """Schedules the query database build (no-op if built or in flight)."""
+        with self._lock:
+            future = self._builds.get(dataset_path)
+            if future is None or (future.done() and future.exception() is not None):
+                if os.path.exists(query_db_path(dataset_path)):
+                    return None
+                future = self._builder.submit(build_query_db, dataset_path)
+                self._builds[dataset_path] = future
+            return future
+
+    def ensure(self, dataset_path: str) -> str:
+        """Blocks until the dataset's query database exists, building it if needed."""
+        db_path = query_db_path(dataset_path)
+        if os.path.exists(db_path):
+            return db_path
+        future = self.prepare(dataset_path)
+        if future is not None:
+            future.result()
+        return db_path
+
+    def _pool(self, dataset_path: str) -> ConnectionPool:
+        with self._lock:
+            pool = self._pools.get(dataset_path)
+            if pool is None:
+                pool = ConnectionPool(query_db_path(dataset_path), self.pool_size)
+                self._pools[dataset_path] = pool
+            return pool
+
+    @tracing.traced('sql.execute')
+    def execute(self, dataset_path: str, sql: str) -> pd.DataFrame:
+        self.ensure(dataset_path)
+        with self._pool(dataset_path).connection() as conn:
+            result = pd.read_sql_query(sql, conn)
+        try:
+            self.advisor.record(dataset_path, sql)
+        except (OSError, sqlite3.Error):
+            pass  # advice is best-effort; never fail a query that already succeeded
+        return result
+
+    def index_report(self, dataset_path: str) -> dict:
+        return self.advisor.report(dataset_path)
+
+    def release(self, dataset_path: str):
+        """Closes pooled connections and forgets build state (before deletion)."""
+        with self._lock:
+            pool = self._pools.pop(dataset_path, None)
+            future = self._builds.pop(dataset_path, None)
+        if future is not None:
+            try:
+                future.result()
+            except Exception:
+                pass
+        self.advisor.forget(dataset_path)
+        if pool is not None:
+            pool.close()
+
+
+class DuckDBQueryEngine:
+    """
+    Runs queries with DuckDB directly over the dataset's memory-mapped Arrow
+    table. Each call uses its own cursor with the table registered as
+    data_table; external file access is disabled so generated SQL cannot
+    read anything but the dataset.
+    """
+
+    dialect = 'DuckDB'
+
+    def __init__(self, threads: int = None):
+        import duckdb
+
+        config = {'enable_external_access': False}
+        if threads:
+            config['threads'] = threads
+        self._conn = duckdb.connect(config=config)
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, dataset_path: str):
+        return None
+
+    def ensure(self, dataset_path: str):
+        with self._lock:
+            table = self._tables.get(dataset_path)
+            if table is None:
+                table = dataset_store.open_table(dataset_path)
+                self._tables[dataset_path] = table
+            return table
+
+    @tracing.traced('sql.execute')
+    def execute(self, dataset_path: str, sql: str) -> pd.DataFrame:
+        table = self.ensure(dataset_path)
+        cursor = self._conn.cursor()
+        try:
+            cursor.register(TABLE_NAME, table)
+            return cursor.execute(sql).df()
+        finally:
+            cursor.close()
+
+    def index_report(self, dataset_path: str) -> dict:
+        # DuckDB scans the columnar file directly; there are no secondary indexes to advise.
+        return {'indexes': [], 'pending': [], 'column_usage': {}, 'threshold': None}
+
+    def release(self, dataset_path: str):
+        with self._lock:
+            self._tables.pop(dataset_path, None)
+
+
+ENGINES = {
+    'sqlite': SQLiteQueryEngine,
+    'duckdb': DuckDBQueryEngine,
+}
+
+
+def create_engine(backend: str, **kwargs):
+    """Instantiates the configured query backend ('sqlite' or 'duckdb')."""
+    try:
+        engine_cls = ENGINES[backend.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown query backend: {backend}. Choose from: {', '.join(ENGINES)}")
+    return engine_cls(**kwargs)
@@ -0,0 +1,15 @@
+"""
+Development server entry point; `python app.py` hands over to this file.
+
+Chart workers (chart_pool.py) are started by multiprocessing, and every
+such child re-imports the parent's __main__ script as __mp_main__. Were
+that app.py, each worker would repeat the whole application set-up
+(configuration checks, LLM gateway, caches, executors, agents). This
+module does nothing on import; the app is only loaded under its own
+__main__ guard, so workers import just the chart modules they preload.
+"""
+
+if __name__ == '__main__':
+    from app import app
+
+    app.run(debug=True, port=5000, threaded=True)
@@ -0,0 +1,325 @@
+"""
+Mergeable streaming sketches used by the chunked profiler.
+
+Each sketch consumes one chunk at a time with NumPy/pandas vectorised
+updates, keeps bounded memory, and can be merged with another instance of
+the same sketch. Small inputs stay exact (KLL before its first compaction,
+HyperLogLog below its exact-set limit, Misra-Gries below k distinct values,
+the duplicate sampler at level 0).
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def hash_values(values) -> np.ndarray:
+    """Stable 64-bit hashes for a Series/array (same value -> same hash across chunks)."""
+    return pd.util.hash_pandas_object(pd.Series(values), index=False).to_numpy()
+
+
+class MomentSketch:
+    """
+    Per-column count, mean and central moments M2..M4 merged with Chan's
+    parallel update (the batched form of Welford's algorithm).
+    """
+
+    def __init__(self, n_cols: int):
+        self.n = np.zeros(n_cols)
+        self.mean = np.zeros(n_cols)
+        self.m2 = np.zeros(n_cols)
+        self.m3 = np.zeros(n_cols)
+        self.m4 = np.zeros(n_cols)
+        self.min = np.full(n_cols, np.nan)
+        self.max = np.full(n_cols, np.nan)
+
+    def update(self, block: np.ndarray):
+        other = MomentSketch(block.shape[1])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            n = (~np.isnan(block)).sum(axis=0).astype(np.float64)
+            mean = np.where(n > 0, np.nansum(block, axis=0) / np.where(n > 0, n, 1), 0.0)
+            dev = np.where(np.isnan(block), 0.0, block - mean)
+            dev2 = dev * dev
+            other.n, other.mean = n, mean
+            other.m2 = dev2.sum(axis=0)
+            other.m3 = (dev2 * dev).sum(axis=0)
+            other.m4 = (dev2 * dev2).sum(axis=0)
+            if block.shape[0]:
+                other.min = np.nanmin(block, axis=0)
+                other.max = np.nanmax(block, axis=0)
+        self.merge(other)
+
+    def merge(self, other: 'MomentSketch'):
+        na, nb = self.n, other.n
+        n = na + nb
+        with np.errstate(invalid='ignore', divide='ignore'):
+            safe_n = np.where(n > 0, n, 1)
+            delta = other.mean - self.mean
+            mean = self.mean + delta * nb / safe_n
+            m2 = self.m2 + other.m2 + delta ** 2 * na * nb / safe_n
+            m3 = (self.m3 + other.m3
+                  + delta ** 3 * na * nb * (na - nb) / safe_n ** 2
+                  + 3 * delta * (na * other.m2 - nb * self.m2) / safe_n)
+            m4 = (self.m4 + other.m4
+                  + delta ** 4 * na * nb * (na * na - na * nb + nb * nb) / safe_n ** 3
+                  + 6 * delta ** 2 * (na * na * other.m2 + nb * nb * self.m2) / safe_n ** 2
+                  + 4 * delta * (na * other.m3 - nb * self.m3) / safe_n)
+        self.n, self.mean, self.m2, self.m3, self.m4 = n, mean, m2, m3, m4
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+
+    def finalize(self) -> dict:
+        """Mean, sample std and biased skew/kurtosis, matching profiling.column_moments."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            n = np.where(self.n > 0, self.n, np.nan)
+            m2, m3, m4 = self.m2 / n, self.m3 / n, self.m4 / n
+            std = np.sqrt(self.m2 / np.where(self.n > 1, self.n - 1, np.nan))
+            degenerate = m2 <= (np.finfo(np.float64).resolution * self.mean) ** 2
+            skew = np.where(degenerate, np.nan, m3 / m2 ** 1.5)
+            kurt = np.where(degenerate, np.nan, m4 / m2 ** 2 - 3.0)
+        mean = np.where(self.n > 0, self.mean, np.nan)
+        return {'mean': mean, 'std': std, 'skewness': skew, 'kurtosis': kurt}
+
+
+class CoMomentSketch:
+    """
+    Pairwise-complete co-moment sums for Pearson correlation (the
+    DataFrame.corr() semantics). Values are shifted by a fixed per-column
+    offset before summing to keep the sums numerically stable; sketches can
+    only be merged when they share the same shift.
+    """
+
+    def __init__(self, shift: np.ndarray):
+        k = len(shift)
+        self.shift = np.nan_to_num(shift)
+        self.n = np.zeros((k, k))
+        self.sx = np.zeros((k, k))
+        self.sxx = np.zeros((k, k))
+        self.sxy = np.zeros((k, k))
+
+    def update(self, block: np.ndarray):
+        mask = ~np.isnan(block)
+        x = np.where(mask, block - self.shift, 0.0)
+        m = mask.astype(np.float64)
+        self.n += m.T @ m
+        self.sx += x.T @ m          # sx[i, j]: sum of x_i over rows where x_j is present
+        self.sxx += (x * x).T @ m
+        self.sxy += x.T @ x
+
+    def merge(self, other: 'CoMomentSketch'):
+        self.n += other.n
+        self.sx += other.sx
+        self.sxx += other.sxx
+        self.sxy += other.sxy
+
+    def corr(self) -> np.ndarray:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = self.sxy - self.sx * self.sx.T / self.n
+            var_i = self.sxx - self.sx * self.sx / self.n
+            corr = cov / np.sqrt(var_i * var_i.T)
+        corr[self.n < 2] = np.nan
+        return np.clip(corr, -1.0, 1.0)
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch. Level h holds items of weight 2**h; a level that
+    exceeds its capacity is sorted and every other item (random offset) is
+    promoted. Exact until the first compaction.
+    """
+
+    def __init__(self, k: int = 256, seed: int = 0):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.n = 0
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def update(self, values: np.ndarray):
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: 'KLLSketch'):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self._compress()
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                even = items[:len(items) - len(keep)]
+                promoted = even[self._rng.integers(0, 2)::2]
+                self.levels[h] = keep
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    @property
+    def exact(self) -> bool:
+        return len(self.levels) == 1
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lvl), 2.0 ** h) for h, lvl in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def quantiles(self, qs) -> np.ndarray:
+        if self.n == 0:
+            return np.full(len(qs), np.nan)
+        if self.exact:
+            return np.quantile(self.levels[0], qs)
+        items, cum = self._weighted()
+        targets = np.asarray(qs) * cum[-1]
+        idx = np.minimum(np.searchsorted(cum, targets, side='left'), len(items) - 1)
+        return items[idx]
+
+    def rank(self, value: float, inclusive: bool = False) -> float:
+        """Estimated number of items < value (or <= value when inclusive)."""
+        if self.n == 0 or np.isnan(value):
+            return 0.0
+        items, cum = self._weighted()
+        idx = np.searchsorted(items, value, side='right' if inclusive else 'left')
+        return float(cum[idx - 1]) if idx > 0 else 0.0
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter (2**p registers) fed with 64-bit hashes.
+    Keeps an exact hash set until it outgrows `exact_limit`.
+    """
+
+    def __init__(self, p: int = 14, exact_limit: int = 4096):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+        self.exact_limit = exact_limit
+        self._exact = set()
+
+    def update_hashes(self, hashes: np.ndarray):
+        if not len(hashes):
+            return
+        hashes = hashes.astype(np.uint64, copy=False)
+        if self._exact is not None:
+            unique = np.unique(hashes)
+            if len(unique) > self.exact_limit:
+                self._exact = None
+            else:
+                self._exact.update(unique.tolist())
+                if len(self._exact) > self.exact_limit:
+                    self._exact = None
+        idx = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        # Rank = leading zeros + 1 within the next 32 bits after the index bits;
+        # 32-bit integers are exact in float64, so frexp yields the bit length.
+        tail = ((hashes >> np.uint64(32 - self.p)) & np.uint64(0xFFFFFFFF)).astype(np.float64)
+        bit_length = np.frexp(tail)[1]
+        rank = (33 - bit_length).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+
+    def update(self, values):
+        self.update_hashes(hash_values(values))
+
+    def merge(self, other: 'HyperLogLog'):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        if self._exact is not None and other._exact is not None:
+            self._exact |= other._exact
+            if len(self._exact) > self.exact_limit:
+                self._exact = None
+        else:
+            self._exact = None
+
+    def count(self) -> int:
+        if self._exact is not None:
+            return len(self._exact)
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * np.log(self.m / zeros)
+        return int(round(estimate))
+
+
+class MisraGries:
+    """
+    Misra-Gries heavy hitters with k counters. Counts are exact while the
+    column has at most k distinct values, lower bounds otherwise.
+    """
+
+    def __init__(self, k: int = 256):
+        self.k = k
+        self.counters = pd.Series(dtype='int64')
+
+    def update(self, values):
+        self.merge_counts(pd.Series(values).value_counts())
+
+    def merge(self, other: 'MisraGries'):
+        self.merge_counts(other.counters)
+
+    def merge_counts(self, counts: pd.Series):
+        if counts.empty:
+            return
+        merged = self.counters.add(counts, fill_value=0).astype('int64')
+        if len(merged) > self.k:
+            merged = merged.sort_values(ascending=False)
+            merged = merged - merged.iloc[self.k]
+            merged = merged[merged > 0]
+        self.counters = merged
+
+    def top(self, n: int = 5) -> dict:
+        return self.counters.sort_values(ascending=False, kind='stable').head(n).to_dict()
+
+
+class DuplicateSampler:
+    """
+    Duplicate-row estimator over 64-bit row hashes using adaptive distinct
+    sampling: only hashes whose top `level` bits are zero are tracked, and
+    the level rises whenever the sample outgrows its capacity. Exact while
+    the level is 0.
+    """
+
+    def __init__(self, capacity: int = 200_000):
+        self.capacity = capacity
+        self.level = 0
+        self.counts = pd.Series(dtype='int64')
+
+    def _sampled(self, hashes: np.ndarray) -> np.ndarray:
+        if self.level == 0:
+            return hashes
+        return hashes[(hashes >> np.uint64(64 - self.level)) == 0]
+
+    def update_hashes(self, hashes: np.ndarray):
+        sampled = self._sampled(hashes.astype(np.uint64, copy=False))
+        if len(sampled):
+            self.counts = self.counts.add(pd.Series(sampled).value_counts(), fill_value=0).astype('int64')
+        while len(self.counts) > self.capacity and self.level < 63:
+            self.level += 1
+            keep = self._sampled(self.counts.index.to_numpy(dtype=np.uint64))
+            self.counts = self.counts.loc[keep]
+
+    def update(self, frame: pd.DataFrame):
+        self.update_hashes(pd.util.hash_pandas_object(frame, index=False).to_numpy())
+
+    def merge(self, other: 'DuplicateSampler'):
+        if other.level > self.level:
+            self.level = other.level
+            self.counts = self.counts.loc[self._sampled(self.counts.index.to_numpy(dtype=np.uint64))]
+        self.update_hashes(np.repeat(other.counts.index.to_numpy(dtype=np.uint64), other.counts.to_numpy()))
+
+    def duplicate_count(self) -> int:
+        if self.counts.empty:
+            return 0
+        return int((self.counts.sum() - len(self.counts)) * (1 << self.level))
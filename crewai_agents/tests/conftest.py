@@ -0,0 +1,30 @@
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+# The backend modules are flat files next to app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def stub_openrouter():
+    """bench.py's OpenRouter stub on a free port; yields its base URL."""
+    from bench import StubOpenRouter
+
+    StubOpenRouter.latency = 0.01
+    StubOpenRouter.fail_first = False
+    StubOpenRouter.rejected_models = set()
+    StubOpenRouter.requests = 0
+    StubOpenRouter.seen = set()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOpenRouter)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}/api/v1'
+    finally:
+        server.shutdown()
+        server.server_close()
+        StubOpenRouter.fail_first = False
+        StubOpenRouter.rejected_models = set()
@@ -0,0 +1,51 @@
+import pytest
+
+# agent_runner drives CrewAI in "crew" mode and imports it at module level
+crewai = pytest.importorskip('crewai')
+
+import agent_runner
+from bench import StubOpenRouter
+from llm_gateway import LLMGateway, GatewayChatModel
+
+
+def test_modes_parse_per_endpoint_with_request_overrides():
+    modes = agent_runner.parse_modes('crew, query=direct')
+    assert modes == {'*': 'crew', 'query': 'direct'}
+    assert agent_runner.mode_for('query', modes) == 'direct'
+    assert agent_runner.mode_for('detective', modes) == 'crew'
+    assert agent_runner.mode_for('query', modes, 'CREW') == 'crew'
+    with pytest.raises(ValueError):
+        agent_runner.parse_modes('query=fast')
+    with pytest.raises(ValueError):
+        agent_runner.mode_for('query', modes, 'fast')
+
+
+def test_using_scopes_the_mode():
+    assert agent_runner.current_mode() == 'crew'
+    with agent_runner.using('direct'):
+        with agent_runner.using(None):
+            assert agent_runner.current_mode() == 'direct'
+    assert agent_runner.current_mode() == 'crew'
+
+
+def test_direct_mode_sends_one_completion_per_task_with_context(stub_openrouter):
+    gateway = LLMGateway('stub-key', base_url=stub_openrouter)
+    try:
+        llm = GatewayChatModel(gateway=gateway, model='openrouter/stub/model')
+        agent = crewai.Agent(role='Query Interpreter', goal='Understand questions',
+                             backstory='You read questions carefully.', llm=llm)
+        interpret = crewai.Task(description='Interpret: top stores', expected_output='JSON', agent=agent)
+        write_sql = crewai.Task(description='Write the SQL', expected_output='SQL', agent=agent, context=[interpret])
+        before = agent_runner.stats()['direct']
+
+        with agent_runner.using('direct'):
+            first, second = agent_runner.run_tasks([interpret, write_sql], llm)
+
+        assert StubOpenRouter.requests == 2
+        assert first.startswith('echo: Current Task: Interpret: top stores')
+        # The second step's prompt carries the first step's answer as its context
+        assert "This is the context you're working with" in second and 'Interpret: top stores' in second
+        after = agent_runner.stats()['direct']
+        assert (after['runs'] - before['runs'], after['steps'] - before['steps']) == (1, 2)
+    finally:
+        gateway.close()
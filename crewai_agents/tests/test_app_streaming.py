@@ -0,0 +1,76 @@
+import io
+import os
+import json
+
+import pytest
+
+# The Flask app builds its CrewAI agents at import time
+pytest.importorskip('crewai')
+
+CSV = 'Store,Weekly_Sales,Holiday_Flag\n' + ''.join(
+    f'{store},{store * 1000 + week},{week % 2}\n' for store in range(1, 6) for week in range(20)
+)
+
+
+@pytest.fixture(scope='module')
+def client():
+    # Questions here are answered by the fast path, which makes no LLM calls
+    os.environ.setdefault('OPENROUTER_API_KEY', 'test-key')
+    os.environ.update({'LLM_CACHE_PATH': '', 'CHART_CACHE_PATH': '', 'CHART_WORKERS': '0'})
+    import app
+
+    client = app.app.test_client()
+    upload = client.post('/upload', data={'file': (io.BytesIO(CSV.encode()), 'sales.csv')},
+                         content_type='multipart/form-data').get_json()
+    client.dataset_id = upload['dataset_id']
+    yield client
+    client.post('/cleanup', json={'dataset_id': client.dataset_id})
+
+
+def events(body: bytes) -> list:
+    """(event, data) pairs of a text/event-stream body, keep-alive comments skipped."""
+    parsed = []
+    for block in body.decode('utf-8').split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if 'event' in lines:
+            parsed.append((lines['event'], json.loads(lines['data'])))
+    return parsed
+
+
+def test_query_stream_sends_each_stage_then_the_query_payload(client):
+    question = {'dataset_id': client.dataset_id, 'query': 'top 3 stores by Weekly_Sales'}
+    response = client.post('/query/stream', json=question)
+
+    assert response.mimetype == 'text/event-stream'
+    stream = events(response.data)
+    assert [name for name, _ in stream] == ['interpretation', 'sql', 'result', 'narrative', 'chart', 'done']
+    done = stream[-1][1]
+    assert done['path'] == 'fast_path'
+    assert [row['Store'] for row in done['result']['data']] == [5, 4, 3]
+    assert done['narrative'] == stream[3][1]['delta']
+
+    answer = client.post('/query', json=question).get_json()
+    assert answer['sql_query'] == done['sql_query'] and answer['result'] == done['result']
+
+
+def test_query_stream_accepts_event_source_parameters(client):
+    response = client.get('/query/stream', query_string={'dataset_id': client.dataset_id,
+                                                         'query': 'top 2 stores by Weekly_Sales'})
+    assert events(response.data)[-1][0] == 'done'
+
+
+def test_bad_stream_requests_get_plain_errors(client):
+    assert client.post('/query/stream', json={'dataset_id': 'temp_dataset_missing', 'query': 'x'}).status_code == 404
+    assert client.post('/query/stream', json={'dataset_id': client.dataset_id}).status_code == 400
+
+
+def test_job_events_end_with_the_final_state(client):
+    accepted = client.post('/query', json={'dataset_id': client.dataset_id, 'async': True,
+                                           'query': 'top 3 stores by Weekly_Sales'})
+    assert accepted.status_code == 202
+
+    stream = events(client.get(accepted.get_json()['events_url']).data)
+    assert {name for name, _ in stream} == {'status'}
+    final = stream[-1][1]
+    assert final['status'] == 'succeeded' and final['result']['path'] == 'fast_path'
+    assert client.get(accepted.get_json()['status_url']).get_json()['status'] == 'succeeded'
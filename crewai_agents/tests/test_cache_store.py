@@ -0,0 +1,42 @@
+import json
+import sqlite3
+
+import cache_store
+
+
+def store(path, **kwargs):
+    return cache_store.LRUStore(str(path), 'entries', kwargs.pop('max_bytes', 10 ** 6),
+                                encode=lambda v: json.dumps(v).encode('utf-8'), decode=json.loads, **kwargs)
+
+
+def test_switch_nests_and_restores():
+    switch = cache_store.Switch('test_switch')
+    assert switch.is_enabled()
+    with switch.disabled():
+        assert not switch.is_enabled()
+        with switch.disabled(False):
+            assert not switch.is_enabled()
+    with switch.disabled(False):
+        assert switch.is_enabled()
+    assert switch.is_enabled()
+
+
+def test_delete_filters_on_metadata(tmp_path):
+    lru = store(tmp_path / 'c.sqlite', columns={'owner': 'TEXT'}, indexed=('owner',))
+    lru.put('a', [1], owner='x')
+    lru.put('b', [2], owner='y')
+    lru.delete(owner='x')
+    assert lru.get('a') is None and lru.get('b') == [2]
+
+
+def test_table_from_an_older_layout_is_replaced(tmp_path):
+    path = tmp_path / 'old.sqlite'
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE entries (key TEXT PRIMARY KEY, content TEXT)')
+    conn.execute("INSERT INTO entries VALUES ('a', 'stale')")
+    conn.commit()
+    conn.close()
+    lru = store(path)
+    assert lru.get('a') is None
+    lru.put('a', 'fresh')
+    assert lru.get('a') == 'fresh'
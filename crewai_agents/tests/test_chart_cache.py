@@ -0,0 +1,61 @@
+import pytest
+
+import chart_cache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return chart_cache.ChartCache(str(tmp_path / 'chart_cache.sqlite'))
+
+
+def build_counter(payload):
+    calls = []
+
+    def build():
+        calls.append(1)
+        return payload
+    return build, calls
+
+
+def test_payload_is_built_once_per_version_and_spec(cache):
+    build, calls = build_counter({'data': [1, 2, 3]})
+    spec, params = {'chart_type': 'histogram', 'column': 'x'}, {'point_budget': 5000}
+    assert cache.get_or_build('ds_a', 'v1', 'chart', spec, params, build) == {'data': [1, 2, 3]}
+    assert cache.get_or_build('ds_a', 'v1', 'chart', spec, params, build) == {'data': [1, 2, 3]}
+    assert len(calls) == 1
+    cache.get_or_build('ds_a', 'v2', 'chart', spec, params, build)
+    cache.get_or_build('ds_a', 'v1', 'chart', {**spec, 'column': 'y'}, params, build)
+    cache.get_or_build('ds_a', 'v1', 'chart', spec, {'point_budget': 100}, build)
+    assert len(calls) == 4
+
+
+def test_disabled_bypasses_lookups_and_stores(cache):
+    build, calls = build_counter({'data': []})
+    with chart_cache.disabled():
+        cache.get_or_build('ds_a', 'v1', 'plan', None, {}, build)
+    assert cache.stats()['entries'] == 0
+    cache.get_or_build('ds_a', 'v1', 'plan', None, {}, build)
+    assert len(calls) == 2
+
+
+def test_drop_dataset_removes_only_its_entries(cache):
+    for dataset_id in ('ds_a', 'ds_b'):
+        cache.get_or_build(dataset_id, 'v1', 'plan', None, {}, lambda: {'charts': []})
+    cache.drop_dataset('ds_a')
+    assert cache.stats()['entries'] == 1
+    assert cache.get(chart_cache.chart_key('ds_b', 'v1', 'plan', None, {})) == {'charts': []}
+
+
+def test_entries_survive_reopening(cache):
+    cache.get_or_build('ds_a', 'v1', 'plan', None, {}, lambda: {'charts': ['bar']})
+    reopened = chart_cache.ChartCache(cache.path)
+    assert reopened.get(chart_cache.chart_key('ds_a', 'v1', 'plan', None, {})) == {'charts': ['bar']}
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = chart_cache.ChartCache(str(tmp_path / 'small.sqlite'), max_bytes=400)
+    for i in range(5):
+        cache.get_or_build('ds_a', 'v1', 'chart', {'i': i}, {}, lambda: {'data': 'x' * 60})
+    stats = cache.stats()
+    assert stats['bytes'] <= 400 and stats['evictions'] > 0
+    assert cache.get(chart_cache.chart_key('ds_a', 'v1', 'chart', {'i': 4}, {})) is not None
@@ -0,0 +1,57 @@
+import datetime
+
+import numpy as np
+import orjson
+import plotly.graph_objects as go
+
+import chart_codec
+
+
+def round_trip(fig) -> dict:
+    return chart_codec.decode(orjson.loads(chart_codec.dumps(chart_codec.figure_dict(fig))))
+
+
+def test_figure_round_trips_through_typed_arrays():
+    rng = np.random.default_rng(0)
+    x = np.arange(1000)
+    y = rng.normal(size=1000)
+    z = rng.normal(size=(4, 5))
+    fig = go.Figure([go.Scattergl(x=x, y=y, mode='markers'), go.Heatmap(z=z)])
+    fig.update_layout(title='Round trip', xaxis={'range': [0, 10]})
+
+    encoded = chart_codec.figure_dict(fig)
+    assert encoded['data'][0]['x']['dtype'] == 'i2'
+    assert encoded['data'][0]['y']['dtype'] == 'f8'
+    assert encoded['data'][1]['z']['shape'] == '4, 5'
+
+    decoded = round_trip(fig)
+    np.testing.assert_array_equal(decoded['data'][0]['x'], x)
+    np.testing.assert_array_equal(decoded['data'][0]['y'], y)
+    np.testing.assert_array_equal(decoded['data'][1]['z'], z)
+    assert decoded['layout']['title']['text'] == 'Round trip'
+    assert decoded['layout']['xaxis']['range'] == [0, 10]
+
+
+def test_short_decimals_and_non_finite_values_stay_plain():
+    fig = go.Figure(go.Bar(x=['a', 'b', 'c'], y=np.array([42.31, np.nan, 1.5])))
+
+    trace = chart_codec.figure_dict(fig)['data'][0]
+
+    assert trace['x'] == ['a', 'b', 'c']
+    assert trace['y'] == [42.31, None, 1.5]
+
+
+def test_figure_is_left_unchanged():
+    y = np.arange(10, dtype=np.int64)
+    fig = go.Figure(go.Scatter(y=y))
+
+    chart_codec.figure_dict(fig)
+
+    assert fig.data[0].y.dtype == np.int64
+    np.testing.assert_array_equal(fig.data[0].y, y)
+
+
+def test_dumps_handles_values_json_does_not():
+    payload = {'when': datetime.date(2024, 1, 2), 'n': np.int64(3), 'missing': float('nan')}
+
+    assert orjson.loads(chart_codec.dumps(payload)) == {'when': '2024-01-02', 'n': 3, 'missing': None}
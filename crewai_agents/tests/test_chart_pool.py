@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import charts
+import chart_pool
+import dataset_store
+
+PARAMS = {'point_budget': 5000, 'histogram_bins': 40}
+
+
+def sample_frame(rows: int = 500) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'price': rng.normal(100, 15, rows),
+        'units': rng.integers(0, 50, rows),
+        'region': rng.choice(['north', 'south', 'east'], rows),
+    })
+
+
+@pytest.fixture
+def pool():
+    pool = chart_pool.ChartPool(workers=1, min_rows=0)
+    yield pool
+    pool.shutdown()
+
+
+def test_pooled_charts_match_in_process_rendering(tmp_path, pool):
+    path = str(tmp_path / 'ds_pool')
+    df = sample_frame()
+    dataset_store.write_dataset(path, df, 'csv')
+    specs = charts.plan_charts(df)
+
+    pooled = pool.render_all(path, specs, PARAMS)
+    local = [charts.render_chart(dataset_store.read_dataset(path), spec, PARAMS) for spec in specs]
+
+    assert pooled == local
+    assert pool.stats()['pooled'] == len(specs) and pool.stats()['local'] == 0
+
+
+def test_workers_read_the_current_version_of_a_replaced_dataset(tmp_path, pool):
+    path = str(tmp_path / 'ds_pool')
+    dataset_store.write_dataset(path, sample_frame(), 'csv')
+    spec = next(spec for spec in charts.plan_charts(sample_frame())
+                if spec['chart_type'] == 'histogram' and spec.get('column') == 'price')
+    pool.render(path, spec, PARAMS)
+
+    replaced = sample_frame()
+    replaced['price'] = 1000.0
+    dataset_store.remove_dataset(path)
+    dataset_store.write_dataset(path, replaced, 'csv')
+
+    assert pool.render(path, spec, PARAMS) == charts.render_chart(replaced, spec, PARAMS)
+
+
+def test_small_datasets_render_in_the_calling_thread(tmp_path):
+    path = str(tmp_path / 'ds_small')
+    df = sample_frame(20)
+    dataset_store.write_dataset(path, df, 'csv')
+    pool = chart_pool.ChartPool(workers=1, min_rows=1000)
+
+    pool.render_all(path, charts.plan_charts(df), PARAMS)
+
+    assert pool.stats()['local'] > 0 and pool.stats()['pooled'] == 0
+    assert not pool.stats()['started']
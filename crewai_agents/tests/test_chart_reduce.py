@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from scipy.stats import gaussian_kde
+
+import chart_reduce
+
+
+def test_histogram_counts_every_value():
+    values = np.random.default_rng(0).normal(size=10_000)
+    hist = chart_reduce.histogram(values, bins=40)
+    assert len(hist['counts']) == 40
+    assert hist['counts'].sum() == values.size
+
+
+def test_histogram_uses_one_bin_per_small_integer():
+    hist = chart_reduce.histogram(np.array([1, 2, 2, 3, 3, 3]), bins=40)
+    assert hist['centers'].tolist() == [1.0, 2.0, 3.0]
+    assert hist['counts'].tolist() == [1, 2, 3]
+    assert hist['width'] == 1.0
+
+
+def test_box_stats_match_numpy_and_cap_outliers():
+    values = np.concatenate([np.arange(100, dtype=float), [1000.0, 2000.0, -1500.0]])
+    stats = chart_reduce.box_stats(values, max_outliers=2)
+    assert stats['median'] == np.median(values)
+    assert stats['outliers_total'] == 3
+    # The most extreme points are the ones kept
+    assert stats['outliers'].tolist() == [-1500.0, 2000.0]
+    assert stats['lowerfence'] == 0.0 and stats['upperfence'] == 99.0
+
+
+def test_lttb_keeps_endpoints_and_peak():
+    y = np.zeros(10_000)
+    y[4321] = 50.0
+    picked = chart_reduce.lttb(np.arange(y.size), y, 100)
+    assert len(picked) == 100
+    assert picked[0] == 0 and picked[-1] == y.size - 1
+    assert 4321 in picked
+    assert np.all(np.diff(picked) > 0)
+
+
+def test_sample_rows_keeps_flagged_rows_and_every_group():
+    n = 50_000
+    keep = np.zeros(n, dtype=bool)
+    keep[[5, 500, 49_999]] = True
+    strata = np.where(np.arange(n) < 100, 'rare', 'common')
+    picked = chart_reduce.sample_rows(n, 1000, keep=keep, strata=strata)
+    assert len(picked) <= 1000
+    assert {5, 500, 49_999} <= set(picked.tolist())
+    assert (picked < 100).any()
+    assert np.array_equal(picked, chart_reduce.sample_rows(n, 1000, keep=keep, strata=strata))
+
+
+def test_reductions_return_everything_under_budget():
+    assert chart_reduce.sample_rows(10, 100).tolist() == list(range(10))
+    assert chart_reduce.downsample_series(np.arange(10.0), 100).tolist() == list(range(10))
+
+
+def test_box_stats_of_empty_column_is_none():
+    assert chart_reduce.box_stats(np.array([]), max_outliers=10) is None
+
+
+def test_overview_charts_render_with_an_all_null_numeric_column():
+    import pandas as pd
+    import charts
+
+    df = pd.DataFrame({'a': np.arange(20.0), 'empty': np.full(20, np.nan), 'c': np.arange(20.0) * 2})
+    params = {'point_budget': 5000, 'histogram_bins': 40}
+    box_spec = next(spec for spec in charts.plan_charts(df) if spec['chart_type'] == 'boxplot')
+    assert 'empty' in box_spec['columns']
+    fig = charts.build_figure(df, box_spec, params)
+    assert [trace.name for trace in fig.data if trace.type == 'box'] == ['a', 'empty', 'c']
+
+
+@pytest.mark.parametrize('values', [
+    np.random.default_rng(1).normal(50, 10, 20_000),
+    np.concatenate([np.random.default_rng(2).normal(0, 1, 5000), np.random.default_rng(3).normal(8, 0.5, 500)]),
+    np.random.default_rng(4).exponential(3, 8000),
+])
+def test_kde_matches_scipy_gaussian_kde(values):
+    x, density = chart_reduce.kde(values)
+    expected = gaussian_kde(values)(x)
+    assert np.allclose(x, np.linspace(values.min(), values.max(), 200))
+    assert np.max(np.abs(density - expected)) < 1e-3 * expected.max()
+
+
+def test_kde_of_constant_or_tiny_columns_is_none():
+    assert chart_reduce.kde(np.full(100, 3.0)) is None
+    assert chart_reduce.kde(np.array([1.0])) is None
@@ -0,0 +1,162 @@
+import os
+import time
+import threading
+
+import pandas as pd
+
+import dataset_store
+
+
+def frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({'x': range(rows)})
+
+
+def test_dataframe_cache_hits_and_reloads_new_versions():
+    cache = dataset_store.DataFrameCache(max_bytes=10 ** 6)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return frame(10)
+
+    first = cache.get_or_load('ds_a', 1, loader)
+    assert cache.get_or_load('ds_a', 1, loader) is first
+    cache.get_or_load('ds_a', 2, loader)
+    assert len(loads) == 2
+    # The stale version was replaced, not kept alongside
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 2
+
+
+def test_dataframe_cache_evicts_least_recently_used_within_budget():
+    size = int(frame(1000).memory_usage(deep=True).sum())
+    cache = dataset_store.DataFrameCache(max_bytes=2 * size)
+    cache.get_or_load('ds_a', 1, lambda: frame(1000))
+    cache.get_or_load('ds_b', 1, lambda: frame(1000))
+    cache.get_or_load('ds_a', 1, lambda: frame(1000))  # ds_a is now most recent
+    cache.get_or_load('ds_c', 1, lambda: frame(1000))
+    stats = cache.stats()
+    assert stats['entries'] == 2 and stats['evictions'] == 1
+    assert stats['bytes'] <= stats['max_bytes']
+    reloaded = []
+    cache.get_or_load('ds_b', 1, lambda: reloaded.append(1) or frame(1000))
+    assert reloaded == [1]
+
+
+def test_dataframe_cache_skips_frames_over_budget_and_invalidates():
+    cache = dataset_store.DataFrameCache(max_bytes=10)
+    cache.get_or_load('ds_big', 1, lambda: frame(1000))
+    assert cache.stats()['entries'] == 0
+
+    cache = dataset_store.DataFrameCache(max_bytes=10 ** 6)
+    cache.get_or_load('ds_a', 1, lambda: frame(10))
+    cache.invalidate('ds_a')
+    assert cache.stats()['entries'] == 0 and cache.stats()['bytes'] == 0
+
+
+def test_content_ids_depend_on_bytes_and_format():
+    def dataset_id(data: bytes, ext: str) -> str:
+        hasher = dataset_store.content_hasher(ext)
+        hasher.update(data)
+        return dataset_store.content_dataset_id(hasher.hexdigest())
+
+    assert dataset_id(b'a,b\n1,2\n', 'csv') == dataset_id(b'a,b\n1,2\n', 'csv')
+    assert dataset_id(b'a,b\n1,2\n', 'csv') != dataset_id(b'a,b\n1,3\n', 'csv')
+    assert dataset_id(b'a,b\n1,2\n', 'csv') != dataset_id(b'a,b\n1,2\n', 'tsv')
+    assert dataset_id(b'', 'csv').startswith(dataset_store.DATASET_PREFIX)
+
+
+def test_reference_counts(tmp_path):
+    path = str(tmp_path / 'temp_dataset_shared')
+    dataset_store.write_dataset(path, frame(3), 'csv')
+    # Datasets stored before reference counting have one implicit owner
+    assert dataset_store.reference_count(path) == 1
+    assert dataset_store.add_reference(path, initial=True) == 1
+    assert dataset_store.add_reference(path) == 2
+    assert dataset_store.drop_reference(path) == 1
+    assert dataset_store.drop_reference(path) == 0
+    dataset_store.remove_dataset(path)
+    assert dataset_store.reference_count(path) == 0
+    assert not dataset_store.dataset_exists(path)
+
+
+def test_dataset_lock_excludes_per_dataset_and_survives_release():
+    entered = threading.Event()
+    finished = []
+
+    def hold(path, seconds):
+        with dataset_store.dataset_lock(path):
+            entered.set()
+            time.sleep(seconds)
+            finished.append(path)
+
+    for _ in range(2):  # the lock behaves the same after its last holder released it
+        entered.clear()
+        finished.clear()
+        holder = threading.Thread(target=hold, args=('/uploads/temp_dataset_locked', 0.2))
+        holder.start()
+        entered.wait()
+        started = time.monotonic()
+        with dataset_store.dataset_lock('/elsewhere/temp_dataset_other'):
+            assert time.monotonic() - started < 0.1
+        with dataset_store.dataset_lock('/elsewhere/temp_dataset_locked'):
+            # Same dataset id under another directory: waits for the holder
+            assert finished == ['/uploads/temp_dataset_locked']
+        holder.join()
+
+
+def test_concurrent_uploads_and_cleanups_balance_reference_counts(tmp_path):
+    path = str(tmp_path / 'temp_dataset_shared')
+    dataset_store.write_dataset(path, frame(3), 'csv')
+    dataset_store.add_reference(path, initial=True)
+
+    def upload_then_cleanup():
+        # The same lock-held steps /upload and /cleanup take for a shared dataset
+        with dataset_store.dataset_lock(path):
+            dataset_store.add_reference(path)
+        with dataset_store.dataset_lock(path):
+            dataset_store.drop_reference(path)
+
+    threads = [threading.Thread(target=upload_then_cleanup) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert dataset_store.reference_count(path) == 1
+    with dataset_store.dataset_lock(path):
+        assert dataset_store.drop_reference(path) == 0
+        dataset_store.remove_dataset(path)
+    assert not dataset_store.dataset_exists(path)
+
+
+def test_profile_is_served_until_the_data_changes(tmp_path):
+    path = str(tmp_path / 'temp_dataset_profiled')
+    dataset_store.write_dataset(path, frame(3), 'csv')
+    assert dataset_store.read_profile(path) is None
+
+    served = dataset_store.write_profile(path, {'rows': 3, 'first_seen': pd.Timestamp('2024-01-02')})
+    # What the upload response returns is exactly what later requests read
+    assert served == {'rows': 3, 'first_seen': '2024-01-02 00:00:00'}
+    assert dataset_store.read_profile(path) == served
+
+    time.sleep(0.01)
+    dataset_store.write_dataset(path, frame(4), 'csv')
+    assert dataset_store.read_profile(path) is None
+
+
+def test_chunked_writer_promotes_drifting_column_types(tmp_path):
+    path = str(tmp_path / 'temp_dataset_chunked')
+    writer = dataset_store.ChunkedDatasetWriter(path, 'csv')
+    writer.write(pd.DataFrame({'id': [1, 2], 'code': [10, 20]}))
+    writer.write(pd.DataFrame({'id': [3, None], 'code': [30, 40]}))  # ints gain a null
+    writer.write(pd.DataFrame({'id': [5.0, 6.0], 'code': ['A1', 'B2']}))  # numbers gain text
+    schema = writer.close()
+
+    assert schema['rows'] == 6
+    df = dataset_store.read_dataset(path)
+    assert df['id'].dtype == 'float64'
+    assert df['id'].isna().sum() == 1 and df['id'].sum() == 17
+    assert df['code'].tolist() == ['10', '20', '30', '40', 'A1', 'B2']
+    # The superseded temporary files are gone
+    assert sorted(os.listdir(path)) == sorted([dataset_store.DATA_FILE, dataset_store.SCHEMA_FILE])
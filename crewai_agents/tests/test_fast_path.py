@@ -0,0 +1,79 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import fast_path
+from query_engine import TABLE_NAME
+
+PROFILE = {
+    'columns': ['Store', 'Weekly_Sales', 'Holiday_Flag', 'Fuel_Price', 'Date'],
+    'numeric_columns': ['Store', 'Weekly_Sales', 'Holiday_Flag', 'Fuel_Price'],
+}
+
+
+@pytest.fixture
+def planner():
+    return fast_path.FastPathPlanner(min_confidence=0.8)
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    pd.DataFrame({
+        'Store': [1, 1, 2, 2, 3],
+        'Weekly_Sales': [10.0, 20.0, 5.0, 5.0, 40.0],
+        'Holiday_Flag': [0, 1, 0, 0, 1],
+        'Fuel_Price': [3.0, 3.6, 3.2, 3.8, 2.9],
+        'Date': ['a', 'b', 'c', 'd', 'e'],
+    }).to_sql(TABLE_NAME, conn, index=False)
+    yield conn
+    conn.close()
+
+
+def run(conn, plan):
+    return pd.read_sql_query(plan['sql'], conn)
+
+
+def test_top_n_by_measure(planner, conn):
+    plan = planner.plan('top 2 stores by Weekly_Sales', PROFILE)
+    assert plan['template'] == 'rank_group'
+    assert run(conn, plan).iloc[:, 0].tolist() == [3, 1]
+
+
+def test_group_aggregate_with_filter(planner, conn):
+    plan = planner.plan('average Weekly_Sales by Store where Fuel_Price > 3.1', PROFILE)
+    result = run(conn, plan)
+    assert dict(zip(result['Store'], result.iloc[:, 1])) == {1: 20.0, 2: 5.0}
+
+
+def test_count_distinct_alias_is_quoted(planner, conn):
+    plan = planner.plan('how many distinct Store', PROFILE)
+    assert plan['template'] == 'count_distinct'
+    assert '"distinct_Store"' in plan['sql']
+    assert run(conn, plan).iloc[0, 0] == 3
+
+
+def test_unrecognised_questions_go_to_the_crew(planner):
+    assert planner.plan('why did weekly sales drop in 2011 compared to fuel prices', PROFILE) is None
+    stats = planner.stats()
+    assert stats['attempts'] == 1 and stats['planned'] == 0
+
+
+def test_narrative_is_built_from_the_result(planner, conn):
+    plan = planner.plan('count rows where Holiday_Flag = 1', PROFILE)
+    assert fast_path.narrate(plan, run(conn, plan)).endswith(': 2.')
+
+
+def test_group_narrative_when_every_group_is_null(planner):
+    plan = planner.plan('average Weekly_Sales by Store', PROFILE)
+    assert plan['template'] == 'group_agg'
+    result = pd.DataFrame({'Store': [1, 2], 'avg_Weekly_Sales': [None, None]})
+    assert 'avg_Weekly_Sales is null in every group' in fast_path.narrate(plan, result)
+
+
+def test_failed_plans_are_counted(planner):
+    planner.record_failed()
+    planner.record_served('crew')
+    assert planner.stats()['failed'] == 1
+    assert planner.stats()['served']['crew'] == 1
@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+import jobs
+
+
+@pytest.fixture
+def manager():
+    return jobs.JobManager(max_workers=2, max_pending=2, ttl_seconds=60)
+
+
+def wait_until_finished(manager, job_id, timeout=5.0):
+    job = manager.get(job_id)
+    while job['status'] not in jobs.TERMINAL_STATES:
+        job = manager.wait_for_change(job_id, job['version'], timeout=timeout)
+    return job
+
+
+def test_job_runs_in_the_background_and_keeps_its_result(manager):
+    release = threading.Event()
+
+    def runner(x):
+        release.wait(5)
+        return {'answer': x * 2}, 200
+
+    job = manager.submit('query', runner, 21)
+    assert job['status'] == jobs.QUEUED and job['result'] is None
+    release.set()
+
+    done = wait_until_finished(manager, job['job_id'])
+    assert done['status'] == jobs.SUCCEEDED and done['status_code'] == 200
+    assert done['result'] == {'answer': 42}
+    assert manager.get(job['job_id'])['result'] == {'answer': 42}
+
+
+def test_error_status_and_exceptions_fail_the_job(manager):
+    rejected = manager.submit('query', lambda: ({'error': 'bad dataset'}, 404))
+    crashed = manager.submit('query', lambda: 1 / 0)
+
+    rejected = wait_until_finished(manager, rejected['job_id'])
+    crashed = wait_until_finished(manager, crashed['job_id'])
+    assert (rejected['status'], rejected['status_code'], rejected['error']) == (jobs.FAILED, 404, 'bad dataset')
+    assert (crashed['status'], crashed['status_code']) == (jobs.FAILED, 500)
+    assert 'division' in crashed['error'] and crashed['result'] is None
+
+
+def test_queue_rejects_work_beyond_max_pending(manager):
+    release = threading.Event()
+
+    def blocked():
+        release.wait(5)
+        return {}, 200
+
+    for _ in range(2):
+        manager.submit('detective', blocked)
+    with pytest.raises(jobs.QueueFull):
+        manager.submit('detective', lambda: ({}, 200))
+    release.set()
+    assert manager.stats()['rejected'] == 1 and manager.stats()['submitted'] == 2
+
+
+def test_finished_jobs_are_purged_after_their_ttl():
+    manager = jobs.JobManager(max_workers=1, ttl_seconds=0)
+    first = manager.submit('query', lambda: ({}, 200))
+    wait_until_finished(manager, first['job_id'])
+    manager.submit('query', lambda: ({}, 200))
+    assert manager.get(first['job_id']) is None
+    assert manager.wait_for_change(first['job_id'], 0, timeout=0.1) is None
+
+
+def test_progress_reaches_waiters_in_order(manager):
+    stages = ['interpreting', 'generating_sql', 'narrating']
+    step = threading.Semaphore(0)
+
+    def runner():
+        for stage in stages:
+            step.acquire()
+            jobs.report_progress(stage)
+        return {}, 200
+
+    job = manager.submit('query', runner)
+    seen, version = [], job['version']
+    while True:
+        snapshot = manager.wait_for_change(job['job_id'], version, timeout=5)
+        version = snapshot['version']
+        if snapshot['progress'] and snapshot['progress']['stage'] not in seen:
+            seen.append(snapshot['progress']['stage'])
+        if snapshot['status'] in jobs.TERMINAL_STATES:
+            break
+        if snapshot['status'] == jobs.RUNNING:
+            step.release()
+    assert seen == stages
+
+
+def test_report_progress_outside_a_job_is_a_no_op():
+    jobs.report_progress('narrating')
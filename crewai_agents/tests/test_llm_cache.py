@@ -0,0 +1,88 @@
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+import llm_cache
+from bench import StubOpenRouter
+from llm_gateway import LLMGateway, GatewayChatModel
+
+MODEL = 'openrouter/stub/model'
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return llm_cache.ResponseCache(str(tmp_path / 'llm_cache.sqlite'))
+
+
+def test_cache_key_covers_model_params_and_messages():
+    messages = [{'role': 'user', 'content': 'hi'}]
+    key = llm_cache.cache_key('m', messages, {'temperature': 0.3})
+    assert key == llm_cache.cache_key('m', [dict(m) for m in messages], {'temperature': 0.3})
+    assert key != llm_cache.cache_key('other', messages, {'temperature': 0.3})
+    assert key != llm_cache.cache_key('m', messages, {'temperature': 0.7})
+    assert key != llm_cache.cache_key('m', [{'role': 'user', 'content': 'hello'}], {'temperature': 0.3})
+
+
+def test_response_cache_round_trip_and_persistence(cache):
+    cache.put('k', 'stub/model', 0.3, 'answer', {'prompt_tokens': 3})
+    assert cache.get('k') == {'content': 'answer', 'model': 'stub/model', 'usage': {'prompt_tokens': 3}}
+    assert cache.get('missing') is None
+    assert llm_cache.ResponseCache(cache.path).get('k')['content'] == 'answer'
+
+
+def test_response_cache_evicts_least_recently_used(tmp_path):
+    cache = llm_cache.ResponseCache(str(tmp_path / 'small.sqlite'), max_bytes=300)
+    for key in ('a', 'b'):
+        cache.put(key, 'm', 0.3, 'x' * 100)
+        time.sleep(0.01)
+    cache.get('a')
+    cache.put('c', 'm', 0.3, 'x' * 100)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_gateway_answers_repeats_from_cache_unless_disabled(stub_openrouter, cache):
+    gateway = LLMGateway('stub-key', base_url=stub_openrouter, cache=cache)
+    try:
+        messages = [{'role': 'user', 'content': 'same question'}]
+        assert gateway.complete(messages, model=MODEL)['cached'] is False
+        assert gateway.complete(messages, model=MODEL)['cached'] is True
+        with llm_cache.disabled():
+            assert gateway.complete(messages, model=MODEL)['cached'] is False
+        assert StubOpenRouter.requests == 2
+    finally:
+        gateway.close()
+
+
+def test_disabled_cache_does_not_store(stub_openrouter, cache):
+    gateway = LLMGateway('stub-key', base_url=stub_openrouter, cache=cache)
+    try:
+        messages = [{'role': 'user', 'content': 'not kept'}]
+        with llm_cache.disabled():
+            gateway.complete(messages, model=MODEL)
+        assert cache.stats()['entries'] == 0
+        assert gateway.complete(messages, model=MODEL)['cached'] is False
+        with llm_cache.disabled(False):  # flag=False leaves the cache on
+            assert gateway.complete(messages, model=MODEL)['cached'] is True
+        assert StubOpenRouter.requests == 2
+    finally:
+        gateway.close()
+
+
+def test_uncached_chat_model_skips_lookups(stub_openrouter, cache):
+    gateway = LLMGateway('stub-key', base_url=stub_openrouter, cache=cache)
+    try:
+        llm = GatewayChatModel(gateway=gateway, model=MODEL)
+        llm.invoke([HumanMessage(content='fresh')])
+        llm.invoke([HumanMessage(content='fresh')])
+        assert StubOpenRouter.requests == 1
+
+        fresh = llm.uncached()
+        assert fresh.invoke([HumanMessage(content='fresh')]).content == 'echo: fresh'
+        assert ''.join(c.content for c in fresh.stream([HumanMessage(content='fresh')])) == 'echo: fresh'
+        assert StubOpenRouter.requests == 3
+        assert cache.stats()['entries'] == 1
+    finally:
+        gateway.close()
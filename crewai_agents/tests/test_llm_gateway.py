@@ -0,0 +1,76 @@
+import pytest
+from langchain_core.messages import HumanMessage
+
+import tracing
+from bench import StubOpenRouter
+from llm_gateway import LLMGateway, GatewayChatModel, GatewayError
+
+MODEL = 'openrouter/stub/model'
+FALLBACK = 'openrouter/stub/other'
+
+
+def ask(text):
+    return [{'role': 'user', 'content': text}]
+
+
+@pytest.fixture
+def gateway(stub_openrouter):
+    gateway = LLMGateway('stub-key', base_url=stub_openrouter, max_retries=2, backoff_seconds=0.01)
+    yield gateway
+    gateway.close()
+
+
+def test_batch_returns_results_in_request_order(gateway):
+    questions = [f'question {i}' for i in range(12)]
+    results = gateway.batch([{'messages': ask(q), 'model': MODEL} for q in questions])
+    assert [r['content'] for r in results] == [f'echo: {q}' for q in questions]
+
+
+def test_rate_limited_request_is_retried(gateway):
+    StubOpenRouter.fail_first = True
+    result = gateway.complete(ask('busy'), model=MODEL)
+    assert result['content'] == 'echo: busy'
+    assert result['retries'] == 1
+    assert gateway.stats()['retries'] == 1
+
+
+def test_fallback_model_answers_and_is_counted(gateway):
+    StubOpenRouter.rejected_models = {'stub/model'}
+    with tracing.trace('test') as trace:
+        result = gateway.complete(ask('fb'), model=MODEL, fallbacks=[FALLBACK])
+    assert result['content'] == 'echo: fb'
+    assert result['model'] == 'stub/other'
+    assert result['fallback'] is True
+    assert gateway.stats()['fallbacks'] == 1
+    # One call record, flagged by the gateway itself
+    calls = trace.summary()['llm']['calls']
+    assert [(c['requested_model'], c['model'], c['fallback']) for c in calls] == [('stub/model', 'stub/other', True)]
+
+
+def test_exhausted_retries_raise_without_fallbacks(gateway):
+    StubOpenRouter.rejected_models = {'stub/model'}
+    with pytest.raises(GatewayError) as error:
+        gateway.complete(ask('down'), model=MODEL)
+    assert error.value.status_code == 503
+    assert error.value.attempts == 3
+
+
+def test_stream_yields_chunks_in_order(gateway):
+    chunks = list(gateway.stream(ask('stream me please'), model=MODEL))
+    assert chunks == ['echo:', ' stream', ' me', ' please']
+
+
+def test_stream_falls_back_before_first_chunk(gateway):
+    StubOpenRouter.rejected_models = {'stub/model'}
+    with tracing.trace('test') as trace:
+        text = ''.join(gateway.stream(ask('fb'), model=MODEL, fallbacks=[FALLBACK]))
+    assert text == 'echo: fb'
+    call, = trace.summary()['llm']['calls']
+    assert call['model'] == 'stub/other' and call['fallback'] and call['streamed']
+
+
+def test_chat_model_uses_configured_fallbacks(gateway):
+    StubOpenRouter.rejected_models = {'stub/model'}
+    llm = GatewayChatModel(gateway=gateway, model=MODEL, fallbacks=(FALLBACK,))
+    assert llm.invoke([HumanMessage(content='hello')]).content == 'echo: hello'
+    assert ''.join(chunk.content for chunk in llm.stream([HumanMessage(content='hi there')])) == 'echo: hi there'
@@ -0,0 +1,60 @@
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pipeline import Pipeline
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=4)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def test_dependency_results_are_passed_by_name(executor):
+    dag = Pipeline(executor)
+    dag.add('rows', lambda n: list(range(n)), 4)
+    dag.add('total', lambda rows: sum(rows), after=['rows'])
+    dag.add('report', lambda rows, total, label: f'{label}: {len(rows)} rows, {total}', after=['rows', 'total'],
+            label='sales')
+    assert dag.run() == {'rows': [0, 1, 2, 3], 'total': 6, 'report': 'sales: 4 rows, 6'}
+
+
+def test_independent_steps_overlap(executor):
+    # Both branches must be running at once to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    dag = Pipeline(executor)
+    dag.add('plan', lambda: 'plan')
+    dag.add('charts', lambda plan: barrier.wait() is not None, after=['plan'])
+    dag.add('insights', lambda plan: barrier.wait() is not None, after=['plan'])
+    assert dag.run() == {'plan': 'plan', 'charts': True, 'insights': True}
+
+
+def test_a_failed_step_stops_its_dependents(executor):
+    ran = []
+    dag = Pipeline(executor)
+    dag.add('llm', lambda: 1 / 0)
+    dag.add('narrative', lambda llm: ran.append('narrative'), after=['llm'])
+    with pytest.raises(ZeroDivisionError):
+        dag.run()
+    assert ran == []
+
+
+def test_steps_see_the_callers_context(executor):
+    current = contextvars.ContextVar('current', default=None)
+    current.set('job-1')
+    dag = Pipeline(executor)
+    dag.add('step', current.get)
+    assert dag.run() == {'step': 'job-1'}
+
+
+def test_steps_must_be_declared_after_their_dependencies(executor):
+    dag = Pipeline(executor)
+    dag.add('a', lambda: 1)
+    with pytest.raises(ValueError, match='unknown steps'):
+        dag.add('b', lambda c: c, after=['c'])
+    with pytest.raises(ValueError, match='Duplicate'):
+        dag.add('a', lambda: 2)
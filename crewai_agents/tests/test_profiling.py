@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+import profiling
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    rows = 5000
+    frame = pd.DataFrame({
+        'sales': rng.lognormal(3, 1, rows),
+        'units': rng.integers(0, 100, rows),
+        'price': rng.normal(20, 5, rows),
+        'region': rng.choice(['north', 'south', 'east', 'west'], rows, p=[0.4, 0.3, 0.2, 0.1]),
+        'when': pd.date_range('2024-01-01', periods=rows, freq='h'),
+    })
+    frame['revenue'] = frame['units'] * frame['price'] + rng.normal(0, 10, rows)
+    frame.loc[rng.choice(rows, 300, replace=False), 'price'] = np.nan
+    return pd.concat([frame, frame.head(25)], ignore_index=True)
+
+
+def test_numeric_summary_matches_pandas(df):
+    profile = profiling.build_rich_profile(df)
+    for col in profile['numeric_columns']:
+        expected = df[col].describe()
+        summary = profile['numeric_summary'][col]
+        for key in profiling.DESCRIBE_KEYS:
+            assert summary[key] == pytest.approx(round(float(expected[key]), 4), abs=1e-4), (col, key)
+        # The scipy.stats (biased) estimators the profile has always reported
+        clean = df[col].dropna()
+        shape = profile['distribution_stats'][col]
+        assert shape['skewness'] == pytest.approx(stats.skew(clean), abs=1e-4)
+        assert shape['kurtosis'] == pytest.approx(stats.kurtosis(clean), abs=1e-4)
+
+
+def test_outliers_missing_and_duplicates_match_pandas(df):
+    profile = profiling.build_rich_profile(df)
+    for col in profile['numeric_columns']:
+        q1, q3 = df[col].quantile(0.25), df[col].quantile(0.75)
+        iqr = q3 - q1
+        outside = ((df[col] < q1 - 1.5 * iqr) | (df[col] > q3 + 1.5 * iqr)).sum()
+        assert profile['outlier_analysis'][col]['count'] == outside
+    assert profile['missing']['price']['count'] == df['price'].isna().sum()
+    assert profile['duplicate_rows']['count'] == df.duplicated().sum() == 25
+    assert profile['datetime_columns'] == ['when']
+    assert profile['categorical_summaries']['region']['top_5'] == df['region'].value_counts().head(5).to_dict()
+
+
+def test_correlations_use_pairwise_complete_rows(df):
+    profile = profiling.build_rich_profile(df)
+    expected = df.select_dtypes(include='number').corr()
+    assert profile['top_correlations']
+    for pair in profile['top_correlations']:
+        assert pair['correlation'] == pytest.approx(expected.loc[pair['col1'], pair['col2']], abs=1e-4)
+
+
+def test_empty_and_all_null_columns_do_not_fail():
+    frame = pd.DataFrame({'empty': [np.nan] * 4, 'x': [1.0, 2.0, 3.0, 4.0]})
+    profile = profiling.build_rich_profile(frame)
+    assert profile['numeric_summary']['empty']['count'] == 0
+    assert 'empty' not in profile['distribution_stats']
+    assert profiling.build_rich_profile(pd.DataFrame())['shape'] == {'rows': 0, 'columns': 0}
+
+
+def stream(df, chunk_rows=1000, **kwargs):
+    profiler = profiling.StreamingProfiler(**kwargs)
+    for start in range(0, len(df), chunk_rows):
+        profiler.update(df.iloc[start:start + chunk_rows])
+    return profiler.result()
+
+
+def test_streaming_profile_matches_exact_profile(df):
+    exact = profiling.build_rich_profile(df)
+    streamed = stream(df)
+
+    for key in ('shape', 'columns', 'dtypes', 'numeric_columns', 'categorical_columns', 'datetime_columns',
+                'missing', 'duplicate_rows'):
+        assert streamed[key] == exact[key], key
+    pd.testing.assert_frame_equal(pd.DataFrame(streamed['sample_rows']), pd.DataFrame(exact['sample_rows']))
+    assert streamed['categorical_summaries'] == exact['categorical_summaries']
+    for col in exact['numeric_columns']:
+        for key in ('count', 'mean', 'std', 'min', 'max'):
+            assert streamed['numeric_summary'][col][key] == pytest.approx(exact['numeric_summary'][col][key], rel=1e-6)
+        for key in ('skewness', 'kurtosis'):
+            assert streamed['distribution_stats'][col][key] == pytest.approx(exact['distribution_stats'][col][key], abs=1e-3)
+    for exact_pair, streamed_pair in zip(exact['top_correlations'], streamed['top_correlations']):
+        assert streamed_pair['correlation'] == pytest.approx(exact_pair['correlation'], abs=1e-6)
+
+
+def test_streaming_quantiles_and_outliers_stay_close_once_sketched(df):
+    # A small KLL compacts many times over 5k rows; estimates stay within a few ranks
+    exact = profiling.build_rich_profile(df)
+    streamed = stream(df, kll_k=200)
+    for col in exact['numeric_columns']:
+        values = df[col].dropna()
+        for key, q in zip(('25%', '50%', '75%'), profiling.QUANTILES):
+            rank = (values < streamed['numeric_summary'][col][key]).mean()
+            assert abs(rank - q) < 0.03, (col, key)
+        expected = exact['outlier_analysis'][col]['count']
+        assert abs(streamed['outlier_analysis'][col]['count'] - expected) <= max(10, 0.1 * expected)
+
+
+def test_sketches_merge_like_one_pass():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=20_000)
+    halves = np.array_split(values, 2)
+
+    whole = profiling.MomentSketch(1)
+    whole.update(values[:, None])
+    merged = profiling.MomentSketch(1)
+    other = profiling.MomentSketch(1)
+    merged.update(halves[0][:, None])
+    other.update(halves[1][:, None])
+    merged.merge(other)
+    for key, value in whole.finalize().items():
+        assert merged.finalize()[key] == pytest.approx(value, rel=1e-9)
+
+    labels = pd.Series(rng.integers(0, 50_000, 100_000)).astype(str)
+    hll, part = profiling.HyperLogLog(), profiling.HyperLogLog()
+    hll.update(labels[:50_000])
+    part.update(labels[50_000:])
+    hll.merge(part)
+    assert hll.count() == pytest.approx(labels.nunique(), rel=0.03)
+
+    sampler = profiling.DuplicateSampler(capacity=5_000)
+    sampler.update(labels.to_frame())
+    duplicates = labels.duplicated().sum()
+    assert sampler.level > 0
+    assert sampler.duplicate_count() == pytest.approx(duplicates, rel=0.1)
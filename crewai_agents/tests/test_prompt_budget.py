@@ -0,0 +1,69 @@
+import contextvars
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import prompt_budget
+import profiling
+
+
+@pytest.fixture(scope='module')
+def wide_profile():
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({f'metric_{i:02d}': rng.normal(size=200) for i in range(60)})
+    frame['Weekly_Sales'] = rng.lognormal(size=200)
+    frame['Store'] = rng.choice(['north', 'south'], 200)
+    frame.loc[:20, 'metric_07'] = np.nan
+    return profiling.build_rich_profile(frame)
+
+
+def test_compact_profile_fits_its_budget(wide_profile):
+    for budget in (300, 800, 4000):
+        compact, stats = prompt_budget.compact_profile(wide_profile, budget)
+        assert stats['tokens'] <= budget
+        assert stats['tokens_full'] > 4000
+        assert compact.get('omitted_columns', 0) == 62 - len(compact['columns'])
+
+
+def test_focused_columns_come_first_with_their_details(wide_profile):
+    focus = prompt_budget.query_columns('total weekly sales per Store', wide_profile['columns'])
+    assert focus == {'Weekly_Sales': 2, 'Store': 3}
+
+    compact, stats = prompt_budget.compact_profile(wide_profile, 300, focus=focus)
+    assert list(compact['columns'])[:2] == ['Store', 'Weekly_Sales']
+    assert compact['columns']['Store']['top_values']['top'] == wide_profile['categorical_summaries']['Store']['top_5']
+    assert 'summary' in compact['columns']['Weekly_Sales']
+    assert stats['columns_focused'] == ['Store', 'Weekly_Sales']
+    # Without a question, the column with missing values ranks ahead of its clean siblings
+    unfocused, _ = prompt_budget.compact_profile(wide_profile, 300)
+    assert [c for c in unfocused['columns'] if c.startswith('metric_')][0] == 'metric_07'
+
+
+def test_sql_agent_gets_ranges_not_shape_statistics(wide_profile):
+    compact, _ = prompt_budget.compact_profile(wide_profile, 4000, details=prompt_budget.AGENT_DETAILS['sql_craftsman'])
+    entry = compact['columns']['Weekly_Sales']
+    assert set(entry['range']) == {'min', 'max'}
+    assert 'summary' not in entry and 'distribution' not in entry
+    assert 'top_correlations' not in compact
+
+
+def test_query_columns_ignores_words_shared_by_many_columns():
+    columns = [f'metric_{i}' for i in range(10)] + ['Weekly_Sales']
+    assert prompt_budget.query_columns('which metric has the most sales', columns) == {'Weekly_Sales': 1}
+
+
+def test_budgets_parse_overrides_and_reports_add_up():
+    budgets = prompt_budget.parse_budgets('sql_craftsman=600, detective_agent=3000')
+    assert budgets['sql_craftsman'] == 600 and budgets['detective_agent'] == 3000
+    assert budgets['data_profiler'] == prompt_budget.DEFAULT_BUDGETS['data_profiler']
+
+    def request():
+        report = prompt_budget.start_report()
+        prompt_budget.record('sql_craftsman', {'tokens': 10, 'tokens_full': 100})
+        prompt_budget.record('query_interpreter', {'tokens': 5, 'tokens_full': 100})
+        return report
+
+    report = contextvars.copy_context().run(request)
+    assert report['tokens'] == 15 and report['tokens_full'] == 200
+    assert set(report['agents']) == {'sql_craftsman', 'query_interpreter'}
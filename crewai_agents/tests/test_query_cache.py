@@ -0,0 +1,44 @@
+import query_cache
+
+FINGERPRINT = 'schema'
+
+
+def similarity(a: str, b: str) -> float:
+    return float(query_cache.embed(query_cache.normalize_query(a))
+                 @ query_cache.embed(query_cache.normalize_query(b)))
+
+
+def store(cache, question: str, sql: str):
+    cache.store(FINGERPRINT, question, {'valid': True}, sql, 'narrative', 'v1')
+
+
+def test_rewordings_reuse_the_stored_sql():
+    cache = query_cache.QueryCache()
+    store(cache, 'average weekly sales per store', 'SELECT 1')
+
+    entry, match = cache.lookup(FINGERPRINT, 'Show me the average weekly sales per store, please')
+
+    assert match == 'similar' and entry['sql'] == 'SELECT 1'
+
+
+def test_negated_near_duplicate_is_not_a_hit():
+    cache = query_cache.QueryCache(similarity_threshold=0.8)
+    stored = 'which stores had weekly sales above 1000000 on holidays'
+    negated = 'which stores had weekly sales above 1000000 not on holidays'
+    store(cache, stored, 'SELECT 1')
+    # Close enough on words alone to pass the threshold
+    assert similarity(stored, negated) >= 0.8
+
+    assert cache.lookup(FINGERPRINT, negated) == (None, None)
+    assert cache.lookup(FINGERPRINT, 'which stores had weekly sales above 1000000 on holiday')[1] == 'similar'
+
+
+def test_comparison_direction_and_numbers_must_match():
+    cache = query_cache.QueryCache(similarity_threshold=0.5)
+    store(cache, 'stores with fuel price above 3', 'SELECT 1')
+    store(cache, 'top 5 stores by weekly sales', 'SELECT 2')
+
+    assert cache.lookup(FINGERPRINT, 'stores with fuel price below 3') == (None, None)
+    assert cache.lookup(FINGERPRINT, 'stores with fuel price > 3') == (None, None)
+    assert cache.lookup(FINGERPRINT, 'top 10 stores by weekly sales') == (None, None)
+    assert cache.stats()['similar_hits'] == 0
@@ -0,0 +1,158 @@
+import os
+import time
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset_store
+import query_engine
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = os.path.join(tmp_path, 'temp_dataset_test')
+    rng = np.random.default_rng(0)
+    dataset_store.write_dataset(path, pd.DataFrame({
+        'store': rng.integers(0, 1000, 2000),
+        'sales': rng.random(2000),
+    }), 'csv')
+    return path
+
+
+@pytest.fixture
+def engine(dataset):
+    engine = query_engine.SQLiteQueryEngine(index_threshold=2)
+    yield engine
+    engine.release(dataset)
+
+
+def wait_for_builds(engine, dataset, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while engine.index_report(dataset)['pending']:
+        assert time.monotonic() < deadline, 'index builds did not finish'
+        time.sleep(0.01)
+
+
+def database_indexes(dataset) -> list:
+    conn = sqlite3.connect(query_engine.query_db_path(dataset))
+    try:
+        return sorted(row[1] for row in conn.execute(f'PRAGMA index_list({query_engine.TABLE_NAME})'))
+    finally:
+        conn.close()
+
+
+def open_files(path) -> list:
+    fd_dir = '/proc/self/fd'
+    targets = []
+    for fd in os.listdir(fd_dir):
+        try:
+            targets.append(os.readlink(os.path.join(fd_dir, fd)))
+        except OSError:
+            pass
+    return [t for t in targets if t.startswith(str(path))]
+
+
+def test_referenced_columns_ignores_string_literals():
+    refs = query_engine.referenced_columns(
+        "SELECT store, SUM(sales) FROM data_table WHERE notes = 'sales' GROUP BY store", ['store', 'sales', 'notes'])
+    assert refs['where'] == {'notes'}
+    assert refs['group_by'] == {'store'}
+
+
+def test_advisor_indexes_hot_column(dataset, engine):
+    for _ in range(2):
+        engine.execute(dataset, 'SELECT * FROM data_table WHERE sales > 0.99')
+    wait_for_builds(engine, dataset)
+
+    report = engine.index_report(dataset)
+    assert {'name': 'idx_auto_sales', 'columns': ['sales'], 'origin': 'advisor'} in report['indexes']
+    assert report['column_usage']['sales'] == 2
+    # A pooled reader reloads the schema on its next query (EXPLAIN alone does not)
+    engine.execute(dataset, 'SELECT COUNT(*) FROM data_table')
+    plan = engine.execute(dataset, 'EXPLAIN QUERY PLAN SELECT * FROM data_table WHERE sales > 0.99')
+    assert 'idx_auto_sales' in ' '.join(plan['detail'])
+
+
+def test_concurrent_queries_see_consistent_indexes(dataset, engine):
+    queries = ['SELECT COUNT(*) AS n FROM data_table WHERE sales > 0.5',
+               'SELECT store, COUNT(*) AS n FROM data_table GROUP BY store ORDER BY store']
+    expected = [engine.execute(dataset, sql) for sql in queries]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda i: engine.execute(dataset, queries[i % 2]), range(40)))
+    wait_for_builds(engine, dataset)
+
+    for i, result in enumerate(results):
+        pd.testing.assert_frame_equal(result, expected[i % 2])
+    # The advisor's index list matches the database: every build landed, once
+    names = sorted(i['name'] for i in engine.index_report(dataset)['indexes'])
+    assert names == database_indexes(dataset)
+    assert {'idx_auto_sales', 'idx_auto_store'} <= set(names)
+
+
+def test_existing_indexes_are_read_once(dataset, engine):
+    engine.ensure(dataset)
+    first = engine.advisor.existing_indexes(dataset)
+    conn = sqlite3.connect(query_engine.query_db_path(dataset))
+    conn.execute(f'CREATE INDEX idx_outside ON {query_engine.TABLE_NAME} (sales)')
+    conn.commit()
+    conn.close()
+    # The list is kept in step with the advisor's own builds, not re-read
+    assert engine.advisor.existing_indexes(dataset) == first
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='needs /proc')
+def test_release_closes_every_connection(dataset, engine):
+    for _ in range(2):
+        engine.execute(dataset, 'SELECT * FROM data_table WHERE sales > 0.99')
+    wait_for_builds(engine, dataset)
+    assert open_files(dataset)
+
+    engine.release(dataset)
+
+    assert open_files(dataset) == []
+
+
+def test_query_database_matches_to_sql(tmp_path):
+    path = os.path.join(tmp_path, 'temp_dataset_built')
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({
+        'region': rng.choice(['north', 'south', None], 1000),
+        'units': rng.integers(0, 5, 1000),
+        'price': rng.random(1000),
+        'day': pd.date_range('2024-01-01', periods=1000, freq='D'),
+    })
+    dataset_store.write_dataset(path, df, 'csv')
+    query_engine.build_query_db(path, batch_rows=128)
+
+    sql = 'SELECT region, units, SUM(price) AS total, MIN(day) AS first_day FROM data_table GROUP BY region, units'
+    reference = sqlite3.connect(':memory:')
+    df.to_sql(query_engine.TABLE_NAME, reference, index=False)
+    expected = pd.read_sql_query(sql, reference)
+    built = sqlite3.connect(query_engine.query_db_path(path))
+    try:
+        pd.testing.assert_frame_equal(pd.read_sql_query(sql, built), expected)
+    finally:
+        built.close()
+        reference.close()
+    # Low-cardinality and date columns are indexed up front; continuous floats are not
+    assert database_indexes(path) == ['idx_day', 'idx_region', 'idx_units']
+
+
+def test_query_database_is_built_once_and_read_only(dataset):
+    first = query_engine.SQLiteQueryEngine()
+    try:
+        first.ensure(dataset)
+    finally:
+        first.release(dataset)
+
+    engine = query_engine.SQLiteQueryEngine()
+    try:
+        assert engine.prepare(dataset) is None  # already on disk
+        assert engine.execute(dataset, 'SELECT COUNT(*) AS n FROM data_table')['n'][0] == 2000
+        with pytest.raises(Exception, match='readonly|read-only'):
+            engine.execute(dataset, 'DELETE FROM data_table')
+    finally:
+        engine.release(dataset)
@@ -0,0 +1,78 @@
+import contextvars
+import threading
+
+import pytest
+
+import tracing
+from llm_gateway import LLMGateway
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = tracing.Histogram('test_seconds', 'Test latency.', buckets=(0.1, 1))
+    for value in (0.05, 0.5, 3):
+        histogram.observe(value, stage='sql.execute')
+    assert histogram.render() == [
+        '# HELP test_seconds Test latency.',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{stage="sql.execute",le="0.1"} 1',
+        'test_seconds_bucket{stage="sql.execute",le="1"} 2',
+        'test_seconds_bucket{stage="sql.execute",le="+Inf"} 3',
+        'test_seconds_sum{stage="sql.execute"} 3.55',
+        'test_seconds_count{stage="sql.execute"} 3',
+    ]
+
+
+def test_counter_labels_are_sorted_and_escaped():
+    counter = tracing.Counter('test_total', 'Test count.')
+    counter.inc(model='a"b\\c', outcome='ok')
+    counter.inc(2, outcome='ok', model='a"b\\c')
+    assert counter.render()[-1] == 'test_total{model="a\\"b\\\\c",outcome="ok"} 3'
+
+
+def test_render_includes_requests_and_gauges():
+    with tracing.trace('test_render'):
+        pass
+    text = tracing.render({'test_entries': ('Cache entries.', {(('cache', 'llm'),): 4}), 'test_up': ('Up.', 1)})
+    assert 'datadetective_requests_total{endpoint="test_render",status="ok"}' in text
+    assert '# TYPE test_entries gauge\ntest_entries{cache="llm"} 4\n' in text
+    assert 'test_up 1\n' in text
+
+
+def test_trace_collects_spans_from_worker_threads_and_errors():
+    with pytest.raises(RuntimeError):
+        with tracing.trace('test_trace') as request_trace:
+            with tracing.span('profile.load', rows=10):
+                pass
+            worker = threading.Thread(target=contextvars.copy_context().run,
+                                      args=(tracing.traced('chart.render')(lambda: None),))
+            worker.start()
+            worker.join()
+            raise RuntimeError('boom')
+
+    summary = request_trace.summary()
+    assert [s['name'] for s in summary['spans']] == ['profile.load', 'chart.render']
+    assert summary['spans'][0]['rows'] == 10
+    assert request_trace.status == 'error'
+    assert summary['total_ms'] >= summary['spans'][-1]['start_ms']
+
+
+def test_spans_outside_a_trace_only_feed_metrics():
+    with tracing.span('test.untraced'):
+        pass
+    assert tracing.current() is None
+    assert 'stage="test.untraced"' in tracing.render()
+
+
+def test_gateway_calls_are_recorded_on_the_request_trace(stub_openrouter):
+    gateway = LLMGateway('stub-key', base_url=stub_openrouter)
+    try:
+        with tracing.trace('test_llm') as request_trace:
+            gateway.complete([{'role': 'user', 'content': 'count the stores'}], model='openrouter/stub/model')
+    finally:
+        gateway.close()
+
+    llm = request_trace.summary()['llm']
+    assert len(llm['calls']) == 1
+    assert llm['calls'][0]['requested_model'] == 'stub/model'  # OpenRouter's own model id
+    assert llm['prompt_tokens'] > 0 and llm['completion_tokens'] > 0
+    assert llm['fallback'] is False and llm['calls'][0]['cached'] is False
@@ -0,0 +1,55 @@
+import io
+import hashlib
+
+import pandas as pd
+import pytest
+
+import upload_stream
+
+BOUNDARY = 'test-boundary-7MA4YWxk'
+
+
+def multipart(parts) -> io.BytesIO:
+    """Body for (name, filename or None, content bytes) parts."""
+    body = b''
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else '')
+        body += (f'--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n').encode('latin-1')
+        body += content + b'\r\n'
+    return io.BytesIO(body + f'--{BOUNDARY}--\r\n'.encode('latin-1'))
+
+
+def csv_bytes(rows: int) -> bytes:
+    return ('store,sales\r\n' + ''.join(f'{i % 45},{i * 1.5}\r\n' for i in range(rows))).encode('utf-8')
+
+
+def test_file_part_streams_into_pandas_and_the_hasher():
+    content = csv_bytes(20_000)
+    body = multipart([('note', None, b'before'), ('file', 'sales.csv', content), ('after', None, b'x')])
+    raw = upload_stream.MultipartFileStream(body, BOUNDARY, chunk_size=4096)
+    raw.hasher = hashlib.sha256()
+
+    assert raw.filename == 'sales.csv'
+    df = pd.read_csv(io.BufferedReader(raw, 64 * 1024))
+    raw.drain()
+
+    assert len(df) == 20_000 and df['sales'].iloc[-1] == 19_999 * 1.5
+    assert raw.bytes_read == len(content)
+    assert raw.hasher.hexdigest() == hashlib.sha256(content).hexdigest()
+
+
+def test_content_survives_boundary_lookalikes_and_small_reads():
+    content = b'a,b\r\n--test-boundary\r\n1,2\r\n' * 500
+    raw, reader = upload_stream.open_upload(multipart([('file', 'tricky.csv', content)]), BOUNDARY)
+    out = bytearray()
+    while chunk := reader.read(97):
+        out += chunk
+    assert bytes(out) == content
+
+
+def test_missing_file_or_boundary_is_rejected():
+    with pytest.raises(ValueError, match='No file uploaded'):
+        upload_stream.MultipartFileStream(multipart([('note', None, b'only text')]), BOUNDARY)
+    with pytest.raises(ValueError, match='multipart'):
+        upload_stream.MultipartFileStream(io.BytesIO(b''), None)
@@ -0,0 +1,272 @@
+"""
+Per-request stage timings, LLM call accounting and Prometheus metrics.
+
+A slow /query could be spent parsing the upload, profiling, building the
+query database, in any agent step, in SQL or in serialising charts, and
+nothing told us which. Stages are now wrapped in spans:
+
+    with tracing.span('sql.execute'):
+        ...
+
+    @tracing.traced('chart.render')
+    def render_chart(...): ...
+
+Every span feeds the process-wide `datadetective_stage_seconds`
+histogram. Inside a request trace (tracing.trace(endpoint), opened by the
+endpoint wrappers in app.py) spans are also kept per request, together
+with every LLM call the gateway made on the request's behalf — model
+asked for and model that answered, tokens, retries, cache hits, and
+whether a fallback model took over — so an endpoint can return them as a
+`timings` block. The trace lives in a contextvar: Pipeline steps and
+chart futures run in a copy of the caller's context and report into the
+same trace.
+
+render() writes all metrics in the Prometheus text exposition format.
+"""
+
+import time
+import threading
+import contextvars
+from functools import wraps
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_trace = contextvars.ContextVar('trace', default=None)
+
+
+# ─────────────────────────────────────────────
+# METRICS
+# ─────────────────────────────────────────────
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series['counts']):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, (('le', str(bound)),))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']!r}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram('datadetective_request_seconds', 'End-to-end latency of traced requests.')
+REQUESTS = Counter('datadetective_requests_total', 'Traced requests by endpoint and outcome.')
+STAGE_SECONDS = Histogram('datadetective_stage_seconds', 'Latency of pipeline stages.')
+LLM_SECONDS = Histogram('datadetective_llm_call_seconds', 'Latency of LLM calls by requested model.')
+LLM_CALLS = Counter('datadetective_llm_calls_total', 'LLM calls by answering model and outcome.')
+LLM_TOKENS = Counter('datadetective_llm_tokens_total', 'LLM tokens reported by the provider.')
+LLM_RETRIES = Counter('datadetective_llm_retries_total', 'Retried LLM attempts by requested model.')
+LLM_FALLBACKS = Counter('datadetective_llm_fallbacks_total', 'Calls answered by a fallback model.')
+
+METRICS = (REQUESTS, REQUEST_SECONDS, STAGE_SECONDS, LLM_CALLS, LLM_SECONDS, LLM_TOKENS, LLM_RETRIES, LLM_FALLBACKS)
+
+
+def render(gauges: dict = None) -> str:
+    """
+    Prometheus text exposition of every metric. `gauges` adds point-in-time
+    values: {name: (help, value)} or {name: (help, {label_tuple: value})}.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, (help_text, value) in sorted((gauges or {}).items()):
+        lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} gauge'])
+        series = value if isinstance(value, dict) else {(): value}
+        for key, v in sorted(series.items()):
+            lines.append(f'{name}{_format_labels(tuple(key))} {_format_value(v)}')
+    return '\n'.join(lines) + '\n'
+
+
+# ─────────────────────────────────────────────
+# REQUEST TRACES
+# ─────────────────────────────────────────────
+
+class Trace:
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.status = 'ok'
+        self._start = time.perf_counter()
+        self._end = None
+        self._spans = []
+        self._llm = []
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, seconds: float, labels: dict):
+        with self._lock:
+            self._spans.append({
+                'name': name,
+                'start_ms': round((start - self._start) * 1000, 2),
+                'ms': round(seconds * 1000, 2),
+                **labels,
+            })
+
+    def add_llm_call(self, call: dict):
+        with self._lock:
+            self._llm.append(call)
+
+    def summary(self) -> dict:
+        end = self._end if self._end is not None else time.perf_counter()
+        with self._lock:
+            spans = sorted(self._spans, key=lambda s: s['start_ms'])
+            calls = list(self._llm)
+        return {
+            'total_ms': round((end - self._start) * 1000, 2),
+            'spans': spans,
+            'llm': {
+                'calls': calls,
+                'prompt_tokens': sum(c.get('prompt_tokens', 0) for c in calls),
+                'completion_tokens': sum(c.get('completion_tokens', 0) for c in calls),
+                'retries': sum(c.get('retries', 0) for c in calls),
+                'fallback': any(c['fallback'] for c in calls),
+            },
+        }
+
+
+@contextmanager
+def trace(endpoint: str):
+    """Opens a request trace; its duration and status are recorded on exit."""
+    current = Trace(endpoint)
+    token = _trace.set(current)
+    try:
+        yield current
+    except BaseException:
+        current.status = 'error'
+        raise
+    finally:
+        _trace.reset(token)
+        current._end = time.perf_counter()
+        REQUEST_SECONDS.observe(current._end - current._start, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, status=current.status)
+
+
+def current():
+    return _trace.get()
+
+
+def mark_error():
+    """Flags the current request trace as failed (for handlers that report errors in-band)."""
+    active = _trace.get()
+    if active is not None:
+        active.status = 'error'
+
+
+@contextmanager
+def span(name: str, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=name)
+        active = _trace.get()
+        if active is not None:
+            active.add_span(name, start, seconds, labels)
+
+
+def traced(name: str):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_llm_call(requested_model: str, seconds: float, model: str = None, usage: dict = None,
+                    retries: int = 0, cached: bool = False, fallback: bool = False,
+                    streamed: bool = False, error: str = None):
+    """Called by the LLM gateway for every synchronous completion or stream."""
+    usage = usage or {}
+    call = {
+        'requested_model': requested_model,
+        'model': model,
+        'ms': round(seconds * 1000, 2),
+        'prompt_tokens': usage.get('prompt_tokens', 0),
+        'completion_tokens': usage.get('completion_tokens', 0),
+        'retries': retries,
+        'cached': cached,
+        'fallback': fallback,
+    }
+    if streamed:
+        call['streamed'] = True
+    if error:
+        call['error'] = error
+    active = _trace.get()
+    if active is not None:
+        active.add_llm_call(call)
+
+    outcome = 'error' if error else 'cached' if cached else 'ok'
+    LLM_SECONDS.observe(seconds, model=requested_model)
+    LLM_CALLS.inc(model=model or requested_model, outcome=outcome)
+    if retries:
+        LLM_RETRIES.inc(retries, model=requested_model)
+    if fallback:
+        LLM_FALLBACKS.inc(model=model or requested_model)
+    if not cached:
+        for kind in ('prompt', 'completion'):
+            if call[f'{kind}_tokens']:
+                LLM_TOKENS.inc(call[f'{kind}_tokens'], model=model or requested_model, kind=kind)
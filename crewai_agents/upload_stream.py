@@ -0,0 +1,92 @@
+"""
+Streaming multipart upload reader.
+
+Flask's request.files parses the whole multipart body up front, spooling
+anything over 500 KB to a temporary file, so every upload is written to
+disk before the parser ever sees it. MultipartFileStream instead decodes
+the body incrementally with werkzeug's sans-IO MultipartDecoder and exposes
+the file part as a readable binary stream: pandas parses the bytes as they
+arrive from the socket, and a hasher (for content addressing) sees them on
+the way through.
+"""
+
+import io
+
+from werkzeug.sansio.multipart import MultipartDecoder, NeedData, File, Data, Epilogue
+
+
+class MultipartFileStream(io.RawIOBase):
+    """
+    Raw binary stream over the first file part named `field` of a
+    multipart/form-data body. Construction reads just far enough to see the
+    part headers (so `filename` is available before any data is consumed);
+    `hasher`, when set, is updated with every content byte read.
+    """
+
+    def __init__(self, stream, boundary: str, field: str = 'file', chunk_size: int = 64 * 1024):
+        if not boundary:
+            raise ValueError('Expected a multipart/form-data upload')
+        self._stream = stream
+        self._decoder = MultipartDecoder(boundary.encode('latin-1'))
+        self._chunk_size = chunk_size
+        self._pending = b''
+        self._done = False
+        self._eof = False
+        self.hasher = None
+        self.bytes_read = 0
+        self.filename = None
+
+        while True:
+            event = self._next_event()
+            if isinstance(event, Epilogue) or event is None:
+                raise ValueError('No file uploaded')
+            if isinstance(event, File) and event.name == field:
+                self.filename = event.filename
+                return
+
+    def _next_event(self):
+        """Next decoder event, feeding it body bytes as needed; None at end of body."""
+        while True:
+            event = self._decoder.next_event()
+            if not isinstance(event, NeedData):
+                return event
+            if self._eof:
+                return None
+            chunk = self._stream.read(self._chunk_size)
+            if not chunk:
+                self._eof = True
+            # None tells the decoder the body has ended.
+            self._decoder.receive_data(chunk or None)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending and not self._done:
+            event = self._next_event()
+            if not isinstance(event, Data):
+                # The part ended without a closing Data(more_data=False).
+                self._done = True
+                break
+            if event.data:
+                if self.hasher is not None:
+                    self.hasher.update(event.data)
+                self.bytes_read += len(event.data)
+                self._pending = event.data
+            if not event.more_data:
+                self._done = True
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def drain(self):
+        """Consumes the rest of the file part (so the hash covers all of it)."""
+        while self.readinto(bytearray(self._chunk_size)):
+            pass
+
+
+def open_upload(stream, boundary: str, field: str = 'file', buffer_size: int = 1024 * 1024):
+    """Returns (raw MultipartFileStream, buffered reader over it)."""
+    raw = MultipartFileStream(stream, boundary, field)
+    return raw, io.BufferedReader(raw, buffer_size)
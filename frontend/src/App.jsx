@@ -94,36 +94,96 @@ const requestJson = async (path, options = {}) => {
   return sanitizeApiPayload(data || {});
 };
 
+const JOB_POLL_INTERVAL_MS = 1000;
+const JOB_POLL_MAX_INTERVAL_MS = 3000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Long-running agent endpoints are submitted as background jobs ("async": true)
+// and polled, so a 20–60 s crew run never holds a request open.
+const requestJob = async (path, body) => {
+  const job = await requestJson(path, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ ...body, async: true }),
+  });
+  if (!job.job_id) {
+    return job;
+  }
+
+  let interval = JOB_POLL_INTERVAL_MS;
+  for (;;) {
+    await sleep(interval);
+    const status = await requestJson(job.status_url);
+    if (status.status === "succeeded") {
+      return status.result || {};
+    }
+    if (status.status === "failed") {
+      throw new Error(status.error || `Job failed (${status.status_code})`);
+    }
+    interval = Math.min(interval * 1.5, JOB_POLL_MAX_INTERVAL_MS);
+  }
+};
+
+// Reads a server-sent-events response from a POST (EventSource is GET-only)
+// and calls onEvent(name, data) for each event as it arrives.
+const streamEvents = async (path, body, onEvent) => {
+  const response = await fetch(`${API_BASE}${path}`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  });
+  if (!response.ok || !response.body) {
+    let data = null;
+    try {
+      data = await response.json();
+    } catch {
+      data = null;
+    }
+    throw new Error(data?.error || `Request failed (${response.status})`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) {
+      break;
+    }
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = "message";
+      const data = [];
+      block.split("\n").forEach((line) => {
+        if (line.startsWith("event:")) {
+          event = line.slice(6).trim();
+        } else if (line.startsWith("data:")) {
+          data.push(line.slice(5).trimStart());
+        }
+      });
+      if (data.length) {
+        onEvent(event, JSON.parse(data.join("\n")));
+      }
+    }
+  }
+};
+
 const api = {
   upload: (file) => {
     const fd = new FormData();
     fd.append("file", file);
     return requestJson("/upload", { method: "POST", body: fd });
   },
-  analyze: (id) =>
-    requestJson("/analyze", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ dataset_id: id }),
-    }),
-  query: (id, q) =>
-    requestJson("/query", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ dataset_id: id, query: q }),
-    }),
-  visualize: (id) =>
-    requestJson("/visualize", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ dataset_id: id }),
-    }),
-  detective: (id) =>
-    requestJson("/detective", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ dataset_id: id }),
-    }),
+  analyze: (id) => requestJob("/analyze", { dataset_id: id }),
+  query: (id, q) => requestJob("/query", { dataset_id: id, query: q }),
+  queryStream: (id, q, onEvent) => streamEvents("/query/stream", { dataset_id: id, query: q }, onEvent),
+  visualize: (id) => requestJob("/visualize", { dataset_id: id }),
+  detective: (id) => requestJob("/detective", { dataset_id: id }),
+  detectiveStream: (id, onEvent) => streamEvents("/detective/stream", { dataset_id: id }, onEvent),
   cleanup: (id) =>
     requestJson("/cleanup", {
       method: "POST",
@@ -727,11 +787,25 @@ const Query = ({ dsId, isBackendOnline }) => {
     setRes(null);
     setHist((h) => [queryText, ...h.slice(0, 9)]);
     try {
-      const r = await api.query(dsId, queryText);
-      if (r.error || !r.success) {
-        throw new Error(r.error || "Query failed");
-      }
-      setRes(r);
+      // Each stage renders as soon as it streams in; narrative text arrives token by token.
+      await api.queryStream(dsId, queryText, (event, data) => {
+        if (event === "error") {
+          throw new Error(data.error || "Query failed");
+        }
+        if (event === "done") {
+          setRes(sanitizeApiPayload(data));
+        } else if (event === "interpretation") {
+          setRes((r) => ({ ...r, interpretation: data.interpretation, cache: data.cache, path: data.path }));
+        } else if (event === "sql") {
+          setRes((r) => ({ ...r, sql_query: data.sql_query }));
+        } else if (event === "result") {
+          setRes((r) => ({ ...r, result: data }));
+        } else if (event === "chart") {
+          setRes((r) => ({ ...r, result_chart: data.result_chart }));
+        } else if (event === "narrative") {
+          setRes((r) => ({ ...r, narrative: `${r?.narrative || ""}${data.delta}` }));
+        }
+      });
     } catch (e) {
       setErr(e.message);
     }
@@ -808,15 +882,16 @@ const Query = ({ dsId, isBackendOnline }) => {
       </div>
 
       {err && <Err msg={err} />}
-      {busy && <Loader text="Query agents are processing your question..." />}
+      {busy && !res && <Loader text="Query agents are processing your question..." />}
 
-      {res && !busy && (
+      {res && (
         <div className="space-y-4 animate-slide-up">
           <div className="bg-slate-900 border border-slate-800 rounded-xl p-5">
             <p className="text-xs font-mono text-slate-600 uppercase tracking-widest mb-3">Interpretation</p>
             <div className="flex flex-wrap items-start gap-3">
               <p className="text-slate-300 text-sm flex-1 min-w-0">{res.interpretation?.interpreted_intent || "-"}</p>
               <div className="flex flex-wrap gap-2 shrink-0">
+                {res.path && <Pill variant={res.path === "crew" ? "indigo" : "emerald"}>{res.path.replace("_", " ")}</Pill>}
                 {res.interpretation?.analysis_type && <Pill variant="indigo">{res.interpretation.analysis_type}</Pill>}
                 <Pill variant={res.interpretation?.valid ? "emerald" : "rose"}>{res.interpretation?.valid ? "valid" : "invalid"}</Pill>
                 {res.interpretation?.confidence != null && (
@@ -982,12 +1057,23 @@ const Detective = ({ dsId, isBackendOnline }) => {
     }
     setBusy(true);
     setErr(null);
+    setRes(null);
     try {
-      const r = await api.detective(dsId);
-      if (r.error || !r.success) {
-        throw new Error(r.error || "Detective mode failed");
-      }
-      setRes(r);
+      // Forensics and charts arrive before the agent starts writing the case file.
+      await api.detectiveStream(dsId, (event, data) => {
+        if (event === "error") {
+          throw new Error(data.error || "Detective mode failed");
+        }
+        if (event === "done") {
+          setRes(sanitizeApiPayload(data));
+        } else if (event === "forensics") {
+          setRes((r) => ({ ...r, forensics: data }));
+        } else if (event === "charts") {
+          setRes((r) => ({ ...r, forensic_charts: data.forensic_charts }));
+        } else if (event === "case_file") {
+          setRes((r) => ({ ...r, case_file: `${r?.case_file || ""}${data.delta}` }));
+        }
+      });
     } catch (e) {
       setErr(e.message);
     }
@@ -1017,13 +1103,13 @@ const Detective = ({ dsId, isBackendOnline }) => {
       </div>
 
       {err && <Err msg={err} />}
-      {busy && (
+      {busy && !res?.case_file && (
         <div className="bg-slate-900 border border-slate-800 rounded-2xl">
           <Loader text="Detective Agent is hunting for anomalies..." />
         </div>
       )}
 
-      {res && !busy && (
+      {res && (
         <div className="space-y-5 animate-slide-up">
           <div className="bg-slate-900 border border-rose-900/30 rounded-2xl p-7 content-shell">
             <div className="flex items-center gap-3 mb-5">
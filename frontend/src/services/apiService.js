@@ -29,6 +29,34 @@ api.interceptors.response.use(
   },
 )
 
+const JOB_POLL_INTERVAL_MS = 1000
+const JOB_POLL_MAX_INTERVAL_MS = 3000
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms))
+
+// Agent endpoints run as background jobs: submit with async=true, then poll
+// /jobs/<id> until the job finishes. Each poll is a short request, so the
+// 30 s client timeout only applies per poll rather than to the whole crew run.
+const runJob = async (path, body) => {
+  const { data: job } = await api.post(path, { ...body, async: true })
+  if (!job.job_id) {
+    return job
+  }
+
+  let interval = JOB_POLL_INTERVAL_MS
+  for (;;) {
+    await sleep(interval)
+    const { data: status } = await api.get(job.status_url)
+    if (status.status === "succeeded") {
+      return status.result
+    }
+    if (status.status === "failed") {
+      throw new Error(status.error || `Job failed (${status.status_code})`)
+    }
+    interval = Math.min(interval * 1.5, JOB_POLL_MAX_INTERVAL_MS)
+  }
+}
+
 export const apiService = {
   // Upload file
   uploadFile: async (file) => {
@@ -44,16 +72,10 @@ export const apiService = {
   },
 
   // Process query
-  processQuery: async (datasetId, query) => {
-    const response = await api.post("/query", { dataset_id: datasetId, query })
-    return response.data
-  },
+  processQuery: (datasetId, query) => runJob("/query", { dataset_id: datasetId, query }),
 
   // Analyze dataset
-  analyzeDataset: async (datasetId) => {
-    const response = await api.post("/analyze", { dataset_id: datasetId })
-    return response.data
-  },
+  analyzeDataset: (datasetId) => runJob("/analyze", { dataset_id: datasetId }),
 
   // Generate executive dashboard intelligence
   getDashboardIntelligence: async (datasetId) => {
@@ -62,10 +84,7 @@ export const apiService = {
   },
 
   // Generate visualizations
-  createVisualizations: async (datasetId) => {
-    const response = await api.post("/visualize", { dataset_id: datasetId })
-    return response.data
-  },
+  createVisualizations: (datasetId) => runJob("/visualize", { dataset_id: datasetId }),
 
   // Cleanup dataset files
   cleanupDataset: async (datasetId) => {